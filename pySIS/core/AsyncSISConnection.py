@@ -0,0 +1,277 @@
+import sys
+import time
+import asyncio
+import serial
+
+from .libSIS import *
+from .Frames import PositionFrame, StatusFrame
+
+
+class AsyncSISConnection:
+    """
+    asyncio front end to a SIS control box.
+
+    The serial port is used in non-blocking mode (timeout=0): the replies are awaited with
+    the event loop watching the file descriptor of the port, so a single event loop can drive
+    several boxes at once, e.g.
+
+        async with AsyncSISConnection('/dev/ttyUSB0') as box0, AsyncSISConnection('/dev/ttyUSB1') as box1:
+            frame0, frame1 = await asyncio.gather(box0.read_position(), box1.read_position())
+
+    The commands return the same values as the ones of SISConnection. The commands sent to the
+    same box are serialized, since the protocol has only one outstanding request at a time.
+    The per-command timeouts are the ones of SISConnection.DEFAULT_TIMEOUTS, updated with
+    `timeouts`. As in SISConnection, the responses are extracted from the received stream by
+    a FrameParser, and the input buffer is flushed after a timed out reply, so that its late
+    bytes are not taken as the reply to the next command. The commands are counted in
+    `metrics` (by default the METRICS of libSIS), and the config memory is tracked in
+    `config_cache` (by default the CONFIG_CACHE of libSIS).
+    """
+
+    #Polling interval (in seconds) for the ports without a file descriptor to watch
+    POLL_INTERVAL = 0.002
+
+    def __init__(self, port, baudrate=9600, timeouts=None, metrics=None, box_id=None, config_cache=None):
+        if isinstance(port, str):
+            self.ser = serial.Serial(port=port, baudrate=baudrate, timeout=0)
+        else:
+            self.ser = port
+            self.ser.timeout = 0
+        #
+        self.timeouts = dict(SISConnection.DEFAULT_TIMEOUTS)
+        if timeouts is not None:
+            self.timeouts.update(timeouts)
+        #
+        self.metrics = METRICS if (metrics is None) else metrics
+        self.box_id = box_id
+        self.config_cache = CONFIG_CACHE if (config_cache is None) else config_cache
+        self._lock = asyncio.Lock()
+
+        self.parser = FrameParser()
+        self._stale = False #a response may still be on its way after a timeout
+    #
+
+    @property
+    def port(self):
+        return self.ser.port
+    #
+
+    @property
+    def cache_key(self):
+        return (str(self.port), self.box_id)
+    #
+
+    def open(self):
+        if not self.ser.is_open:
+            self.ser.open()
+    #
+
+    def close(self):
+        if self.ser.is_open:
+            self.ser.close()
+    #
+
+    async def __aenter__(self):
+        self.open()
+        return self
+    #
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    #
+
+    def _fileno(self):
+        try:
+            return self.ser.fileno()
+        except Exception:
+            return None
+    #
+
+    async def _wait_readable(self, timeout):
+        """
+        Wait until the port has data to read, or for `timeout` seconds.
+        """
+        fd = self._fileno()
+        if fd is None:
+            await asyncio.sleep(min(timeout, self.POLL_INTERVAL))
+            return
+        #
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        try:
+            await asyncio.wait_for(readable, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fd)
+    #
+
+    def reset_input_buffer(self):
+        self.ser.reset_input_buffer()
+        self.parser.clear()
+        self._stale = False
+    #
+
+    async def _read_frame(self, cmd_byte, rx_len, timeout):
+        """
+        Read the response to `cmd_byte` (`rx_len` bytes), returning as soon as it has arrived
+        or when the deadline of `timeout` seconds expires. In this case the bytes received
+        from the start of the response are returned (short response) and the session flushes
+        the input buffer before the next command (see SISConnection._read_frame).
+        Returns the response, the number of stray bytes discarded before it and the number of
+        candidate responses rejected by the checksum.
+        """
+        parser = self.parser
+        discarded = parser.discarded
+        bad_checksums = parser.bad_checksums
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            frame = parser.find(cmd_byte, rx_len)
+            if frame is not None:
+                return (frame, parser.discarded - discarded, parser.bad_checksums - bad_checksums)
+            #
+            if (parser.bad_checksums > bad_checksums) and (parser.missing(cmd_byte, rx_len) == rx_len):
+                #Corrupted response: flush its remaining bytes before the next command
+                self._stale = True
+                return (parser.last_rejected, parser.discarded - discarded, parser.bad_checksums - bad_checksums)
+            #
+            chunk = self.ser.read(max(parser.missing(cmd_byte, rx_len), self.ser.in_waiting))
+            if chunk:
+                parser.feed(chunk)
+                continue
+            #
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await self._wait_readable(remaining)
+        #
+        self._stale = True
+        return (parser.take_all(), parser.discarded - discarded, parser.bad_checksums - bad_checksums)
+    #
+
+    async def _query(self, func_name, tx_array, rx_len, reset_input=False):
+        async with self._lock:
+            self.open()
+            t0 = time.perf_counter()
+            try:
+                #The late bytes of a timed out reply would otherwise be taken as the reply
+                #to this command
+                if reset_input or self._stale:
+                    self.reset_input_buffer()
+                self.ser.write(bytearray(tx_array))
+                rx_bytes, discarded, bad_checksums = await self._read_frame(tx_array[0], rx_len, self.timeouts[tx_array[0]])
+            except Exception as err:
+                self.metrics.record(self.port, tx_array[0], time.perf_counter() - t0, OUTCOME_ERROR)
+                print(f'ERROR --> {func_name}: failed to read the serial port {self.port}. Exception message: {err}', file=sys.stderr)
+                return None
+            #
+            outcome = frame_outcome(tx_array[0], rx_bytes, rx_len, discarded, bad_checksums)
+            self.metrics.record(self.port, tx_array[0], time.perf_counter() - t0, outcome)
+            return rx_bytes
+        #
+    #
+
+    async def _command(self, func_name, tx_array, reset_input=False):
+        rx_bytes = await self._query(func_name, tx_array, RX_ARR_LEN[tx_array[0]], reset_input)
+        if rx_bytes is None:
+            return (tx_array, None)
+        #
+        rx_array = list(rx_bytes)
+        if not validate_reply(func_name, self.port, tx_array, rx_array):
+            return (tx_array, None)
+        #
+        return (tx_array, rx_array)
+    #
+
+    async def init(self, unit):
+        return await self._command('init', tx_init(unit))
+    #
+
+    async def get_status(self):
+        return await self._command('get_status', tx_get_status())
+    #
+
+    async def get_position(self):
+        return await self._command('get_position', tx_get_position())
+    #
+
+    async def read_position(self):
+        rx_bytes = await self._query('get_position', tx_get_position(), PositionFrame.FRAME_LEN)
+        if rx_bytes is None or not check_reply('get_position', rx_bytes, PositionFrame.FRAME_LEN, CMD_GET_POSITION):
+            return None
+        #
+        return PositionFrame.from_bytes(rx_bytes)
+    #
+
+    async def read_status(self):
+        rx_bytes = await self._query('get_status', tx_get_status(), StatusFrame.FRAME_LEN)
+        if rx_bytes is None or not check_reply('get_status', rx_bytes, StatusFrame.FRAME_LEN, CMD_GET_STATUS):
+            return None
+        #
+        return StatusFrame.from_bytes(rx_bytes)
+    #
+
+    async def stop(self, unit):
+        return await self._command('stop', tx_stop(unit))
+    #
+
+    async def goto_position(self, unit, pos):
+        return await self._command('goto_position', tx_goto_position(unit, pos))
+    #
+
+    async def set_config_data(self, start_address, config_data):
+        tx_array, rx_array = await self._command('set_config_data', tx_set_config_data(start_address, config_data))
+        if rx_array is None:
+            self.config_cache.invalidate(self.cache_key)
+        else:
+            self.config_cache.update(self.cache_key, start_address, config_data)
+        #
+        return (tx_array, rx_array)
+    #
+
+    async def get_config_memory(self, max_age=None):
+        if max_age is not None:
+            rx_array = self.config_cache.get(self.cache_key, max_age)
+            if rx_array is not None:
+                return (tx_get_config_memory(), rx_array)
+        #
+        tx_array, rx_array = await self._command('get_config_memory', tx_get_config_memory(), reset_input=True)
+        if rx_array is not None:
+            self.config_cache.put(self.cache_key, rx_array)
+        return (tx_array, rx_array)
+    #
+
+    async def set_config_data_bulk(self, chunks):
+        """
+        Write several 4 bytes chunks of the config memory, given as `(start_address, config_data)`
+        pairs, one after the other. A box with disabled config write is reported once, at the
+        first chunk, and nothing else is sent.
+        Returns the lists of the start addresses of the written and of the failed chunks.
+        """
+        written = []
+        failed = []
+        for iChunk, (start_address, config_data) in enumerate(chunks):
+            rx_bytes = await self._query('set_config_data_bulk', tx_set_config_data(start_address, config_data), RX_ARR_LEN[CMD_SET_CONFIG_DATA])
+            rx_array = None if (rx_bytes is None) else list(rx_bytes)
+            if config_ack_ok(rx_array, start_address):
+                written.append(start_address)
+                self.config_cache.update(self.cache_key, start_address, config_data)
+                continue
+            #
+            self.config_cache.invalidate(self.cache_key)
+            if (iChunk == 0) and rx_array and (len(rx_array) == RX_ARR_LEN[CMD_SET_CONFIG_DATA]) and (rx_array[2] == ACK_CFG_WRITE_DISABLED):
+                print(f"ERROR --> set_config_data_bulk: failed to set config data on SIS box on port {self.port}. Config write is disabled.", file=sys.stderr)
+                return ([], [el[0] for el in chunks])
+            #
+            failed.append(start_address)
+        #
+        if failed:
+            print(f"ERROR --> set_config_data_bulk: failed to set config data on SIS box on port {self.port} at start addresses {failed}.", file=sys.stderr)
+        print(f"Write of {len(written)} chunks successful for SIS control box on port {self.port}.")
+
+        return (written, failed)
+    #
+#
@@ -1,14 +1,57 @@
+import os
+import time
+import hashlib
+
 from .libSIS import *
 
+
+#Binary config file: a 80 bytes header followed by the 248 bytes image of the config memory
+CONFIG_FILE_MAGIC = b'SISCFG'
+CONFIG_FILE_VERSION = 1
+CONFIG_FILE_HEADER = struct.Struct('<6sH32sd32s') #magic, version, label, unix time, SHA-256 of the image
+
+
+def config_file_format(fname):
+    """
+    Format of a config file from its file name: '.bin' files are binary, everything else is
+    the text format (one value per line).
+    """
+    return 'binary' if os.path.splitext(fname)[1] == '.bin' else 'text'
+
+
+def memory_hash(image):
+    """
+    Hex digest (SHA-256) of a memory image, to compare configurations without comparing
+    all the members.
+    """
+    return hashlib.sha256(bytes(image)).hexdigest()
+
+
 class BoxConfig:
     # Constants
     ACK_REM_CMD_REJECTED = 1
     ACK_INVALID_ID = 2
     ACK_INVALID_VALUE = 4
+
+    #Layout of the config memory of the box (little-endian): the 3x64 signed corrections,
+    #then wheel diameters, tape thicknesses, tape lengths, tape hole pitches (3 floats each),
+    #liquid argon level and thermal dilatation of the tape
+    MEMORY_STRUCT = struct.Struct('<192b14f')
+    MEMORY_SIZE = MEMORY_STRUCT.size
+    CHUNK_SIZE = 4
     
     def __init__(self) -> None:
         self.reset_members()
 
+        #Last image of the box memory read by "read_data_from_memory" (or written by
+        #"write_data_into_memory"), used as baseline for the differential writes
+        self.memory_image = None
+
+        #Label and unix time of the last binary config file read or written
+        self.label = ''
+        self.timestamp = None
+    #
+
     def reset_members(self) -> None:
         self.reset_corr_tables()
         #self.AbsEncCorrData_1 = [0] * 64
@@ -43,6 +86,26 @@ class BoxConfig:
     #
      
     def read_data_from_file(self, fname):
+        """
+        Read the members from a config file, binary (detected from its header, see
+        "read_data_from_binfile") or text. Returns True on success.
+        """
+        try:
+            with open(fname, 'rb') as infile:
+                is_binary = (infile.read(len(CONFIG_FILE_MAGIC)) == CONFIG_FILE_MAGIC)
+        except OSError as err:
+            print(f"An error occurred while reading from file: {err}", file=sys.stderr)
+            return False
+        #
+        if is_binary:
+            try:
+                self.read_data_from_binfile(fname)
+            except (OSError, ValueError) as err:
+                print(f"An error occurred while reading from file: {err}", file=sys.stderr)
+                return False
+            return True
+        #
+
         self.reset_members()
 
         try:
@@ -69,10 +132,75 @@ class BoxConfig:
                 self.Therm_TapeAlpha = float(infile.readline().strip())
         except Exception as err:
             print(f"An error occurred while reading from file: {err}", file=sys.stderr)
+            return False
+        #
+        return True
+    #
+
+    def read_data_from_binfile(self, fname):
+        """
+        Read the members from a binary config file. Raises ValueError if the file is not a
+        valid config file (wrong header, truncated image or content hash mismatch).
+        """
+        with open(fname, 'rb') as infile:
+            data = infile.read()
+        #
+        if len(data) != CONFIG_FILE_HEADER.size + self.MEMORY_SIZE:
+            raise ValueError(f'"{fname}" has {len(data)} bytes instead of {CONFIG_FILE_HEADER.size + self.MEMORY_SIZE}')
+        #
+        magic, version, label, timestamp, digest = CONFIG_FILE_HEADER.unpack_from(data)
+        if magic != CONFIG_FILE_MAGIC:
+            raise ValueError(f'"{fname}" is not a SIS config file')
+        if version != CONFIG_FILE_VERSION:
+            raise ValueError(f'unsupported version {version} of the config file "{fname}"')
+        #
+        image = data[CONFIG_FILE_HEADER.size:]
+        if hashlib.sha256(image).digest() != digest:
+            raise ValueError(f'content hash mismatch in "{fname}" (corrupted file)')
+        #
+        self.set_from_bytes(image)
+        self.label = label.rstrip(b'\0').decode('utf-8', errors='replace')
+        self.timestamp = timestamp
+    #
+
+    def write_data_to_binfile(self, fname, label=''):
+        """
+        Write the memory image into a binary config file, with a header holding the format
+        version, `label` (e.g. the box or the port, up to 32 bytes), the time of writing and
+        the SHA-256 of the image.
+        """
+        image = self.to_bytes()
+        self.label = label
+        self.timestamp = time.time()
+        header = CONFIG_FILE_HEADER.pack(CONFIG_FILE_MAGIC,
+                                         CONFIG_FILE_VERSION,
+                                         label.encode('utf-8')[:32],
+                                         self.timestamp,
+                                         hashlib.sha256(image).digest())
+        with open(fname, 'wb') as outfile:
+            outfile.write(header + image)
         #
     #
 
-    def write_data_to_file(self, fname):
+    def content_hash(self):
+        """
+        SHA-256 (hex digest) of the memory image of the members, see "memory_hash".
+        """
+        return memory_hash(self.to_bytes())
+    #
+
+    def write_data_to_file(self, fname, label=''):
+        """
+        Write the members into a config file: binary if the extension is '.bin' (see
+        "write_data_to_binfile"), text otherwise.
+        """
+        if config_file_format(fname) == 'binary':
+            try:
+                self.write_data_to_binfile(fname, label)
+            except (OSError, struct.error) as err:
+                print(f"An error occurred while writing to file: {err}")
+            return
+        #
         try:
             with open(fname, 'w') as file:
                 # Write integer data
@@ -99,66 +227,126 @@ class BoxConfig:
             print(f"An error occurred while writing to file: {err}")
     #
 
-    def read_data_from_memory(self, ser):
+    def to_bytes(self):
+        """
+        Pack the members into the 248 bytes image of the box config memory.
+        Raises struct.error if the members do not fit the memory layout.
+        """
+        #The corrections can also be given as unsigned bytes (128-255)
+        corr_data = [signed_char_from_byte(val) if 127 < val < 256 else val for val in (self.AbsEncCorrData[0] + self.AbsEncCorrData[1] + self.AbsEncCorrData[2])]
+        return self.MEMORY_STRUCT.pack(*corr_data,
+                                       *self.MechPar_WheelDiam,
+                                       *self.MechPar_TapeThick,
+                                       *self.MechPar_TapeLen,
+                                       *self.MechPar_TapeHolePitch,
+                                       self.Therm_LiquidArgonLevel,
+                                       self.Therm_TapeAlpha)
+    #
+
+    def set_from_bytes(self, data):
+        """
+        Set the members from a 248 bytes image of the box config memory.
+        """
+        values = self.MEMORY_STRUCT.unpack(data)
+        self.AbsEncCorrData = [list(values[0:64]), list(values[64:128]), list(values[128:192])]
+        self.MechPar_WheelDiam = list(values[192:195])
+        self.MechPar_TapeThick = list(values[195:198])
+        self.MechPar_TapeLen = list(values[198:201])
+        self.MechPar_TapeHolePitch = list(values[201:204])
+        self.Therm_LiquidArgonLevel = values[204]
+        self.Therm_TapeAlpha = values[205]
+    #
+
+    @classmethod
+    def from_bytes(cls, data):
+        config = cls()
+        config.set_from_bytes(data)
+        return config
+    #
+
+    @classmethod
+    def chunks(cls, data):
+        """
+        List of the `(start_address, chunk)` pairs of the 4 bytes chunks of a memory image,
+        the chunks being memoryview slices of `data` (no copy).
+        """
+        view = memoryview(data)
+        return [(start_address, view[start_address:start_address+cls.CHUNK_SIZE]) for start_address in range(0, len(view), cls.CHUNK_SIZE)]
+    #
+
+    def read_data_from_memory(self, ser, max_age=None):
+        """
+        Read the members from the box memory (from the config cache if it holds an image
+        younger than `max_age` seconds, see "get_config_memory").
+        """
         self.reset_members()
 
-        tx_array, rx_array = get_config_memory(ser)
+        tx_array, rx_array = get_config_memory(ser, max_age)
 
         if rx_array is None:
             return
         
-        #Convert the rx_array back the a bytearray object for proper parsing
-        rx_bytearr = bytearray(rx_array)[1:249]
+        #Strip command byte and checksum and parse the image in one go
+        rx_bytes = bytes(rx_array[1:self.MEMORY_SIZE+1])
+        self.set_from_bytes(rx_bytes)
 
-        # Populate the parsed data (example assumes specific indexing)
-        for i in range(64):
-            try:
-                self.AbsEncCorrData[0][i] = signed_char_from_byte(rx_bytearr[i])
-                self.AbsEncCorrData[1][i] = signed_char_from_byte(rx_bytearr[i + 64])
-                self.AbsEncCorrData[2][i] = signed_char_from_byte(rx_bytearr[i + 128])
-            except IndexError as err:
-                print(f'Out of array for index "i={i}". Length of "rx_bytearr"={len(rx_bytearr)}')
-                raise
-        #
-        for i in range(3):
-            self.MechPar_WheelDiam[i] = bytearray_to_float(rx_bytearr[192+(i*4):196+(i*4)])
-            self.MechPar_TapeThick[i] = bytearray_to_float(rx_bytearr[204+(i*4):208+(i*4)])
-            self.MechPar_TapeLen[i] = bytearray_to_float(rx_bytearr[216+(i*4):220+(i*4)])
-            self.MechPar_TapeHolePitch[i] = bytearray_to_float(rx_bytearr[228+(i*4):232+(i*4)])
+        self.memory_image = rx_bytes
+    #
 
-        self.Therm_LiquidArgonLevel = bytearray_to_float(rx_bytearr[240:244])
-        self.Therm_TapeAlpha = bytearray_to_float(rx_bytearr[244:248])
+    def get_memory_image(self):
+        """
+        Build the 248 bytes image of the box config memory from the members.
+        Returns None if the members do not fit the memory layout.
+        """
+        try:
+            return bytearray(self.to_bytes())
+        except struct.error as err:
+            print(f'Error while trying to write data into the memory. The members do not fit the memory layout: {err}')
+            return None
     #
 
-    def write_data_into_memory(self, ser):
-        BYTEARR_LENGTH = 248
-        
-        #First concatenate the data for the corrections tables into a single bytearray
-        data_bytearr = [byte_from_signed_char(val) for val in (self.AbsEncCorrData[0] + self.AbsEncCorrData[1] + self.AbsEncCorrData[2])]
-        
-        #Append the bytearray corresponding to the single parameters (spool diam., tape thickness, tape total length, Tape hole pitch) for each unit diameter of the three units
-        for val in (self.MechPar_WheelDiam
-                    + self.MechPar_TapeThick
-                    + self.MechPar_TapeLen
-                    + self.MechPar_TapeHolePitch
-                    ):
-            data_bytearr += float_to_bytearray(val)
-        
-        #Add the level of liquid argon in the cryostat
-        data_bytearr += float_to_bytearray(self.Therm_LiquidArgonLevel)
-        
-        #Add the the thermal dilatation of the band material
-        data_bytearr += float_to_bytearray(self.Therm_TapeAlpha)
+    def write_data_into_memory(self, ser, delta=False, baseline=None, window=4):
+        """
+        Write the members into the box memory, in chunks of 4 bytes.
 
+        With `delta=True` only the chunks that differ from the `baseline` image (by default
+        the last image read by "read_data_from_memory") are written. Without a baseline all
+        the chunks are written.
+        The chunks are sent with "set_config_data_bulk", keeping up to `window` writes in
+        flight (`window=1` gives the plain stop-and-wait transfer).
+        Returns the lists of the start addresses of the written, of the skipped and of the
+        failed chunks (all the chunks fail if the members do not fit the memory layout).
+        """
+        data_bytearr = self.get_memory_image()
+        if data_bytearr is None:
+            return ([], [], list(range(0, self.MEMORY_SIZE, self.CHUNK_SIZE)))
         
+        if baseline is None:
+            baseline = self.memory_image
+        if delta and (baseline is None):
+            print('WARNING --> No baseline image of the box memory available. All the chunks will be written.')
+        #
         
-        #Write the data in chunks of 4 bytes
-        if(len(data_bytearr) != BYTEARR_LENGTH):
-            print(f'Error while trying to write data into the memory. The byte array has {len(data_bytearr)} instead of {BYTEARR_LENGTH}')
-            return
+        to_write = []
+        skipped = []
+        baseline_chunks = dict(self.chunks(baseline)) if (delta and (baseline is not None)) else {}
+        for start_address, chunk in self.chunks(data_bytearr):
+            if (start_address in baseline_chunks) and (baseline_chunks[start_address] == chunk):
+                skipped.append(start_address)
+            else:
+                to_write.append((start_address, chunk))
+        #
+        if delta:
+            print(f'Differential write: {len(to_write)} chunks to write, {len(skipped)} unchanged chunks skipped.')
+        #
+        
+        #Write the data in chunks of 4 bytes, keeping track of what is now in the box memory
+        written, failed = set_config_data_bulk(ser, to_write, window=window)
+        new_image = bytearray(baseline) if (baseline is not None) else bytearray(data_bytearr)
+        for start_address in written:
+            new_image[start_address:start_address+4] = data_bytearr[start_address:start_address+4]
+        #
+        #Without a baseline the content of the chunks failed to be written is unknown
+        self.memory_image = bytes(new_image) if ((not failed) or (baseline is not None)) else None
         
-        for iChunk in range(int(len(data_bytearr)//4)):
-            set_config_data(ser,
-                            0+int(4*iChunk),
-                            data_bytearr[int(4*iChunk):int(4*(iChunk+1))]
-                            )
+        return (written, skipped, failed)
@@ -0,0 +1,94 @@
+import struct
+
+
+class PositionFrame:
+    """
+    Decoded reply of the "get_position" command (20 bytes).
+
+    Each field is a tuple indexed by the unit number (0, 1, 2):
+      - abs_pos: position from the absolute encoder (mm)
+      - inc_pos: position from the incremental encoder (mm)
+      - raw_msb, raw_lsb: raw bytes of the absolute encoder
+    """
+    __slots__ = ('abs_pos', 'inc_pos', 'raw_msb', 'raw_lsb')
+
+    #cmd byte, (abs, inc) positions of the 3 units, (lsb, msb) raw encoder bytes of the 3 units, checksum
+    _STRUCT = struct.Struct('<x6H6Bx')
+    FRAME_LEN = _STRUCT.size
+
+    def __init__(self, abs_pos, inc_pos, raw_msb, raw_lsb):
+        self.abs_pos = abs_pos
+        self.inc_pos = inc_pos
+        self.raw_msb = raw_msb
+        self.raw_lsb = raw_lsb
+    #
+
+    @classmethod
+    def from_bytes(cls, rx_bytes, offset=0):
+        """
+        Decode the frame directly from the reply buffer (bytes, bytearray or memoryview).
+        The list returned by "get_position" is accepted too.
+        """
+        if isinstance(rx_bytes, list):
+            rx_bytes = bytes(rx_bytes)
+        vals = cls._STRUCT.unpack_from(rx_bytes, offset)
+        return cls(vals[0:6:2], vals[1:6:2], vals[7:12:2], vals[6:12:2])
+    #
+
+    def raw(self, unit):
+        """
+        Raw reading of the absolute encoder of the unit as a 16 bits integer.
+        """
+        return 256 * self.raw_msb[unit] + self.raw_lsb[unit]
+    #
+
+    def __repr__(self):
+        return f'PositionFrame(abs_pos={self.abs_pos}, inc_pos={self.inc_pos}, raw_msb={self.raw_msb}, raw_lsb={self.raw_lsb})'
+    #
+#
+
+
+class StatusFrame:
+    """
+    Decoded reply of the "get_status" command (15 bytes).
+
+    The status byte of each unit is rx_array[8+unit], with the motor state and the
+    initialisation bits of the unit (the status of the 3 units is in rx_array[8:11]). The
+    fields are tuples indexed by the unit number (0, 1, 2):
+      - motor: motor state (bits 0-1), 0 when the motor is idle
+      - init_done: initialisation completed successfully (bit 2)
+      - init_running: initialisation in progress (bit 3)
+      - unit_status: the whole status byte
+    """
+    __slots__ = ('motor', 'init_done', 'init_running', 'unit_status')
+
+    #cmd byte, 7 bytes not decoded, status bytes of the 3 units, 4 bytes not decoded
+    _STRUCT = struct.Struct('<8x3B4x')
+    FRAME_LEN = _STRUCT.size
+
+    def __init__(self, unit_status):
+        self.unit_status = unit_status
+        self.motor = tuple(el & 3 for el in unit_status)
+        self.init_done = tuple(el >> 2 & 1 for el in unit_status)
+        self.init_running = tuple(el >> 3 & 1 for el in unit_status)
+    #
+
+    @classmethod
+    def from_bytes(cls, rx_bytes, offset=0):
+        """
+        Decode the frame directly from the reply buffer (bytes, bytearray or memoryview).
+        The list returned by "get_status" is accepted too.
+        """
+        if isinstance(rx_bytes, list):
+            rx_bytes = bytes(rx_bytes)
+        return cls(cls._STRUCT.unpack_from(rx_bytes, offset))
+    #
+
+    def is_moving(self, unit):
+        return self.motor[unit] != 0
+    #
+
+    def __repr__(self):
+        return f'StatusFrame(unit_status={self.unit_status})'
+    #
+#
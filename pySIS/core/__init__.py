@@ -1,5 +1,15 @@
-from .libSIS import goto_position, get_position, get_status, init, stop
+from .libSIS import goto_position, get_position, get_status, read_position, read_status, init, stop, SISConnection, RetryPolicy, FrameParser
+from .Frames import PositionFrame, StatusFrame
 from .BoxConfig import BoxConfig
+from .AsyncSISConnection import AsyncSISConnection
+from .tracking import track, move_units, wait_settled, TrackSample, AdaptivePollRate
+from .calibration import CalibPlan, ScanSegment, run_plan
+from .orchestrator import MoveJob, MultiBoxMover, move_boxes
+from .daemon import SISDaemon, SISClient, open_session
+from .scheduler import CommandScheduler
+from .runlog import RunLogWriter, read_runlog_records, runlog_to_text
+from .libSIS import METRICS, CONFIG_CACHE, ConfigCache
+from .metrics import Metrics, MetricsExporter
 
 # Define the public API
-__all__ = ['goto_position', 'get_position', 'get_status', 'init', 'stop', 'BoxConfig']
\ No newline at end of file
+__all__ = ['goto_position', 'get_position', 'get_status', 'read_position', 'read_status', 'init', 'stop', 'SISConnection', 'RetryPolicy', 'FrameParser', 'AsyncSISConnection', 'PositionFrame', 'StatusFrame', 'BoxConfig', 'track', 'move_units', 'wait_settled', 'TrackSample', 'AdaptivePollRate', 'CalibPlan', 'ScanSegment', 'run_plan', 'MoveJob', 'MultiBoxMover', 'move_boxes', 'SISDaemon', 'SISClient', 'open_session', 'CommandScheduler', 'RunLogWriter', 'read_runlog_records', 'runlog_to_text', 'METRICS', 'CONFIG_CACHE', 'ConfigCache', 'Metrics', 'MetricsExporter']
\ No newline at end of file
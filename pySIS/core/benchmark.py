@@ -0,0 +1,167 @@
+import sys
+import time
+import json
+import platform
+from datetime import datetime
+
+from .libSIS import _as_session
+from .BoxConfig import BoxConfig
+
+
+PERCENTILES = (50, 90, 99)
+
+
+def _percentile(sorted_values, perc):
+    """
+    Percentile with linear interpolation between the closest ranks.
+    """
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * perc / 100.
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+#
+
+
+def latency_summary(latencies, failures=0):
+    """
+    Summary (in milliseconds) of a list of latencies in seconds.
+    """
+    values = sorted(1000. * el for el in latencies)
+    summary = {'count': len(values), 'failures': failures}
+    if values:
+        summary['min_ms'] = values[0]
+        summary['mean_ms'] = sum(values) / len(values)
+        for perc in PERCENTILES:
+            summary[f'p{perc}_ms'] = _percentile(values, perc)
+        summary['max_ms'] = values[-1]
+    #
+    return summary
+#
+
+
+def bench_command_latency(ser, n=200, unit=0):
+    """
+    Round trip latency of "get_position", "get_status" and "goto_position".
+
+    "goto_position" sends `unit` to its current incremental position, so the box does not
+    move. Each command is repeated `n` times, a failed command is counted and not timed.
+    """
+    ser = _as_session(ser)
+
+    frame = ser.read_position()
+    if frame is None:
+        print(f'ERROR --> bench_command_latency: cannot read the position of the units on port {ser.port}.', file=sys.stderr)
+        return None
+    #
+    here = frame.inc_pos[unit]
+
+    commands = {'get_position': ser.get_position,
+                'get_status': ser.get_status,
+                'goto_position': lambda: ser.goto_position(unit, here)
+                }
+    results = {}
+    for name, command in commands.items():
+        latencies = []
+        failures = 0
+        for _ in range(n):
+            t0 = time.perf_counter()
+            tx_array, rx_array = command()
+            dt = time.perf_counter() - t0
+            if rx_array is None:
+                failures += 1
+            else:
+                latencies.append(dt)
+        #
+        results[name] = latency_summary(latencies, failures)
+    #
+    return results
+#
+
+
+def bench_poll_rate(ser, duration=5.):
+    """
+    Maximum sustainable poll rate of a tracking loop: position and status read back to back,
+    without sleeping, for `duration` seconds.
+    """
+    ser = _as_session(ser)
+
+    polls = 0
+    failures = 0
+    t0 = time.perf_counter()
+    while (time.perf_counter() - t0) < duration:
+        frame = ser.read_position()
+        status = ser.read_status()
+        if (frame is None) or (status is None):
+            failures += 1
+        else:
+            polls += 1
+    #
+    elapsed = time.perf_counter() - t0
+    return {'duration_s': elapsed, 'polls': polls, 'failures': failures, 'rate_hz': polls / elapsed}
+#
+
+
+def bench_config_transfer(ser, write=True, window=4):
+    """
+    End to end times of "BoxConfig.read_data_from_memory" and, if `write=True`, of
+    "BoxConfig.write_data_into_memory" (full write of the image just read, so the box
+    content does not change) and of a differential write with nothing to change.
+    """
+    ser = _as_session(ser)
+
+    results = {}
+    config = BoxConfig()
+    t0 = time.perf_counter()
+    config.read_data_from_memory(ser)
+    results['read_s'] = time.perf_counter() - t0
+    if config.memory_image is None:
+        print(f'ERROR --> bench_config_transfer: cannot read the config memory of the box on port {ser.port}.', file=sys.stderr)
+        results['read_ok'] = False
+        return results
+    #
+    results['read_ok'] = True
+
+    if write:
+        t0 = time.perf_counter()
+        written, skipped, failed = config.write_data_into_memory(ser, window=window)
+        results['write_full_s'] = time.perf_counter() - t0
+        results['write_full_chunks'] = len(written)
+
+        t0 = time.perf_counter()
+        written, skipped, failed = config.write_data_into_memory(ser, delta=True, window=window)
+        results['write_delta_s'] = time.perf_counter() - t0
+        results['write_delta_chunks'] = len(written)
+    #
+    return results
+#
+
+
+def run_benchmarks(ser, n=200, poll_duration=5., config=True, config_write=False, unit=0):
+    """
+    Run the benchmarks against the box (or the simulator) and return the results as a dict.
+    """
+    ser = _as_session(ser)
+
+    results = {'port': str(ser.port),
+               'date': datetime.now().isoformat(timespec='seconds'),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'n': n
+               }
+    results['latency'] = bench_command_latency(ser, n=n, unit=unit)
+    results['poll'] = bench_poll_rate(ser, duration=poll_duration)
+    if config:
+        results['config'] = bench_config_transfer(ser, write=config_write)
+    #
+    return results
+#
+
+
+def write_results(results, fname):
+    with open(fname, 'w') as outfile:
+        json.dump(results, outfile, indent=2)
+        outfile.write('\n')
+    #
+#
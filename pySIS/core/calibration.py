@@ -0,0 +1,224 @@
+import sys
+import json
+import time
+
+from .libSIS import read_position
+from .tracking import TrackSample, AdaptivePollRate, move_units, wait_settled
+
+
+#Direction codes of the calibration logs
+DIRECTION_DOWN = 0 #towards larger positions (the source goes down into the detector)
+DIRECTION_UP = 1 #towards smaller positions
+
+
+class ScanSegment:
+    """
+    One leg of a calibration plan: the units go from where they are to `target` (in mm) in
+    steps of `step` mm.
+
+    Before every step the units rest until settled (within `tolerance` mm for `dwell`
+    seconds, and at least `min_dwell` seconds, see "wait_settled"). During the steps the
+    positions are sampled at up to `rate_hz`, slowing down to `min_rate_hz` during the long
+    travels (see AdaptivePollRate).
+    """
+
+    __slots__ = ('target', 'step', 'dwell', 'min_dwell', 'tolerance', 'rate_hz', 'min_rate_hz')
+
+    def __init__(self, target, step=50, dwell=2., min_dwell=0., tolerance=1, rate_hz=50., min_rate_hz=2.):
+        if step <= 0:
+            raise ValueError(f'The step of a scan segment must be positive ({step} mm given)')
+        #
+        self.target = int(target)
+        self.step = int(step)
+        self.dwell = dwell
+        self.min_dwell = min_dwell
+        self.tolerance = tolerance
+        self.rate_hz = rate_hz
+        self.min_rate_hz = min_rate_hz
+    #
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+    #
+
+    def __repr__(self):
+        return 'ScanSegment(' + ', '.join(f'{name}={getattr(self, name)}' for name in self.__slots__) + ')'
+    #
+#
+
+
+def _next_pos(pos, target, step):
+    if pos < target:
+        return min(pos + step, target)
+    return max(pos - step, target)
+
+
+class CalibPlan:
+    """
+    Declarative plan of a calibration run: the `units` (moved together) go through the
+    ScanSegments of `segments` in order. The targets are limited to `max_pos`.
+
+    A step ends when the motors of the units are idle (after up to `start_grace` seconds for
+    them to start), and the next one starts from the positions actually reached. A segment
+    is completed when the units are within the `tolerance` of the segment from its target.
+
+    A plan can be written as a dict (or a JSON file), e.g. a dense scan only in the region of
+    interest and a coarse return:
+
+        {"units": [0],
+         "segments": [{"target": 3000, "step": 200},
+                      {"target": 4000, "step": 20, "dwell": 5},
+                      {"target": 0, "step": 500}]}
+    """
+
+    def __init__(self, units, segments, max_pos=8890, settle_timeout=30., track_timeout=60*25, start_grace=1.):
+        self.units = [int(unit) for unit in units]
+        self.segments = list(segments)
+        self.max_pos = max_pos
+        self.settle_timeout = settle_timeout
+        self.track_timeout = track_timeout
+        self.start_grace = start_grace
+    #
+
+    @classmethod
+    def from_dict(cls, plan_dict):
+        plan_dict = dict(plan_dict)
+        segments = [ScanSegment(**el) for el in plan_dict.pop('segments')]
+        return cls(segments=segments, **plan_dict)
+    #
+
+    def as_dict(self):
+        return {'units': list(self.units),
+                'segments': [el.as_dict() for el in self.segments],
+                'max_pos': self.max_pos,
+                'settle_timeout': self.settle_timeout,
+                'track_timeout': self.track_timeout,
+                'start_grace': self.start_grace
+                }
+    #
+
+    @classmethod
+    def load(cls, fname):
+        with open(fname, 'r') as infile:
+            return cls.from_dict(json.load(infile))
+    #
+
+    def save(self, fname):
+        with open(fname, 'w') as outfile:
+            json.dump(self.as_dict(), outfile, indent=2)
+            outfile.write('\n')
+    #
+
+    def _start_positions(self, start_pos):
+        if isinstance(start_pos, dict):
+            return {unit: int(start_pos[unit]) for unit in self.units}
+        return {unit: int(start_pos) for unit in self.units}
+    #
+
+    def steps(self, start_pos=0):
+        """
+        List of the steps of the plan as `(segment index, {unit: position})` pairs, assuming
+        that every step reaches its target. `start_pos` is the position of all the units, or
+        a dict {unit: position}.
+        """
+        pos = self._start_positions(start_pos)
+        result = []
+        for iSeg, segment in enumerate(self.segments):
+            target = min(segment.target, self.max_pos)
+            while any(pos[unit] != target for unit in self.units):
+                new_pos = {unit: _next_pos(pos[unit], target, segment.step) for unit in self.units if pos[unit] != target}
+                result.append((iSeg, new_pos))
+                pos.update(new_pos)
+            #
+        #
+        return result
+    #
+
+    def estimate(self, start_pos=0, speed=10., step_overhead=0.5):
+        """
+        Estimated duration (in seconds) of the run: for every step the rest before it, the
+        travel at `speed` mm/s and a fixed `step_overhead` (communication, motor start and
+        stop, tracking of the end of the movement).
+        """
+        pos = self._start_positions(start_pos)
+        duration = 0.
+        for iSeg, new_pos in self.steps(start_pos):
+            segment = self.segments[iSeg]
+            travel = max(abs(new_pos[unit] - pos[unit]) for unit in new_pos)
+            duration += max(segment.dwell, segment.min_dwell) + travel / speed + step_overhead
+            pos.update(new_pos)
+        #
+        return duration
+    #
+#
+
+
+def _off_target(pos, target, tolerance):
+    return abs(pos - target) > tolerance
+
+
+def _frame_samples(frame, units):
+    unixtime = time.time()
+    return [TrackSample(unixtime, unit, frame.inc_pos[unit], frame.abs_pos[unit], frame.raw_msb[unit], frame.raw_lsb[unit], None) for unit in units]
+
+
+def run_plan(ser, plan):
+    """
+    Generator executing a CalibPlan on the box.
+
+    It yields `(segment index, direction, sample)` for every TrackSample of the movements,
+    plus one sample per unit from a position check at the start of every segment and at the
+    end of the run. `direction` is DIRECTION_DOWN or DIRECTION_UP. The steps start from the
+    positions actually reached, and the run is aborted (with an error on stderr) if a step
+    does not move any unit.
+    """
+    frame = read_position(ser)
+    if frame is None:
+        print('ERROR --> run_plan: cannot read the positions at the start of the run.', file=sys.stderr)
+        return
+    #
+    pos = {unit: frame.inc_pos[unit] for unit in plan.units}
+    direction = {unit: DIRECTION_DOWN for unit in plan.units}
+
+    for iSeg, segment in enumerate(plan.segments):
+        target = min(segment.target, plan.max_pos)
+        for unit in plan.units:
+            if _off_target(pos[unit], target, segment.tolerance):
+                direction[unit] = DIRECTION_DOWN if (target > pos[unit]) else DIRECTION_UP
+        #
+
+        #Position check at the start of the segment
+        frame = read_position(ser)
+        if frame is not None:
+            for sample in _frame_samples(frame, plan.units):
+                yield (iSeg, direction[sample.unit], sample)
+        #
+
+        while any(_off_target(pos[unit], target, segment.tolerance) for unit in plan.units):
+            for sample in wait_settled(ser, units=plan.units, tolerance=segment.tolerance, dwell=segment.dwell, min_dwell=segment.min_dwell, timeout=plan.settle_timeout):
+                pos[sample.unit] = sample.inc_pos
+            #
+
+            new_pos = {unit: _next_pos(pos[unit], target, segment.step) for unit in plan.units if _off_target(pos[unit], target, segment.tolerance)}
+            print(f'Position request {new_pos} transmitted.')
+            rate = AdaptivePollRate(min_hz=segment.min_rate_hz, max_hz=segment.rate_hz, targets=new_pos)
+
+            old_pos = dict(pos)
+            for sample in move_units(ser, new_pos, rate_hz=rate, timeout=plan.track_timeout, start_grace=plan.start_grace):
+                pos[sample.unit] = sample.inc_pos
+                yield (iSeg, direction[sample.unit], sample)
+            #
+            if pos == old_pos:
+                print(f'ERROR --> run_plan: no unit moved towards {new_pos}. Aborting the run.', file=sys.stderr)
+                return
+            #
+            print(f'Step of segment {iSeg} completed.')
+        #
+    #
+
+    #Position check at the end of the run
+    frame = read_position(ser)
+    if frame is not None:
+        for sample in _frame_samples(frame, plan.units):
+            yield (len(plan.segments) - 1, direction[sample.unit], sample)
+    #
@@ -0,0 +1,141 @@
+import sys
+import copy
+
+import numpy as np
+
+from .loader import load_runlog, load_runlogs
+from .BoxConfig import BoxConfig
+
+
+NSLOTS = 64 #Entries of the correction table of each unit
+
+#Slot mappings of the samples onto the correction table
+SLOTS_RAW = 'raw' #top 6 bits of the raw absolute encoder reading (angle of the wheel)
+SLOTS_POSITION = 'position' #equal bins of the incremental position over a span
+
+#Range of the valid positions in the run logs (the same of the scripts)
+VALID_POS = (-25, 10500)
+
+
+def _signed_pos(values):
+    """
+    Positions as signed integers (the run logs store them as unsigned 16 bits).
+    """
+    values = values.astype(np.int32)
+    return np.where(values > 32767, values - 65536, values)
+
+
+def slot_index(records, slots=SLOTS_RAW, span=None):
+    """
+    Slot of the correction table of every record.
+
+    The layout of the correction table in the firmware is an assumption of this module, and
+    it is chosen with `slots`:
+      - SLOTS_RAW: the slot is given by the 6 most significant bits of the raw reading of the
+        absolute encoder, i.e. the table corrects the reading as a function of the angle of
+        the wheel (64 sectors of 5.625 deg);
+      - SLOTS_POSITION: the incremental positions in `span` = (min, max) mm (default: the
+        range of the data) are divided in 64 equal bins; the records outside get -1.
+    """
+    if slots == SLOTS_RAW:
+        return (records['raw_msb'].astype(np.int32) >> 2)
+    #
+    if slots == SLOTS_POSITION:
+        inc = _signed_pos(records['inc'])
+        if span is None:
+            span = (inc.min(), inc.max() + 1) if inc.size else (0, 1)
+        #
+        lo, hi = span
+        index = np.floor((inc - lo) * NSLOTS / float(hi - lo)).astype(np.int32)
+        return np.where((index >= 0) & (index < NSLOTS), index, -1)
+    #
+    raise ValueError(f'Unknown slot mapping "{slots}"')
+
+
+def _fill_empty(values, counts, circular):
+    """
+    Fill the slots without data by linear interpolation of their neighbours (around the
+    wheel for the circular mappings).
+    """
+    filled = counts > 0
+    if filled.all() or not filled.any():
+        return np.where(filled, values, 0.)
+    #
+    slots = np.arange(NSLOTS)
+    period = NSLOTS if circular else None
+    return np.interp(slots, slots[filled], values[filled], period=period)
+
+
+def fit_corr_table(records, slots=SLOTS_RAW, span=None, lsb_mm=1., stat='mean', min_count=1):
+    """
+    Fit the correction table of one unit from the records of its run logs (see "load_runlog").
+
+    For every record the residual inc - abs (in mm) is assigned to a slot (see "slot_index"),
+    and the correction of each slot is the mean (or, with `stat='median'`, the median) of its
+    residuals, in units of `lsb_mm` mm, rounded and clamped to a signed byte. The slots with
+    fewer than `min_count` records are interpolated from the neighbouring ones.
+    The records with positions out of VALID_POS are ignored.
+    Returns the table (64 integers, int8) and the number of records in each slot.
+    """
+    inc = _signed_pos(records['inc'])
+    abs_pos = _signed_pos(records['abs'])
+    index = slot_index(records, slots, span)
+
+    valid = ((inc >= VALID_POS[0]) & (inc <= VALID_POS[1])
+             & (abs_pos >= VALID_POS[0]) & (abs_pos <= VALID_POS[1])
+             & (index >= 0))
+    residuals = (inc - abs_pos)[valid].astype(np.float64)
+    index = index[valid]
+
+    counts = np.bincount(index, minlength=NSLOTS)
+    if stat == 'mean':
+        sums = np.bincount(index, weights=residuals, minlength=NSLOTS)
+        values = np.divide(sums, counts, out=np.zeros(NSLOTS), where=counts > 0)
+    elif stat == 'median':
+        order = np.argsort(index, kind='stable')
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        sorted_res = residuals[order]
+        values = np.array([np.median(sorted_res[bounds[iSlot]:bounds[iSlot+1]]) if counts[iSlot] else 0. for iSlot in range(NSLOTS)])
+    else:
+        raise ValueError(f'Unknown statistic "{stat}"')
+    #
+
+    enough = counts >= min_count
+    values = _fill_empty(values, np.where(enough, counts, 0), circular=(slots == SLOTS_RAW))
+    table = np.clip(np.rint(values / lsb_mm), -128, 127).astype(np.int8)
+
+    nclamped = int(np.count_nonzero(np.abs(np.rint(values / lsb_mm)) > 127))
+    if nclamped:
+        print(f'WARNING --> fit_corr_table: {nclamped} corrections clamped to the signed byte range.', file=sys.stderr)
+    #
+    return (table, counts)
+
+
+def fit_box_config(logs, base_config=None, **fit_pars):
+    """
+    Fit the correction tables of several units and return them in a BoxConfig.
+
+    `logs` is a dict {unit: run logs}, where the run logs are a file name, a list of file
+    names, a glob pattern or an already loaded structured array. The binary run logs contain
+    the records of all the units, and only the ones of the unit are used.
+    The other members are copied from `base_config` (e.g. the configuration read from the
+    box), or are the defaults of BoxConfig. `fit_pars` are passed to "fit_corr_table".
+    """
+    config = BoxConfig() if (base_config is None) else copy.deepcopy(base_config)
+    for unit, unit_logs in logs.items():
+        if isinstance(unit_logs, np.ndarray):
+            records = unit_logs
+        elif isinstance(unit_logs, str) and not any(char in unit_logs for char in '*?['):
+            records = load_runlog(unit_logs, unit)
+        else:
+            records = load_runlogs(unit_logs, unit)
+        #
+        records = records[records['unit'] == unit]
+        if records.size == 0:
+            print(f'WARNING --> fit_box_config: no records for unit {unit}. Its correction table is not changed.', file=sys.stderr)
+            continue
+        #
+        table, counts = fit_corr_table(records, **fit_pars)
+        config.set_corr_table(unit, table.tolist())
+    #
+    return config
@@ -0,0 +1,455 @@
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import threading
+import socketserver
+import serial
+
+from .libSIS import *
+from .Frames import PositionFrame, StatusFrame
+from .scheduler import CommandScheduler
+
+
+#Environment variable with the address of the daemon used by "open_session"
+DAEMON_ENV = 'SIS_DAEMON'
+
+#Messages: 4 bytes length (little-endian) followed by the JSON payload
+MSG_HEADER = struct.Struct('<I')
+MAX_MSG_LEN = 1 << 20
+
+#Commands the clients can send to the boxes
+BOX_METHODS = ('init', 'get_status', 'get_position', 'stop', 'goto_position', 'set_config_data', 'set_config_data_bulk', 'get_config_memory')
+
+#Telemetry commands whose recent results are shared between the clients
+SHARED_METHODS = ('get_status', 'get_position')
+
+
+def parse_address(address):
+    """
+    Socket family and address from a daemon address: 'host:port' for localhost TCP,
+    anything else is the path of a Unix socket.
+    """
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return (socket.AF_INET, (host or '127.0.0.1', int(port)))
+    return (socket.AF_UNIX, address)
+
+
+def send_msg(sock, obj):
+    payload = json.dumps(obj, separators=(',', ':')).encode('utf-8')
+    sock.sendall(MSG_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError('connection closed')
+        data += chunk
+    #
+    return bytes(data)
+
+
+def recv_msg(sock):
+    size = MSG_HEADER.unpack(_recv_exact(sock, MSG_HEADER.size))[0]
+    if size > MAX_MSG_LEN:
+        raise ValueError(f'message too long ({size} bytes)')
+    return json.loads(_recv_exact(sock, size).decode('utf-8'))
+
+
+def daemon_alive(address):
+    """
+    True if a daemon accepts connections at `address`.
+    """
+    family, sock_address = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(1.)
+    try:
+        sock.connect(sock_address)
+    except OSError:
+        return False
+    finally:
+        sock.close()
+    #
+    return True
+
+
+class SharedBox:
+    """
+    Session with one box owned by the daemon. The commands of all the clients go through a
+    CommandScheduler: a "stop" jumps ahead of the commands of the other clients, and cuts
+    the retries and the remaining chunks of the command on the wire (see CommandScheduler).
+    The latencies of the stops are measured there, from their arrival at the daemon to the
+    moment they are written to the serial port.
+
+    A telemetry request waiting for the same request of another client gets its result
+    instead of going on the wire, if that poll was queued after the request arrived: it is
+    as recent as a poll of its own. Any other command (motion, config) discards the results
+    to share.
+
+    The serial port is opened in exclusive mode (on POSIX, see `serial.Serial`), so that a
+    second daemon, or a script, cannot interleave its commands with the ones of the daemon.
+    """
+
+    def __init__(self, port, baudrate=9600):
+        self.scheduler = CommandScheduler(SISConnection(serial.Serial(port=port, baudrate=baudrate, timeout=0.5, exclusive=True)))
+        self.lock = threading.Lock()
+        self._polls = {method: threading.Lock() for method in SHARED_METHODS}
+        self._latest = {} #method -> (monotonic time the poll was queued, result)
+    #
+
+    def call(self, method, args):
+        arrival = time.monotonic()
+        if method not in SHARED_METHODS:
+            #The state of the box may change: no poll before this command can be shared
+            with self.lock:
+                self._latest.clear()
+            return getattr(self.scheduler, method)(*args)
+        #
+        with self._polls[method]:
+            with self.lock:
+                latest = self._latest.get(method)
+            if (latest is not None) and (latest[0] >= arrival):
+                return latest[1]
+            #
+            start = time.monotonic()
+            result = getattr(self.scheduler, method)(*args)
+            with self.lock:
+                self._latest[method] = (start, result)
+        #
+        return result
+    #
+
+    def stop_latency_summary(self):
+        return self.scheduler.stop_latency_summary()
+    #
+
+    def close(self):
+        self.scheduler.close()
+    #
+#
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self.server.sis_daemon._add_client(self.request)
+    #
+
+    def finish(self):
+        self.server.sis_daemon._remove_client(self.request)
+    #
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_msg(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            #
+            try:
+                response = {'result': self.server.sis_daemon.dispatch(request)}
+            except Exception as err:
+                response = {'error': f'{type(err).__name__}: {err}'}
+            #
+            try:
+                send_msg(self.request, response)
+            except OSError:
+                return
+        #
+    #
+#
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SISDaemon:
+    """
+    Daemon owning the serial ports of the SIS boxes and serving the commands of local clients
+    (see SISClient) over a Unix socket or a localhost TCP socket.
+
+    There is a single session per box, so the commands of concurrent clients never interleave
+    on the wire. The boxes in `ports` are opened at the start, the other ones at the first
+    request of a client. A RuntimeError is raised if another daemon is already serving at
+    `address`.
+    """
+
+    def __init__(self, address, ports=(), baudrate=9600):
+        self.address = address
+        self.baudrate = baudrate
+
+        family, sock_address = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(sock_address):
+                if daemon_alive(address):
+                    raise RuntimeError(f'a SIS daemon is already serving at {address}')
+                #Left behind by a daemon that did not shut down
+                os.remove(sock_address)
+            #
+            self._server = _UnixServer(sock_address, _RequestHandler)
+        else:
+            self._server = _TCPServer(sock_address, _RequestHandler)
+        #
+        self._server.sis_daemon = self
+        self._thread = None
+
+        self._clients = set()
+        self._clients_lock = threading.Lock()
+
+        self._boxes = {}
+        self._boxes_lock = threading.Lock()
+        try:
+            for port in ports:
+                self.box(port)
+            #
+        except Exception:
+            self._server.server_close()
+            if family == socket.AF_UNIX:
+                os.remove(sock_address)
+            raise
+        #
+    #
+
+    def _add_client(self, sock):
+        with self._clients_lock:
+            self._clients.add(sock)
+    #
+
+    def _remove_client(self, sock):
+        with self._clients_lock:
+            self._clients.discard(sock)
+    #
+
+    def box(self, port):
+        with self._boxes_lock:
+            box = self._boxes.get(port)
+            if box is None:
+                box = self._boxes[port] = SharedBox(port, self.baudrate)
+        #
+        return box
+    #
+
+    def dispatch(self, request):
+        method = request.get('method')
+        if method == 'ping':
+            return 'pong'
+        if method == 'ports':
+            return sorted(self._boxes)
+        if method == 'metrics':
+            return METRICS.snapshot()
+        if method == 'stop_latency':
+            return self.box(request['port']).stop_latency_summary()
+        if method not in BOX_METHODS:
+            raise ValueError(f'unknown method "{method}"')
+        #
+        return self.box(request['port']).call(method, request.get('args', []))
+    #
+
+    def serve_forever(self):
+        self._server.serve_forever()
+    #
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='SIS-daemon', daemon=True)
+        self._thread.start()
+        return self
+    #
+
+    def shutdown(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        #
+        self._server.server_close()
+        #Disconnect the clients, so that their handlers stop before the ports are closed
+        with self._clients_lock:
+            for sock in self._clients:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            #
+        #
+        for box in self._boxes.values():
+            box.close()
+        #
+        family, sock_address = parse_address(self.address)
+        if (family == socket.AF_UNIX) and os.path.exists(sock_address):
+            os.remove(sock_address)
+    #
+#
+
+
+class SISClient:
+    """
+    Client of a SISDaemon, with the same commands of SISConnection for the box at `port`.
+    It can be passed as `ser` to the module level functions, to "track", to BoxConfig...
+
+    The commands return the values of SISConnection, with `rx_array=None` (or None for the
+    frames) when the daemon cannot be reached or the command fails.
+    """
+
+    def __init__(self, address, port, timeout=60.):
+        self.address = address
+        self.timeout = timeout
+        self._port = port
+        self._sock = None
+        self._lock = threading.Lock()
+        self._connect()
+    #
+
+    def _connect(self):
+        family, sock_address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(sock_address)
+        self._sock = sock
+    #
+
+    @property
+    def port(self):
+        return self._port
+    #
+
+    @property
+    def is_open(self):
+        return self._sock is not None
+    #
+
+    def open(self):
+        if self._sock is None:
+            self._connect()
+    #
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+    #
+
+    def __enter__(self):
+        self.open()
+        return self
+    #
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    #
+
+    def request(self, method, *args):
+        """
+        Send a request to the daemon and return its result. Raises RuntimeError if the
+        daemon reports an error, OSError/ConnectionError if it cannot be reached.
+        """
+        with self._lock:
+            try:
+                self.open()
+                send_msg(self._sock, {'port': self._port, 'method': method, 'args': list(args)})
+                response = recv_msg(self._sock)
+            except (OSError, ConnectionError, ValueError):
+                #Reconnect at the next request
+                self.close()
+                raise
+            #
+        #
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['result']
+    #
+
+    def _command(self, func_name, tx_array, method, *args):
+        try:
+            tx_array, rx_array = self.request(method, *args)
+        except Exception as err:
+            print(f'ERROR --> {func_name}: request to the SIS daemon at {self.address} failed. Exception message: {err}', file=sys.stderr)
+            return (tx_array, None)
+        #
+        return (tx_array, rx_array)
+    #
+
+    def init(self, unit):
+        return self._command('init', tx_init(unit), 'init', unit)
+    #
+
+    def get_status(self):
+        return self._command('get_status', tx_get_status(), 'get_status')
+    #
+
+    def get_position(self):
+        return self._command('get_position', tx_get_position(), 'get_position')
+    #
+
+    def read_position(self):
+        tx_array, rx_array = self.get_position()
+        if rx_array is None:
+            return None
+        return PositionFrame.from_bytes(rx_array)
+    #
+
+    def read_status(self):
+        tx_array, rx_array = self.get_status()
+        if rx_array is None:
+            return None
+        return StatusFrame.from_bytes(rx_array)
+    #
+
+    def stop(self, unit):
+        return self._command('stop', tx_stop(unit), 'stop', unit)
+    #
+
+    def goto_position(self, unit, pos):
+        return self._command('goto_position', tx_goto_position(unit, pos), 'goto_position', unit, pos)
+    #
+
+    def set_config_data(self, start_address, config_data):
+        return self._command('set_config_data', tx_set_config_data(start_address, config_data), 'set_config_data', start_address, list(config_data[:4]))
+    #
+
+    def set_config_data_bulk(self, chunks, window=4, retries=2):
+        chunks = [[int(start_address), list(config_data[:4])] for start_address, config_data in chunks]
+        try:
+            written, failed = self.request('set_config_data_bulk', chunks, window, retries)
+        except Exception as err:
+            print(f'ERROR --> set_config_data_bulk: request to the SIS daemon at {self.address} failed. Exception message: {err}', file=sys.stderr)
+            return ([], [el[0] for el in chunks])
+        #
+        return (written, failed)
+    #
+
+    def get_config_memory(self, max_age=None):
+        return self._command('get_config_memory', tx_get_config_memory(), 'get_config_memory', max_age)
+    #
+
+    def stop_latency_summary(self):
+        """
+        Summary (in milliseconds, see "benchmark.latency_summary") of the latencies of the
+        stops of all the clients of the box, measured by the daemon up to the serial port.
+        """
+        return self.request('stop_latency')
+    #
+#
+
+
+def open_session(port, daemon=None, **kwargs):
+    """
+    Session with the box at `port`: through the daemon at the address `daemon` (by default
+    the one in the SIS_DAEMON environment variable), or a direct SISConnection if no daemon
+    is given. `kwargs` are passed to SISConnection.
+    """
+    if daemon is None:
+        daemon = os.environ.get(DAEMON_ENV) or None
+    if daemon is None:
+        return SISConnection(port, **kwargs)
+    return SISClient(daemon, port)
@@ -4,6 +4,10 @@ import serial
 import time
 from datetime import datetime
 import struct
+import threading
+
+from .Frames import PositionFrame, StatusFrame
+from .metrics import Metrics, OUTCOME_OK, OUTCOME_RESYNC, OUTCOME_TIMEOUT, OUTCOME_SHORT_READ, OUTCOME_WRONG_CMD, OUTCOME_CHECKSUM, OUTCOME_ERROR
 
 
 #checksum used to ensure correct communication
@@ -11,339 +15,935 @@ def check_sum (array):
    csum = (sum(array) & 255) ^ 255
    return csum
 
-def init(ser, unit):
-    CMD_BYTE = 170
-    RX_ARR_LEN = 4
+#Command bytes of the SIS control box protocol
+CMD_INIT = 170
+CMD_GET_STATUS = 51
+CMD_GET_POSITION = 85
+CMD_STOP = 195
+CMD_GOTO_POSITION = 15
+CMD_SET_CONFIG_DATA = 136
+CMD_GET_CONFIG_MEM = 119
+
+#Acknowledge bytes of the config write
+ACK_OK = 0
+ACK_CFG_WRITE_DISABLED = 16
+
+#Length of the response array of each command
+RX_ARR_LEN = {CMD_INIT: 4,
+              CMD_GET_STATUS: 15,
+              CMD_GET_POSITION: 20,
+              CMD_STOP: 4,
+              CMD_GOTO_POSITION: 6,
+              CMD_SET_CONFIG_DATA: 4,
+              CMD_GET_CONFIG_MEM: 250}
+
+#Commands whose response array is validated with the checksum
+RX_HAS_CHECKSUM = (CMD_SET_CONFIG_DATA, CMD_GET_CONFIG_MEM)
+
+#Per port and per command counters of the traffic of all the sessions
+METRICS = Metrics({CMD_INIT: 'init',
+                   CMD_GET_STATUS: 'get_status',
+                   CMD_GET_POSITION: 'get_position',
+                   CMD_STOP: 'stop',
+                   CMD_GOTO_POSITION: 'goto_position',
+                   CMD_SET_CONFIG_DATA: 'set_config_data',
+                   CMD_GET_CONFIG_MEM: 'get_config_memory'})
+
+
+#Builders of the command packets (7 bytes, the last one is the checksum)
+def _tx_array(cmd_byte, byte1=0, byte2=0, byte3=0, byte4=0, byte5=0):
+    tx_array = [cmd_byte, byte1, byte2, byte3, byte4, byte5]
+    tx_array.append(check_sum(tx_array))
+    return tx_array
+
+def tx_init(unit):
+    return _tx_array(CMD_INIT, unit, CMD_INIT ^ 255, unit ^ 255, CMD_INIT ^ 255, unit ^ 255)
+
+def tx_get_status():
+    return _tx_array(CMD_GET_STATUS)
+
+def tx_get_position():
+    return _tx_array(CMD_GET_POSITION)
+
+def tx_stop(unit):
+    return _tx_array(CMD_STOP, unit, CMD_STOP ^ 255, unit ^ 255, CMD_STOP ^ 255, unit ^ 255)
+
+def tx_goto_position(unit, pos):
+    pos_lsb = pos & 255
+    pos_msb = pos // 256
+    return _tx_array(CMD_GOTO_POSITION, unit, pos_lsb, pos_msb, CMD_GOTO_POSITION ^ 255, unit ^ 255)
 
-    if not ser.is_open:
-        ser.open()
-    
-    tx_array=[CMD_BYTE,
-             unit,
-             CMD_BYTE ^ 255,
-             unit ^ 255,
-             CMD_BYTE ^ 255,
-             unit ^ 255]
+def tx_set_config_data(start_address, config_data):
+    return _tx_array(CMD_SET_CONFIG_DATA, start_address, *list(config_data[:4]))
 
+def tx_get_config_memory():
+    return _tx_array(CMD_GET_CONFIG_MEM)
 
-    tx_array.append(check_sum(tx_array)) #This is the bytestring to write
-    ser.write(bytearray(tx_array))
-    time.sleep(0.01)
-    
-    try:
-        rx_array = ser.read(RX_ARR_LEN)
-        rx_array = list(rx_array)
-    except Exception as err:
-        print(f'ERROR --> init: failed to read the serial port {ser.port}. Exception message: {err}', file=sys.stderr)
-        ser.close()
-        return (tx_array, None)
-    ser.close()
 
-    #Check the validity of the response
-    if len(rx_array)!=RX_ARR_LEN:
-        print(f'ERROR --> init: Wrong length of the response array. {len(rx_array)} bytes instead of {RX_ARR_LEN} bytes.', file=sys.stderr)
-        print(f'                Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
+#Validation of the response arrays. The errors are printed on stderr.
+def check_reply(func_name, rx_array, rx_len, cmd_byte):
+    """
+    Validate length and command byte of a response array.
+    """
+    indent = ' ' * len(f'ERROR --> {func_name}: ')
+    if len(rx_array)!=rx_len:
+        print(f'ERROR --> {func_name}: Wrong length of the response array. {len(rx_array)} bytes instead of {rx_len} bytes.', file=sys.stderr)
+        print(f'{indent}Response array: {list(rx_array)}', file=sys.stderr)
+        return False
+    #
+    if int(rx_array[0])!=cmd_byte:
+        print(f'ERROR --> {func_name}: Response array wrong value: rx_array[0]={int(rx_array[0])} instead of {cmd_byte}.', file=sys.stderr)
+        print(f'{indent}Response array: {list(rx_array)}', file=sys.stderr)
+        return False
+    #
+    return True
+
+def check_config_data_reply(port, tx_array, rx_array):
+    start_address = tx_array[1]
+    if len(rx_array) != RX_ARR_LEN[CMD_SET_CONFIG_DATA]:
+        print(f"ERROR --> set_config_data: failed to set config data on SIS box on port {port}. Wrong length of the response array: {len(rx_array)} bytes instead of {RX_ARR_LEN[CMD_SET_CONFIG_DATA]} bytes.", file=sys.stderr)
+        return False
+    #
+    rx_packet_checksum = check_sum(rx_array[:-1])
+    if rx_packet_checksum != rx_array[-1]:
+        print(f"ERROR --> set_config_data: failed to set config data on SIS box on port {port}. Invalid checksum received!", file=sys.stderr)
+        return False
+    #
+    if rx_array[0] != CMD_SET_CONFIG_DATA:
+        print(f"ERROR --> set_config_data: Invalid command byte received: {rx_array[0]} instead of {CMD_SET_CONFIG_DATA}", file=sys.stderr)
+        return False
+    elif rx_array[1] != start_address:
+        print(f"ERROR --> set_config_data: Invalid start address received: {rx_array[1]} instead of {start_address}", file=sys.stderr)
+        return False
+    elif rx_array[2] != ACK_OK:
+        if rx_array[2] == ACK_CFG_WRITE_DISABLED:
+            print(f"ERROR --> set_config_data: failed to set config data on SIS box on port {port}. Config write is disabled.", file=sys.stderr)
+        else:
+            print(f"ERROR --> set_config_data: failed to set config data on SIS box on port {port}. Bad acknowledge byte received: {rx_array[2]}", file=sys.stderr)
+        return False
+    #
+    print(f"Write on addresses [{start_address}:{start_address+3}] successful for SIS control box on port {port}.")
+    return True
+
+def check_config_memory_reply(port, tx_array, rx_array):
+    if len(rx_array) != RX_ARR_LEN[CMD_GET_CONFIG_MEM]:
+        print(f"ERROR --> get_config_memory: failed to read config data from SIS box on port {port}. Invalid length of the serial response: received {len(rx_array)} bytes insteead of {RX_ARR_LEN[CMD_GET_CONFIG_MEM]} bytes", file=sys.stderr)
+        return False
     #
-    if int(rx_array[0])!=CMD_BYTE:
-        print(f'ERROR --> init: Response array wrong value: rx_array[0]={int(rx_array[0])} instead of {CMD_BYTE}.', file=sys.stderr)
-        print(f'                Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
+    rx_packet_checksum = check_sum(rx_array[:-1])
+    if rx_packet_checksum != rx_array[-1]:
+        print(f"ERROR --> get_config_memory: failed to read config data from SIS box on port {port}. Invalid packet or checksum error: received {rx_array[-1]} insteead of {rx_packet_checksum}", file=sys.stderr)
+        return False
     #
+    if rx_array[0] != tx_array[0]:
+        print(f"ERROR --> get_config_memory: failed to read config data from SIS box on port {port}. Invalid command byte received: {rx_array[0]} instead of {tx_array[0]}", file=sys.stderr)
+        return False
+    #
+    print(f"Config data read successfully from SIS control box on port {port}.")
+    return True
 
-    return (tx_array, rx_array)
+def config_ack_ok(rx_array, start_address):
+    """
+    Silent check of the acknowledge of a config write for the chunk at `start_address`.
+    """
+    return ((rx_array is not None)
+            and (len(rx_array) == RX_ARR_LEN[CMD_SET_CONFIG_DATA])
+            and (check_sum(rx_array[:-1]) == rx_array[-1])
+            and (rx_array[0] == CMD_SET_CONFIG_DATA)
+            and (rx_array[1] == start_address)
+            and (rx_array[2] == ACK_OK))
+
+def reply_outcome(cmd_byte, rx_array, rx_len):
+    """
+    Classify a raw response for the metrics: one of the OUTCOME_* constants of metrics.py.
+    """
+    if len(rx_array) == 0:
+        return OUTCOME_TIMEOUT
+    if len(rx_array) < rx_len:
+        return OUTCOME_SHORT_READ
+    if rx_array[0] != cmd_byte:
+        return OUTCOME_WRONG_CMD
+    if (cmd_byte in RX_HAS_CHECKSUM) and (check_sum(rx_array[:-1]) != rx_array[-1]):
+        return OUTCOME_CHECKSUM
+    return OUTCOME_OK
+
+def frame_outcome(cmd_byte, rx_array, rx_len, discarded, bad_checksums):
+    """
+    Outcome of a response extracted by a FrameParser, given the stray bytes discarded and the
+    candidates rejected by the checksum while looking for it.
+    """
+    outcome = reply_outcome(cmd_byte, rx_array, rx_len)
+    if (outcome == OUTCOME_OK) and (discarded or bad_checksums):
+        return OUTCOME_RESYNC
+    if (outcome in (OUTCOME_TIMEOUT, OUTCOME_SHORT_READ, OUTCOME_WRONG_CMD)) and bad_checksums:
+        return OUTCOME_CHECKSUM
+    if (outcome == OUTCOME_TIMEOUT) and discarded:
+        return OUTCOME_WRONG_CMD
+    return outcome
+
+def validate_reply(func_name, port, tx_array, rx_array):
+    """
+    Full validation of the response array `rx_array` to the command `tx_array`.
+    """
+    cmd_byte = tx_array[0]
+    if cmd_byte == CMD_SET_CONFIG_DATA:
+        return check_config_data_reply(port, tx_array, rx_array)
+    if cmd_byte == CMD_GET_CONFIG_MEM:
+        return check_config_memory_reply(port, tx_array, rx_array)
+    #
+    if not check_reply(func_name, rx_array, RX_ARR_LEN[cmd_byte], cmd_byte):
+        return False
+    #
+    if (cmd_byte == CMD_GOTO_POSITION) and (int(rx_array[1])!=int(tx_array[1])):
+        print(f'ERROR --> goto_position: Response array wrong unit ID: rx_array[1]={int(rx_array[1])} instead of {int(tx_array[1])}.', file=sys.stderr)
+        print(f'                         Response array: {list(rx_array)}', file=sys.stderr)
+        return False
+    #
+    return True
 
 
+class FrameParser:
+    """
+    Incremental parser of the responses of the box over a receive ring buffer.
+
+    The received bytes are appended with `feed`, and `find(cmd_byte, rx_len)` extracts the
+    first response of `rx_len` bytes starting with `cmd_byte`. The bytes before it are stray
+    bytes and are discarded (counted in `discarded`). For the commands in `checksum_cmds` a
+    candidate with a wrong checksum is rejected and the search goes on from the next byte, so
+    a stray byte equal to the command byte does not misalign the following frames.
+    When more than `capacity` bytes are buffered the oldest ones are dropped.
+    """
 
-def get_status(ser):
-    CMD_BYTE = 51
-    RX_ARR_LEN = 15
-
-    if not ser.is_open:
-        ser.open()
-    
-    
-    tx_array = [CMD_BYTE,
-                0,
-                0,
-                0,
-                0,
-                0]
-    
-    tx_array.append(check_sum(tx_array))
-    ser.write(bytearray(tx_array))
-    time.sleep(0.01)
+    def __init__(self, capacity=4096, checksum_cmds=RX_HAS_CHECKSUM):
+        self.capacity = capacity
+        self.checksum_cmds = checksum_cmds
+        self.discarded = 0 #stray bytes dropped since the creation of the parser
+        self.bad_checksums = 0 #candidate frames rejected by the checksum
+        self.last_rejected = None #last candidate frame rejected by the checksum
 
-    try:
-        rx_array = ser.read(RX_ARR_LEN)       
-        rx_array = list(rx_array)
-    except Exception as err:
-        print(f'ERROR --> get_status: failed to read the serial port {ser.port}. Exception message: {err}', file=sys.stderr)
-        ser.close()
-        return (tx_array, None)
+        self._buf = bytearray()
+        self._head = 0 #start of the unparsed bytes in _buf
     #
-    ser.close()
 
-    if len(rx_array)!=RX_ARR_LEN:
-        print(f'ERROR --> get_status: Wrong length of the response array. {len(rx_array)} bytes instead of {RX_ARR_LEN} bytes.', file=sys.stderr)
-        print(f'                      Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
+    def __len__(self):
+        return len(self._buf) - self._head
     #
-    if int(rx_array[0])!=CMD_BYTE:
-        print(f'ERROR --> get_status: Response array wrong value: rx_array[0]={int(rx_array[0])} instead of {CMD_BYTE}.', file=sys.stderr)
-        print(f'                      Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
+
+    def _drop(self, n):
+        self._head += n
+        self.discarded += n
+        #Reclaim the space of the parsed bytes only from time to time
+        if self._head > (self.capacity // 2):
+            del self._buf[:self._head]
+            self._head = 0
+        #
     #
-    
-    return (tx_array, rx_array)
 
+    def feed(self, data):
+        self._buf += data
+        overflow = len(self) - self.capacity
+        if overflow > 0:
+            self._drop(overflow)
+    #
 
-def get_position(ser):
-    CMD_BYTE = 85
-    RX_ARR_LEN = 20
-
-    if not ser.is_open:
-        ser.open()
-    
-    tx_array = [CMD_BYTE,
-                0,
-                0,
-                0,
-                0,
-                0]
-    
-    tx_array.append(check_sum(tx_array))
-    ser.write(bytearray(tx_array))
-    time.sleep(0.01)
+    def clear(self):
+        self._buf.clear()
+        self._head = 0
+    #
 
-    try:
-        rx_array = ser.read(RX_ARR_LEN)
-        rx_array = list(rx_array)
-    except Exception as err:
-        print(f'ERROR --> get_status: failed to read the serial port {ser.port}. Exception message: {err}', file=sys.stderr)
-        ser.close()
-        return (tx_array, None)
+    def missing(self, cmd_byte, rx_len):
+        """
+        Number of bytes still to be received to complete the candidate frame.
+        """
+        idx = self._buf.find(cmd_byte, self._head)
+        if idx < 0:
+            return rx_len
+        return max(rx_len - (len(self._buf) - idx), 0)
     #
-    ser.close()
 
-    if len(rx_array)!=RX_ARR_LEN:
-        print(f'ERROR --> get_position: Wrong length of the response array. {len(rx_array)} bytes instead of {RX_ARR_LEN} bytes.', file=sys.stderr)
-        print(f'                        Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
+    def find(self, cmd_byte, rx_len):
+        """
+        Extract the next complete and valid frame, or return None if it has not arrived yet.
+        """
+        while True:
+            idx = self._buf.find(cmd_byte, self._head)
+            if idx < 0:
+                self._drop(len(self))
+                return None
+            #
+            if idx > self._head:
+                self._drop(idx - self._head)
+                idx = self._head
+            #
+            if len(self._buf) - idx < rx_len:
+                return None
+            #
+            frame = bytes(self._buf[idx:idx+rx_len])
+            if (cmd_byte in self.checksum_cmds) and (check_sum(frame[:-1]) != frame[-1]):
+                self.bad_checksums += 1
+                self.last_rejected = frame
+                self._drop(1)
+                continue
+            #
+            self._head = idx + rx_len
+            if self._head == len(self._buf):
+                self.clear()
+            return frame
+        #
     #
-    if int(rx_array[0])!=CMD_BYTE:
-        print(f'ERROR --> get_position: Response array wrong value: rx_array[0]={int(rx_array[0])} instead of {CMD_BYTE}.', file=sys.stderr)
-        print(f'                        Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
+
+    def take_all(self):
+        """
+        Remove and return the unparsed bytes (e.g. the beginning of a short response).
+        """
+        rx_bytes = bytes(self._buf[self._head:])
+        self.clear()
+        return rx_bytes
     #
+#
 
-    return (tx_array, rx_array)
 
-def stop(ser, unit):
-    CMD_BYTE = 195
-    RX_ARR_LEN = 4
-
-    if not ser.is_open:
-        ser.open()
-    
-    tx_array = [CMD_BYTE,
-                unit,
-                CMD_BYTE ^ 255,
-                unit ^ 255,
-                CMD_BYTE ^ 255,
-                unit ^ 255]
-    
-    tx_array.append(check_sum(tx_array))
+class RetryPolicy:
+    """
+    How a session retries a command whose reply is missing or corrupted.
 
-    ser.write(bytearray(tx_array))
-    time.sleep(0.01)
+    A command is sent at most `attempts` times. Before every new attempt the session waits
+    for the backoff (`backoff` seconds, multiplied by `backoff_factor` at every retry and
+    capped to `max_backoff`), so that the late bytes of the failed reply have time to
+    arrive, and then flushes the input buffer to get back in sync with the box.
+    `RetryPolicy(attempts=1)` disables the retries.
+    """
 
-    try:
-        rx_array = ser.read(RX_ARR_LEN)
-        rx_array = list(rx_array)
-    except Exception as err:
-        print(f'ERROR --> stop: failed to read the serial port {ser.port}. Exception message: {err}', file=sys.stderr)
-        ser.close()
-        return (tx_array, None)
+    def __init__(self, attempts=3, backoff=0.02, backoff_factor=2., max_backoff=0.5):
+        self.attempts = max(1, int(attempts))
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
     #
-    ser.close()
-    
-    if len(rx_array)!=RX_ARR_LEN:
-        print(f'ERROR --> stop: Wrong length of the response array. {len(rx_array)} bytes instead of {RX_ARR_LEN} bytes.', file=sys.stderr)
-        print(f'                Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
-    #
-    if int(rx_array[0])!=CMD_BYTE:
-        print(f'ERROR --> stop: Response array wrong value: rx_array[0]={int(rx_array[0])} instead of {CMD_BYTE}.', file=sys.stderr)
-        print(f'                Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
+
+    def delay(self, retry):
+        """
+        Backoff (in seconds) before the retry number `retry` (starting from 1).
+        """
+        return min(self.backoff * self.backoff_factor ** (retry - 1), self.max_backoff)
     #
+#
 
-    return (tx_array, rx_array)
+DEFAULT_RETRY = RetryPolicy()
 
 
-def goto_position(ser, unit, pos):
-    CMD_BYTE = 15
-    RX_ARR_LEN = 6
+class ConfigCache:
+    """
+    Read-through cache of the config memory of the boxes.
+
+    The entries are the response arrays of "get_config_memory", keyed by port name and,
+    optionally, by an identity of the box (for the ports where different boxes can be
+    plugged). The sessions store every config memory they read, patch the entry at every
+    acknowledged config write and drop it when a write fails (the content of the box is then
+    unknown). The cache only knows the traffic of this process: `max_age` bounds how old an
+    entry can be to be used.
+    """
 
-    if not ser.is_open:
-        ser.open()
+    def __init__(self):
+        self._entries = {} #key -> (monotonic time, response array)
+        self._lock = threading.Lock()
     #
 
-    pos_lsb = pos & 255
-    pos_msb = pos // 256
-    tx_array = [CMD_BYTE,
-                unit,
-                pos_lsb,
-                pos_msb,
-                CMD_BYTE ^ 255,
-                unit ^ 255]
-    
-    tx_array.append(check_sum(tx_array))
-    ser.write(bytearray(tx_array))
-    time.sleep(0.01)
-
-    try:
-        rx_array = ser.read(RX_ARR_LEN)
-        rx_array = list(rx_array)
-    except Exception as err:
-        print(f'ERROR --> goto_position: failed to read the serial port {ser.port}. Exception message: {err}', file=sys.stderr)
-        ser.close()
-        return (tx_array, None)
-    #
-    ser.close()
-
-    if len(rx_array)!=RX_ARR_LEN:
-        print(f'ERROR --> goto_position: Wrong length of the response array. {len(rx_array)} bytes instead of {RX_ARR_LEN} bytes.', file=sys.stderr)
-        print(f'                         Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
-    #
-    if int(rx_array[0])!=CMD_BYTE:
-        print(f'ERROR --> goto_position: Response array wrong value: rx_array[0]={int(rx_array[0])} instead of {CMD_BYTE}.', file=sys.stderr)
-        print(f'                         Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
-    #
-    if int(rx_array[1])!=int(tx_array[1]):
-        print(f'ERROR --> goto_position: Response array wrong unit ID: rx_array[1]={int(rx_array[1])} instead of {int(tx_array[1])}.', file=sys.stderr)
-        print(f'                         Response array: {rx_array}', file=sys.stderr)
-        return (tx_array, None)
-    
-    return (tx_array, tx_array)
+    def get(self, key, max_age):
+        """
+        Cached response array, or None if there is none younger than `max_age` seconds.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is None) or (time.monotonic() - entry[0] > max_age):
+                return None
+            #"update" patches the cached list in place
+            return list(entry[1])
+        #
+    #
 
+    def put(self, key, rx_array):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(rx_array))
+    #
 
-# Function to send command and set configuration data
-def set_config_data(ser, start_address, config_data):
-    UART_CMD_SET_CONFIG_DATA = 136
-    RX_ARR_LEN = 4
-    ACK_OK = 0
-    ACK_CFG_WRITE_DISABLED = 16
+    def update(self, key, start_address, config_data):
+        """
+        Patch the cached memory with an acknowledged write of `config_data` at `start_address`.
+        The age of the entry is not changed: the write tells nothing about the other bytes.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            #
+            rx_array = entry[1]
+            rx_array[1+start_address:5+start_address] = list(config_data[:4])
+            rx_array[-1] = check_sum(rx_array[:-1])
+        #
+    #
 
-    if not ser.is_open:
-        ser.open()
+    def invalidate(self, key=None):
+        """
+        Drop the entry of `key`, or all the entries.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        #
     #
+#
 
-    tx_array = [UART_CMD_SET_CONFIG_DATA, start_address]
+#Config memory cache shared by all the sessions
+CONFIG_CACHE = ConfigCache()
 
-    if isinstance(config_data, bytearray):
-        tx_array += list(config_data[:4])
-        tx_array.append(check_sum(tx_array))
-        data_bytearr = bytearray([UART_CMD_SET_CONFIG_DATA, start_address]) + config_data[:4] + bytearray([tx_array[-1]])
-    else:
-        tx_array += config_data[:4]
-        tx_array.append(check_sum(tx_array))
-        data_bytearr = bytearray(tx_array)
-    
-    ser.write(data_bytearr)
-    time.sleep(1)
-
-    try:
-        rx_array = ser.read(RX_ARR_LEN)
-        rx_array = list(rx_array)
-    except Exception as err:
-        print(f'ERROR --> set_config_data: failed to set config data on SIS box on port {ser.port}, start address={start_address}, data={config_data[:4]}. Exception message: {err}', file=sys.stderr)
-        ser.close()
-        return (tx_array, None)
-    #
-    ser.close()
-    
-    # Validate the received packet
-    if rx_array and len(rx_array) >= RX_ARR_LEN:
-        rx_packet_checksum = check_sum(rx_array[:-1])
-        if rx_packet_checksum == rx_array[-1]:
-            if rx_array[0] != UART_CMD_SET_CONFIG_DATA:
-                print(f"ERROR --> set_config_data: Invalid command byte received: {rx_array[0]} instead of {UART_CMD_SET_CONFIG_DATA}", file=sys.stderr)
-                return (tx_array, None)
-            elif rx_array[1] != start_address:
-                print(f"ERROR --> set_config_data: Invalid start address received: {rx_array[1]} instead of {start_address}", file=sys.stderr)
-                return (tx_array, None)
-            elif rx_array[2] != ACK_OK:
-                if rx_array[2] == ACK_CFG_WRITE_DISABLED:
-                    print(f"ERROR --> set_config_data: failed to set config data on SIS box on port {ser.port}. Config write is disabled.", file=sys.stderr)
-                    return (tx_array, None)
-                else:
-                    print(f"ERROR --> set_config_data: failed to set config data on SIS box on port {ser.port}. Bad acknowledge byte received: {rx_array[2]}", file=sys.stderr)
-                    return (tx_array, None)
-            else:
-                print(f"Write on addresses [{start_address}:{start_address+3}] successful for SIS control box on port {ser.port}.")
+
+class SISConnection:
+    """
+    Session with a single SIS control box.
+
+    The session owns the serial port for its whole lifetime, so consecutive commands
+    (e.g. the position/status polls of a tracking loop) do not pay the port open/close
+    and the driver reconfiguration every time. It can be built from the name of the
+    serial port or from an already existing `serial.Serial` object, and it can be used
+    as a context manager:
+
+        with SISConnection('/dev/ttyUSB0') as ser:
+            tx_arr, rx_arr = ser.get_position()
+
+    All the commands return the `(tx_array, rx_array)` tuple of the module level
+    functions, with `rx_array=None` in case of failure.
+
+    With `persistent=False` the port is closed after every command, which is the
+    historical behaviour of the module level functions when they get a bare serial port.
+
+    The replies are read with a per-command deadline: a command returns as soon as the
+    expected number of bytes has arrived, and gives up when its timeout (in seconds)
+    expires. The defaults are in `DEFAULT_TIMEOUTS` and can be changed for the session
+    with the `timeouts` argument (a dict keyed by command byte) or with `set_timeout`.
+    The responses are extracted from the received stream by a FrameParser, so stray bytes
+    on the line are skipped instead of shifting all the following responses. The bytes
+    received after a response stay in the parser for the next command.
+
+    Every command is counted, with its latency and outcome, in `metrics` (by default the
+    module level METRICS shared by all the sessions).
+
+    The commands with a missing or corrupted reply are resent according to `retry` (a
+    RetryPolicy, by default DEFAULT_RETRY). All the commands can be resent safely (polls,
+    "goto_position" to the same target, "stop", config writes of the same bytes) except
+    "init", which would restart the initialisation of the unit: it is sent only once.
+
+    The config memory read and written through the session is tracked in `config_cache` (by
+    default the module level CONFIG_CACHE), under the port name and `box_id`, so that
+    "get_config_memory(max_age=...)" can skip the transfer.
+    """
+
+    DEFAULT_TIMEOUTS = {CMD_INIT: 0.5,
+                        CMD_GET_STATUS: 0.5,
+                        CMD_GET_POSITION: 0.5,
+                        CMD_STOP: 0.5,
+                        CMD_GOTO_POSITION: 0.5,
+                        CMD_SET_CONFIG_DATA: 1.0,
+                        CMD_GET_CONFIG_MEM: 2.0}
+
+    def __init__(self, port, baudrate=9600, timeout=0.5, persistent=True, timeouts=None, metrics=None, retry=None, box_id=None, config_cache=None):
+        if isinstance(port, str):
+            self.ser = serial.Serial(port=port, baudrate=baudrate, timeout=timeout)
         else:
-            print(f"ERROR --> set_config_data: failed to set config data on SIS box on port {ser.port}. Invalid checksum received!", file=sys.stderr)
-            return (tx_array, None)
-    
-    return (tx_array, rx_array)
-#
+            self.ser = port
+        #
+        self.persistent = persistent
+
+        self.timeouts = dict(self.DEFAULT_TIMEOUTS)
+        if timeouts is not None:
+            self.timeouts.update(timeouts)
+        #
+        self.metrics = METRICS if (metrics is None) else metrics
+        self.retry = DEFAULT_RETRY if (retry is None) else retry
+        self.box_id = box_id
+        self.config_cache = CONFIG_CACHE if (config_cache is None) else config_cache
+
+        #Optional callable telling that a more urgent command is waiting (see CommandScheduler):
+        #the failed commands are then not retried
+        self.preempt = None
+
+        self.parser = FrameParser()
+        self._stale = False #a response may still be on its way after a timeout
+    #
+
+    def set_timeout(self, cmd_byte, timeout):
+        self.timeouts[cmd_byte] = timeout
+    #
+
+    @property
+    def cache_key(self):
+        return (str(self.port), self.box_id)
+    #
+
+    @property
+    def port(self):
+        return self.ser.port
+    #
 
-def get_config_memory(ser):
-    UART_CMD_GET_CONFIG_MEM = 119
-    RX_ARR_LEN = 250
-
-    # Open serial port
-    if not ser.is_open:
-        ser.open()
-    ser.reset_input_buffer()
-
-    # Construct transmission array (command packet)
-    tx_array = [UART_CMD_GET_CONFIG_MEM, 0, 0, 0, 0, 0]
-    tx_array.append(check_sum(tx_array))  # Append checksum
-    
-    # Send command
-    ser.write(bytearray(tx_array))
-    #print(f"Sent command: {tx_array}")
-    time.sleep(1)
-    
-    # Wait for response
-    try:
-        rx_array = ser.read(RX_ARR_LEN)
-        rx_array = list(rx_array)
-    except Exception as err:
-        print(f'ERROR --> get_config_memory: failed to read config data from SIS box on port {ser.port}. Exception message: {err}', file=sys.stderr)
-        ser.close()
-        return (tx_array, None)
-    #
-    ser.close()
-    
-    # Validate received packet
-    if len(rx_array) != RX_ARR_LEN:
-        print(f"ERROR --> get_config_memory: failed to read config data from SIS box on port {ser.port}. Invalid length of the serial response: received {len(rx_array)} bytes insteead of {RX_ARR_LEN} bytes", file=sys.stderr)
-        return (tx_array, None)
-
-    if rx_array and (len(rx_array) == RX_ARR_LEN):
-        rx_packet_checksum = check_sum(rx_array[:-1])
-        if rx_packet_checksum != rx_array[-1]:
-            print(f"ERROR --> get_config_memory: failed to read config data from SIS box on port {ser.port}. Invalid packet or checksum error: received {rx_array[-1]} insteead of {rx_packet_checksum}", file=sys.stderr)
+    @property
+    def is_open(self):
+        return self.ser.is_open
+    #
+
+    def open(self):
+        if not self.ser.is_open:
+            self.ser.open()
+    #
+
+    def close(self):
+        if self.ser.is_open:
+            self.ser.close()
+    #
+
+    def reset_input_buffer(self):
+        self.ser.reset_input_buffer()
+        self.parser.clear()
+        self._stale = False
+    #
+
+    def __enter__(self):
+        self.open()
+        return self
+    #
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    #
+
+    def _read_frame(self, cmd_byte, rx_len, timeout):
+        """
+        Read the response to `cmd_byte` (`rx_len` bytes), returning as soon as it has arrived
+        or when the deadline of `timeout` seconds expires. In this case the bytes received
+        from the start of the response are returned (short response) and the session flushes
+        the input buffer before the next command.
+        A response rejected by its checksum, with no other candidate behind it, is returned at
+        once (it fails the validation) instead of waiting for the deadline.
+        Returns the response, the number of stray bytes discarded before it and the number of
+        candidate responses rejected by the checksum.
+        """
+        parser = self.parser
+        discarded = parser.discarded
+        bad_checksums = parser.bad_checksums
+        deadline = time.monotonic() + timeout
+        read_timeout = timeout
+        while True:
+            frame = parser.find(cmd_byte, rx_len)
+            if frame is not None:
+                return (frame, parser.discarded - discarded, parser.bad_checksums - bad_checksums)
+            #
+            if (parser.bad_checksums > bad_checksums) and (parser.missing(cmd_byte, rx_len) == rx_len):
+                #Corrupted response: flush its remaining bytes before the next command
+                self._stale = True
+                return (parser.last_rejected, parser.discarded - discarded, parser.bad_checksums - bad_checksums)
+            #
+            if read_timeout <= 0:
+                break
+            #
+            #The serial driver implements the deadline on the read call, the port is only
+            #reconfigured when the timeout differs from the previous one
+            if self.ser.timeout != read_timeout:
+                self.ser.timeout = read_timeout
+            #Take all the bytes already received, which can hold several responses (e.g. the
+            #acknowledges of the pipelined config writes)
+            rx_bytes = self.ser.read(max(parser.missing(cmd_byte, rx_len), self.ser.in_waiting))
+            if not rx_bytes:
+                break
+            parser.feed(rx_bytes)
+            read_timeout = deadline - time.monotonic()
+        #
+        self._stale = True
+        return (parser.take_all(), parser.discarded - discarded, parser.bad_checksums - bad_checksums)
+    #
+
+    def _query(self, func_name, tx_array, rx_len, reset_input=False):
+        """
+        Write the command on the wire and read back the `rx_len` bytes of the response.
+        Returns the raw response, or None if the port could not be read.
+        """
+        self.open()
+        t0 = time.perf_counter()
+        try:
+            if reset_input or self._stale:
+                self.reset_input_buffer()
+            self.ser.write(bytearray(tx_array))
+            rx_bytes, discarded, bad_checksums = self._read_frame(tx_array[0], rx_len, self.timeouts[tx_array[0]])
+        except Exception as err:
+            self.metrics.record(self.port, tx_array[0], time.perf_counter() - t0, OUTCOME_ERROR)
+            print(f'ERROR --> {func_name}: failed to read the serial port {self.port}. Exception message: {err}', file=sys.stderr)
+            return None
+        finally:
+            if not self.persistent:
+                self.ser.close()
+        #
+        outcome = frame_outcome(tx_array[0], rx_bytes, rx_len, discarded, bad_checksums)
+        self.metrics.record(self.port, tx_array[0], time.perf_counter() - t0, outcome)
+        return rx_bytes
+    #
+
+    def _transact(self, func_name, tx_array, rx_len, reset_input=False):
+        """
+        Same as "_query", with the response converted to a list of integers.
+        """
+        rx_bytes = self._query(func_name, tx_array, rx_len, reset_input)
+        if rx_bytes is None:
+            return None
+        return list(rx_bytes)
+    #
+
+    def _preempted(self, func_name, action='retries'):
+        if (self.preempt is None) or not self.preempt():
+            return False
+        print(f'WARNING --> {func_name}: {action} on port {self.port} given up for a more urgent command.', file=sys.stderr)
+        return True
+    #
+
+    def _resync(self, func_name, retry):
+        """
+        Wait for the backoff of the retry number `retry` and flush the input buffer, so that
+        the bytes of the failed reply do not end up in the next one.
+        """
+        print(f'WARNING --> {func_name}: retrying the command on port {self.port} (attempt {retry+1}/{self.retry.attempts}).', file=sys.stderr)
+        time.sleep(self.retry.delay(retry))
+        #A port closed after every command has no stale bytes to flush
+        if not self.ser.is_open:
+            return
+        try:
+            self.reset_input_buffer()
+        except Exception as err:
+            print(f'ERROR --> {func_name}: failed to flush the serial port {self.port}. Exception message: {err}', file=sys.stderr)
+    #
+
+    def _exchange(self, func_name, tx_array, rx_len, is_valid, reset_input=False):
+        """
+        Send the command and read the response until `is_valid(rx_bytes)` is satisfied,
+        within the attempts of the retry policy. Only the transmission errors are retried.
+        Returns the raw response, or None.
+        """
+        for attempt in range(self.retry.attempts):
+            if attempt > 0:
+                if self._preempted(func_name):
+                    return None
+                self._resync(func_name, attempt)
+            #
+            rx_bytes = self._query(func_name, tx_array, rx_len, reset_input)
+            if rx_bytes is None:
+                continue
+            if is_valid(rx_bytes):
+                return rx_bytes
+            #
+            #A well formed response refusing the command (e.g. config write disabled) is the
+            #answer of the box, not a transmission error: resending would not change it
+            if reply_outcome(tx_array[0], rx_bytes, rx_len) == OUTCOME_OK:
+                return None
+        #
+        return None
+    #
+
+    def _command(self, func_name, tx_array, reset_input=False):
+        """
+        Send the command packet and validate the response.
+        Returns the `(tx_array, rx_array)` tuple, with `rx_array=None` in case of failure.
+        """
+        rx_bytes = self._exchange(func_name, tx_array, RX_ARR_LEN[tx_array[0]],
+                                  lambda rx_bytes: validate_reply(func_name, self.port, tx_array, list(rx_bytes)),
+                                  reset_input)
+        if rx_bytes is None:
             return (tx_array, None)
-            
-        if rx_array[0] != tx_array[0]:
-            print(f"ERROR --> get_config_memory: failed to read config data from SIS box on port {ser.port}. Invalid command byte received: {rx_array[0]} instead of {tx_array[0]}", file=sys.stderr)
+        #
+        return (tx_array, list(rx_bytes))
+    #
+
+    def init(self, unit):
+        """
+        Start the initialisation of `unit`. The command is never resent: a lost acknowledge
+        does not tell whether the box started the initialisation, and a second "init" would
+        restart it. In that case `rx_array` is None and the status of the unit has to be
+        checked (e.g. with "read_status") before sending the command again.
+        """
+        tx_array = tx_init(unit)
+        rx_bytes = self._query('init', tx_array, RX_ARR_LEN[CMD_INIT])
+        if (rx_bytes is None) or not validate_reply('init', self.port, tx_array, list(rx_bytes)):
+            print(f'WARNING --> init: no valid acknowledge from port {self.port}. The command is not resent: check the status of unit {unit} before sending it again.', file=sys.stderr)
             return (tx_array, None)
-        
-        print(f"Config data read successfully from SIS control box on port {ser.port}.")
+        #
+        return (tx_array, list(rx_bytes))
+    #
+
+    def get_status(self):
+        return self._command('get_status', tx_get_status())
+    #
+
+    def get_position(self):
+        return self._command('get_position', tx_get_position())
+    #
+
+    def read_position(self):
+        """
+        Same as "get_position", but the reply is decoded straight from the received bytes.
+        Returns a PositionFrame, or None in case of failure.
+        """
+        rx_bytes = self._exchange('get_position', tx_get_position(), PositionFrame.FRAME_LEN,
+                                  lambda rx_bytes: check_reply('get_position', rx_bytes, PositionFrame.FRAME_LEN, CMD_GET_POSITION))
+        if rx_bytes is None:
+            return None
+        #
+        return PositionFrame.from_bytes(rx_bytes)
+    #
+
+    def read_status(self):
+        """
+        Same as "get_status", but the reply is decoded straight from the received bytes.
+        Returns a StatusFrame, or None in case of failure.
+        """
+        rx_bytes = self._exchange('get_status', tx_get_status(), StatusFrame.FRAME_LEN,
+                                  lambda rx_bytes: check_reply('get_status', rx_bytes, StatusFrame.FRAME_LEN, CMD_GET_STATUS))
+        if rx_bytes is None:
+            return None
+        #
+        return StatusFrame.from_bytes(rx_bytes)
+    #
+
+    def stop(self, unit):
+        return self._command('stop', tx_stop(unit))
+    #
+
+    def goto_position(self, unit, pos):
+        return self._command('goto_position', tx_goto_position(unit, pos))
+    #
+
+    def set_config_data(self, start_address, config_data):
+        tx_array, rx_array = self._command('set_config_data', tx_set_config_data(start_address, config_data))
+        if rx_array is None:
+            self.config_cache.invalidate(self.cache_key)
+        else:
+            self.config_cache.update(self.cache_key, start_address, config_data)
+        #
+        return (tx_array, rx_array)
+    #
+
+    def set_config_data_bulk(self, chunks, window=4, retries=2):
+        """
+        Write several 4 bytes chunks of the config memory keeping up to `window` writes in
+        flight, instead of waiting for the acknowledge of each chunk before sending the next.
+
+        `chunks` is a sequence of `(start_address, config_data)` pairs. The acknowledges are
+        matched to the chunks through the start address echoed in rx_array[1]. The first chunk
+        is written alone, so that a box with disabled config write is reported once and
+        nothing else is sent. The chunks that fail (bad acknowledge or no acknowledge before
+        the deadline) are retried up to `retries` times, one at a time.
+        When a more urgent command is waiting (see `preempt`), the chunks not sent yet are not
+        sent and the retries are given up: they are reported as failed.
+        Returns the lists of the start addresses of the written and of the failed chunks.
+        """
+        pending = [(int(start_address), list(config_data[:4])) for start_address, config_data in chunks]
+        if not pending:
+            return ([], [])
+        #
+        chunk_data = dict(pending)
+
+        written = []
+        failed = []
+        persistent = self.persistent
+        self.persistent = True
+        try:
+            self.open()
+
+            #Probe the box with the first chunk alone
+            start_address, config_data = pending.pop(0)
+            rx_array = self._transact('set_config_data_bulk', tx_set_config_data(start_address, config_data), RX_ARR_LEN[CMD_SET_CONFIG_DATA])
+            if (rx_array is not None) and (len(rx_array) == RX_ARR_LEN[CMD_SET_CONFIG_DATA]) and (check_sum(rx_array[:-1]) == rx_array[-1]) and (rx_array[2] == ACK_CFG_WRITE_DISABLED):
+                print(f"ERROR --> set_config_data_bulk: failed to set config data on SIS box on port {self.port}. Config write is disabled.", file=sys.stderr)
+                return ([], [start_address] + [el[0] for el in pending])
+            #
+            if config_ack_ok(rx_array, start_address):
+                written.append(start_address)
+            else:
+                pending.append((start_address, config_data))
+            #
+
+            for attempt in range(retries + 1):
+                if (attempt > 0) and self._preempted('set_config_data_bulk'):
+                    break
+                #The first pass is pipelined, the retries are stop-and-wait
+                failed = self._write_config_window(pending, window if attempt == 0 else 1)
+                written += [el[0] for el in pending if el[0] not in failed]
+                pending = [el for el in pending if el[0] in failed]
+                if not pending:
+                    break
+            #
+        finally:
+            self.persistent = persistent
+            if not persistent:
+                self.ser.close()
+            #
+            if failed or pending:
+                self.config_cache.invalidate(self.cache_key)
+            else:
+                for start_address in written:
+                    self.config_cache.update(self.cache_key, start_address, chunk_data[start_address])
+            #
+        #
+
+        if failed:
+            print(f"ERROR --> set_config_data_bulk: failed to set config data on SIS box on port {self.port} at start addresses {sorted(failed)}.", file=sys.stderr)
+        print(f"Write of {len(written)} chunks successful for SIS control box on port {self.port}.")
+
+        return (sorted(written), sorted(failed))
+    #
+
+    def _write_config_window(self, chunks, window):
+        """
+        Send the config chunks keeping up to `window` of them in flight and collect the
+        acknowledges. Returns the set of the start addresses that were not acknowledged.
+        """
+        rx_len = RX_ARR_LEN[CMD_SET_CONFIG_DATA]
+        timeout = self.timeouts[CMD_SET_CONFIG_DATA]
+
+        to_send = list(chunks)
+        in_flight = set()
+        sent_time = {}
+        failed = set()
+        while to_send or in_flight:
+            if to_send and self._preempted('set_config_data_bulk', 'remaining writes'):
+                failed.update(el[0] for el in to_send)
+                to_send = []
+            #
+            #Keep the window full
+            while to_send and (len(in_flight) < window):
+                start_address, config_data = to_send.pop(0)
+                try:
+                    self.ser.write(bytearray(tx_set_config_data(start_address, config_data)))
+                except Exception as err:
+                    print(f'ERROR --> set_config_data_bulk: failed to write the serial port {self.port}. Exception message: {err}', file=sys.stderr)
+                    self.metrics.record(self.port, CMD_SET_CONFIG_DATA, 0., OUTCOME_ERROR)
+                    failed.add(start_address)
+                    continue
+                in_flight.add(start_address)
+                sent_time[start_address] = time.perf_counter()
+            #
+            if not in_flight:
+                continue
+            #
+
+            try:
+                rx_array = list(self._read_frame(CMD_SET_CONFIG_DATA, rx_len, timeout)[0])
+            except Exception as err:
+                print(f'ERROR --> set_config_data_bulk: failed to read the serial port {self.port}. Exception message: {err}', file=sys.stderr)
+                rx_array = []
+            #
+            now = time.perf_counter()
+            outcome = reply_outcome(CMD_SET_CONFIG_DATA, rx_array, rx_len)
+            if outcome != OUTCOME_OK:
+                for el in in_flight:
+                    self.metrics.record(self.port, CMD_SET_CONFIG_DATA, now - sent_time[el], outcome)
+            #
+            if len(rx_array) != rx_len:
+                #No acknowledge before the deadline: all the chunks in flight are lost
+                failed |= in_flight
+                in_flight.clear()
+                self.reset_input_buffer()
+                continue
+            #
+            if (check_sum(rx_array[:-1]) != rx_array[-1]) or (rx_array[0] != CMD_SET_CONFIG_DATA):
+                #Garbage on the line: the alignment of the following acknowledges is lost
+                failed |= in_flight
+                in_flight.clear()
+                self.reset_input_buffer()
+                continue
+            #
+            start_address = rx_array[1]
+            if start_address not in in_flight:
+                #Late acknowledge of a chunk already given up
+                continue
+            #
+            in_flight.discard(start_address)
+            self.metrics.record(self.port, CMD_SET_CONFIG_DATA, now - sent_time[start_address], outcome)
+            if rx_array[2] != ACK_OK:
+                failed.add(start_address)
+        #
+        return failed
+    #
+
+    def get_config_memory(self, max_age=None):
+        """
+        Read the config memory of the box. With `max_age` (in seconds) the cached memory is
+        returned instead, if it was read from the box within `max_age` (with the acknowledged
+        writes since then applied to it).
+        """
+        if max_age is not None:
+            rx_array = self.config_cache.get(self.cache_key, max_age)
+            if rx_array is not None:
+                return (tx_get_config_memory(), rx_array)
+        #
+        tx_array, rx_array = self._command('get_config_memory', tx_get_config_memory(), reset_input=True)
+        if rx_array is not None:
+            self.config_cache.put(self.cache_key, rx_array)
+        return (tx_array, rx_array)
     #
+#
+
+
+#The module level functions accept either a session (a SISConnection, whose port is kept
+#open, or any object with the same commands, e.g. a client of the daemon) or a bare serial
+#port (opened and closed at every command, as it has always been).
+def _as_session(ser):
+    if isinstance(ser, SISConnection) or hasattr(ser, 'read_position'):
+        return ser
+    return SISConnection(ser, persistent=False)
+
+
+def init(ser, unit):
+    return _as_session(ser).init(unit)
+
+
+def get_status(ser):
+    return _as_session(ser).get_status()
+
+
+def get_position(ser):
+    return _as_session(ser).get_position()
+
+
+def read_position(ser):
+    return _as_session(ser).read_position()
+
+
+def read_status(ser):
+    return _as_session(ser).read_status()
+
+
+def stop(ser, unit):
+    return _as_session(ser).stop(unit)
+
+
+def goto_position(ser, unit, pos):
+    return _as_session(ser).goto_position(unit, pos)
+
+
+# Function to send command and set configuration data
+def set_config_data(ser, start_address, config_data):
+    return _as_session(ser).set_config_data(start_address, config_data)
+
+
+def set_config_data_bulk(ser, chunks, window=4, retries=2):
+    return _as_session(ser).set_config_data_bulk(chunks, window, retries)
+
 
-    return (tx_array, rx_array)
+def get_config_memory(ser, max_age=None):
+    return _as_session(ser).get_config_memory(max_age)
 
 
 def bytearray_to_float(byte_array: bytearray) -> float:
-    return struct.unpack('f', byte_array)[0]
+    # Unpack the float from 4 bytes, little-endian (as written by "float_to_bytearray")
+    return struct.unpack('<f', byte_array)[0]
 
 def float_to_bytearray(value: float) -> bytearray:
     # Pack the float into 4 bytes, little-endian
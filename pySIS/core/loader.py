@@ -0,0 +1,91 @@
+import sys
+import glob
+
+import numpy as np
+
+from .runlog import RUNLOG_MAGIC, RUNLOG_HEADER, RUNLOG_RECORD, NO_DIRECTION
+
+
+#NumPy view of a run log record (same layout as RUNLOG_RECORD)
+RUNLOG_DTYPE = np.dtype([('time', '<f8'),
+                         ('inc', '<u2'),
+                         ('abs', '<u2'),
+                         ('raw_msb', 'u1'),
+                         ('raw_lsb', 'u1'),
+                         ('direction', 'i1'),
+                         ('unit', 'u1')])
+
+assert RUNLOG_DTYPE.itemsize == RUNLOG_RECORD.size
+
+
+def _is_binary_runlog(fname):
+    with open(fname, 'rb') as infile:
+        return infile.read(len(RUNLOG_MAGIC)) == RUNLOG_MAGIC
+
+
+def load_runlog(fname, unit=0):
+    """
+    Load a run log into a NumPy structured array with fields
+    time, inc, abs, raw_msb, raw_lsb, direction, unit (see RUNLOG_DTYPE).
+
+    Binary run logs are memory-mapped (read only, no copy). Text run logs
+    (`unixtime~inc~abs~raw_msb~raw_lsb[~dir]`) are parsed in one vectorized pass; they do not
+    store the unit number, which is taken from `unit`, and the logs without direction column
+    get direction=-1.
+    """
+    if _is_binary_runlog(fname):
+        with open(fname, 'rb') as infile:
+            magic, version, rec_size = RUNLOG_HEADER.unpack(infile.read(RUNLOG_HEADER.size))
+        #
+        if rec_size != RUNLOG_DTYPE.itemsize:
+            raise ValueError(f'load_runlog: unsupported record size {rec_size} (version {version}) in "{fname}".')
+        #
+        data = np.memmap(fname, dtype=np.uint8, mode='r', offset=RUNLOG_HEADER.size)
+        nrec = data.size // RUNLOG_DTYPE.itemsize
+        if nrec * RUNLOG_DTYPE.itemsize != data.size:
+            print(f'WARNING --> load_runlog: truncated last record in "{fname}" ignored.', file=sys.stderr)
+        return data[:nrec * RUNLOG_DTYPE.itemsize].view(RUNLOG_DTYPE)
+    #
+
+    with open(fname, 'r') as infile:
+        text = infile.read()
+    #
+    first_line = text.split('\n', 1)[0].strip()
+    records = np.zeros(0, dtype=RUNLOG_DTYPE)
+    if not first_line:
+        return records
+    #
+    ncols = first_line.count('~') + 1
+    if ncols not in (5, 6):
+        raise ValueError(f'load_runlog: "{fname}" has {ncols} columns instead of 5 or 6.')
+    #
+    values = np.fromstring(text.replace('~', ' '), dtype=np.float64, sep=' ')
+    if values.size % ncols:
+        print(f'WARNING --> load_runlog: incomplete last line in "{fname}" ignored.', file=sys.stderr)
+    values = values[:values.size - (values.size % ncols)].reshape(-1, ncols)
+
+    records = np.empty(values.shape[0], dtype=RUNLOG_DTYPE)
+    records['time'] = values[:, 0]
+    records['inc'] = values[:, 1]
+    records['abs'] = values[:, 2]
+    records['raw_msb'] = values[:, 3]
+    records['raw_lsb'] = values[:, 4]
+    records['direction'] = values[:, 5] if (ncols == 6) else NO_DIRECTION
+    records['unit'] = unit
+    return records
+
+
+def load_runlogs(fnames, unit=0):
+    """
+    Load several run logs (a list of file names or a glob pattern) with "load_runlog" and
+    concatenate them, sorted by file name, into a single structured array.
+    """
+    if isinstance(fnames, str):
+        fnames = sorted(glob.glob(fnames))
+    #
+    arrays = [load_runlog(fname, unit) for fname in fnames]
+    if not arrays:
+        return np.zeros(0, dtype=RUNLOG_DTYPE)
+    if len(arrays) == 1:
+        return arrays[0]
+    return np.concatenate(arrays)
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import threading
+
+
+#Upper bounds (in seconds) of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+#Outcomes of a command on the wire
+OUTCOME_OK = 'ok'
+OUTCOME_RESYNC = 'resync' #valid reply found after discarding stray bytes
+OUTCOME_TIMEOUT = 'timeout' #no byte received before the deadline
+OUTCOME_SHORT_READ = 'short_read' #some bytes, but fewer than expected
+OUTCOME_WRONG_CMD = 'wrong_cmd' #rx_array[0] is not the command byte
+OUTCOME_CHECKSUM = 'checksum' #checksum failure
+OUTCOME_ERROR = 'error' #exception from the serial port
+OUTCOMES = (OUTCOME_OK, OUTCOME_RESYNC, OUTCOME_TIMEOUT, OUTCOME_SHORT_READ, OUTCOME_WRONG_CMD, OUTCOME_CHECKSUM, OUTCOME_ERROR)
+
+
+class CommandStats:
+    """
+    Counters of one command on one port: calls, outcomes and latency histogram.
+    """
+
+    __slots__ = ('count', 'outcomes', 'buckets', 'latency_sum', 'latency_max')
+
+    def __init__(self):
+        self.count = 0
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1) #the last one is +Inf
+        self.latency_sum = 0.
+        self.latency_max = 0.
+    #
+
+    def record(self, latency, outcome):
+        self.count += 1
+        self.outcomes[outcome] += 1
+        iBucket = 0
+        while (iBucket < len(LATENCY_BUCKETS)) and (latency > LATENCY_BUCKETS[iBucket]):
+            iBucket += 1
+        self.buckets[iBucket] += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+    #
+
+    def as_dict(self):
+        cumulative = []
+        total = 0
+        for el in self.buckets:
+            total += el
+            cumulative.append(total)
+        #
+        return {'count': self.count,
+                'outcomes': dict(self.outcomes),
+                'latency_sum_s': self.latency_sum,
+                'latency_max_s': self.latency_max,
+                'latency_buckets': {str(le): n for le, n in zip(LATENCY_BUCKETS + ('+Inf',), cumulative)}
+                }
+    #
+#
+
+
+class Metrics:
+    """
+    Thread safe registry of the CommandStats, keyed by port and command byte.
+
+    `command_names` maps the command bytes to the names used in the exports.
+    """
+
+    def __init__(self, command_names=None):
+        self.command_names = dict(command_names or {})
+        self._stats = {}
+        self._lock = threading.Lock()
+    #
+
+    def record(self, port, cmd_byte, latency, outcome):
+        key = (str(port), int(cmd_byte))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = CommandStats()
+            stats.record(latency, outcome)
+        #
+    #
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+    #
+
+    def command_name(self, cmd_byte):
+        return self.command_names.get(cmd_byte, str(cmd_byte))
+    #
+
+    def snapshot(self):
+        """
+        Copy of the counters as nested dicts: {port: {command name: stats dict}}.
+        """
+        result = {}
+        with self._lock:
+            for (port, cmd_byte), stats in sorted(self._stats.items()):
+                result.setdefault(port, {})[self.command_name(cmd_byte)] = stats.as_dict()
+        #
+        return result
+    #
+
+    def to_json(self):
+        return json.dumps({'time': time.time(), 'ports': self.snapshot()}, indent=2)
+    #
+
+    def to_prometheus(self):
+        """
+        Counters in the Prometheus text exposition format.
+        """
+        lines = ['# HELP sis_commands_total Commands sent to the SIS boxes, by outcome.',
+                 '# TYPE sis_commands_total counter']
+        histo_lines = ['# HELP sis_command_latency_seconds Round trip latency of the commands.',
+                       '# TYPE sis_command_latency_seconds histogram']
+        for port, commands in self.snapshot().items():
+            for cmd, stats in commands.items():
+                labels = f'port="{port}",cmd="{cmd}"'
+                for outcome, n in stats['outcomes'].items():
+                    lines.append(f'sis_commands_total{{{labels},outcome="{outcome}"}} {n}')
+                for le, n in stats['latency_buckets'].items():
+                    histo_lines.append(f'sis_command_latency_seconds_bucket{{{labels},le="{le}"}} {n}')
+                histo_lines.append(f'sis_command_latency_seconds_sum{{{labels}}} {stats["latency_sum_s"]}')
+                histo_lines.append(f'sis_command_latency_seconds_count{{{labels}}} {stats["count"]}')
+            #
+        #
+        return '\n'.join(lines + histo_lines) + '\n'
+    #
+#
+
+
+class MetricsExporter:
+    """
+    Write the metrics every `interval` seconds into `fname`, in Prometheus text format
+    (`fmt='prom'`, e.g. for the textfile collector of the node exporter) or as JSON
+    (`fmt='json'`). The file is replaced atomically, so a reader never sees a partial file.
+    """
+
+    def __init__(self, metrics, fname, interval=10., fmt='prom'):
+        if fmt not in ('prom', 'json'):
+            raise ValueError(f'Unknown metrics format "{fmt}"')
+        #
+        self.metrics = metrics
+        self.fname = fname
+        self.interval = interval
+        self.fmt = fmt
+
+        self._stop = threading.Event()
+        self._thread = None
+    #
+
+    def export(self):
+        text = self.metrics.to_prometheus() if (self.fmt == 'prom') else self.metrics.to_json()
+        tmp_fname = f'{self.fname}.tmp'
+        try:
+            with open(tmp_fname, 'w') as outfile:
+                outfile.write(text)
+            os.replace(tmp_fname, self.fname)
+        except OSError as err:
+            print(f'ERROR --> MetricsExporter: cannot write the metrics file {self.fname}. Exception message: {err}', file=sys.stderr)
+        #
+    #
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+        #
+    #
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='SIS-metrics', daemon=True)
+        self._thread.start()
+        return self
+    #
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        #
+        self.export()
+    #
+
+    def __enter__(self):
+        return self.start()
+    #
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+    #
+#
@@ -0,0 +1,193 @@
+import sys
+import time
+import queue
+import threading
+from collections import namedtuple
+
+from .daemon import open_session
+from .scheduler import CommandScheduler
+from .tracking import move_units, AdaptivePollRate
+
+
+#A movement request: move `unit` of the box on serial port `port` to position `target` (mm)
+MoveJob = namedtuple('MoveJob', ['port', 'unit', 'target'])
+
+
+class BoxResult:
+    """
+    Summary of the jobs run on one box.
+
+    `final_pos` is the incremental position of each moved unit at the end of the run (None if
+    it could not be read), `completed` tells whether all the units reached their target with
+    the motor idle, `error` holds the message of the exception that stopped the worker.
+    """
+    __slots__ = ('port', 'targets', 'final_pos', 'completed', 'error', 'elapsed')
+
+    def __init__(self, port, targets):
+        self.port = port
+        self.targets = dict(targets)
+        self.final_pos = {unit: None for unit in targets}
+        self.completed = False
+        self.error = None
+        self.elapsed = None
+    #
+
+    def __repr__(self):
+        return (f'BoxResult(port={self.port}, targets={self.targets}, final_pos={self.final_pos}, '
+                f'completed={self.completed}, error={self.error}, elapsed={self.elapsed})')
+    #
+#
+
+
+class MultiBoxMover:
+    """
+    Run a set of MoveJobs on several SIS boxes concurrently.
+
+    The jobs are grouped by serial port, and each port gets its own worker thread that moves
+    all the requested units of its box at once (see "move_units"). The samples of all the
+    boxes are merged into a single progress stream:
+
+        mover = MultiBoxMover(jobs)
+        for port, sample in mover.progress():
+            ...
+        print(mover.results)
+
+    `run()` does the same without looking at the samples. The results are a dict of
+    BoxResult keyed by port.
+
+    With `min_rate_hz` each box is polled with an AdaptivePollRate between `min_rate_hz` and
+    `rate_hz`, otherwise at the fixed `rate_hz`.
+
+    The commands of each box go through a CommandScheduler, so that `stop()` (e.g. on Ctrl+C)
+    reaches the units ahead of the polls of the workers.
+    """
+
+    def __init__(self, jobs, rate_hz=10, timeout=None, baudrate=9600, serial_timeout=0.5, min_rate_hz=None):
+        self.rate_hz = rate_hz
+        self.min_rate_hz = min_rate_hz
+        self.timeout = timeout
+        self.baudrate = baudrate
+        self.serial_timeout = serial_timeout
+
+        self.targets = {}
+        for job in jobs:
+            self.targets.setdefault(job.port, {})[job.unit] = job.target
+        #
+        self.results = {port: BoxResult(port, targets) for port, targets in self.targets.items()}
+
+        self._queue = queue.Queue()
+        self._threads = []
+        self._schedulers = {}
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+    #
+
+    def _worker(self, port):
+        result = self.results[port]
+        start = time.monotonic()
+        last = {}
+        try:
+            with CommandScheduler(open_session(port, baudrate=self.baudrate, timeout=self.serial_timeout)) as ser:
+                with self._lock:
+                    if self._stopped.is_set():
+                        return
+                    self._schedulers[port] = ser
+                #
+                if self.min_rate_hz is None:
+                    rate_hz = self.rate_hz
+                else:
+                    rate_hz = AdaptivePollRate(min_hz=self.min_rate_hz, max_hz=self.rate_hz)
+                #
+                for sample in move_units(ser, self.targets[port], rate_hz=rate_hz, timeout=self.timeout):
+                    last[sample.unit] = sample
+                    self._queue.put((port, sample))
+                    if self._stopped.is_set():
+                        break
+                #
+                if self._stopped.is_set():
+                    #A "goto_position" sent after the stop would have restarted its unit
+                    ser.stop_units(result.targets)
+                #
+                frame = ser.read_position()
+                for unit in result.targets:
+                    if frame is not None:
+                        result.final_pos[unit] = frame.inc_pos[unit]
+                    elif unit in last:
+                        result.final_pos[unit] = last[unit].inc_pos
+                #
+            #
+            result.completed = all((unit in last) and (last[unit].motor == 0) and (result.final_pos[unit] == target)
+                                   for unit, target in result.targets.items())
+        except Exception as err:
+            print(f'ERROR --> MultiBoxMover: worker of port {port} stopped. Exception message: {err}', file=sys.stderr)
+            result.error = str(err)
+        finally:
+            result.elapsed = time.monotonic() - start
+            self._queue.put((port, None))
+    #
+
+    def start(self):
+        for port in self.targets:
+            thread = threading.Thread(target=self._worker, args=(port,), name=f'SIS-{port}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        #
+    #
+
+    def progress(self):
+        """
+        Generator of the `(port, TrackSample)` pairs of all the boxes, until every worker is done.
+        Starts the workers if needed.
+        """
+        if not self._threads:
+            self.start()
+        #
+        running = len(self._threads)
+        while running:
+            port, sample = self._queue.get()
+            if sample is None:
+                running -= 1
+                continue
+            yield (port, sample)
+        #
+        for thread in self._threads:
+            thread.join()
+    #
+
+    def stop(self):
+        """
+        Stop all the units of every box and wait for the workers to end. Returns the dict
+        {port: {unit: (tx_array, rx_array)}} of the replies to the stops.
+        """
+        with self._lock:
+            self._stopped.set()
+            schedulers = dict(self._schedulers)
+        #
+        replies = {}
+        for port, ser in schedulers.items():
+            try:
+                replies[port] = ser.stop_units(self.targets[port])
+            except RuntimeError as err:
+                #The worker was done and closed its scheduler
+                print(f'WARNING --> MultiBoxMover: units of port {port} not stopped. Exception message: {err}', file=sys.stderr)
+        #
+        for thread in self._threads:
+            thread.join()
+        #
+        return replies
+    #
+
+    def run(self):
+        for _ in self.progress():
+            pass
+        return self.results
+    #
+#
+
+
+def move_boxes(jobs, rate_hz=10, timeout=None):
+    """
+    Run the MoveJobs concurrently (one worker per serial port) and return the dict of the
+    BoxResults keyed by port.
+    """
+    return MultiBoxMover(jobs, rate_hz=rate_hz, timeout=timeout).run()
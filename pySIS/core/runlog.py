@@ -0,0 +1,166 @@
+import os
+import sys
+import time
+import struct
+import atexit
+
+
+#Binary run log: a 16 bytes header followed by fixed width 16 bytes records
+RUNLOG_MAGIC = b'SISRUN'
+RUNLOG_VERSION = 1
+RUNLOG_HEADER = struct.Struct('<6sHH6x') #magic, version, record size
+
+#unix time, inc position, abs position, abs encoder raw msb, abs encoder raw lsb, direction, unit
+RUNLOG_RECORD = struct.Struct('<dHHBBbB')
+
+#Direction code of the records written without direction (e.g. by MoveAndTrackSingle.py)
+NO_DIRECTION = -1
+
+FSYNC_POLICIES = ('never', 'flush', 'close')
+
+
+def runlog_format(fname):
+    """
+    Format of a run log from its file name: '.bin' files are binary, everything else is
+    the '~' separated text format.
+    """
+    return 'binary' if os.path.splitext(fname)[1] == '.bin' else 'text'
+
+
+class RunLogWriter:
+    """
+    Buffered writer of the run logs of the tracking loops.
+
+    The samples are accumulated in memory and written to the file when the buffer holds
+    `buffer_size` bytes, when `flush_interval` seconds have passed since the last flush,
+    and when the writer is closed (also at the interpreter exit).
+
+    `fmt` is 'binary' (fixed width records, see RUNLOG_RECORD) or 'text' (the historical
+    `unixtime~inc~abs~raw_msb~raw_lsb[~dir]` lines).
+    `fsync` tells when the data are forced to the disk: 'never' (leave it to the OS),
+    'flush' (at every flush) or 'close' (only when closing the file).
+    """
+
+    def __init__(self, fname, fmt=None, buffer_size=64*1024, flush_interval=1.0, fsync='never'):
+        if fmt is None:
+            fmt = runlog_format(fname)
+        if fmt not in ('binary', 'text'):
+            raise ValueError(f'RunLogWriter: unknown run log format "{fmt}"')
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'RunLogWriter: unknown fsync policy "{fsync}". Allowed values: {FSYNC_POLICIES}')
+        #
+
+        self.fname = fname
+        self.fmt = fmt
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self._nrec_max = max(1, buffer_size // RUNLOG_RECORD.size)
+        self._buffer = bytearray(self._nrec_max * RUNLOG_RECORD.size)
+        self._nrec = 0
+        self._lines = []
+        self._last_flush = time.monotonic()
+
+        self._file = open(fname, 'wb')
+        if fmt == 'binary':
+            self._file.write(RUNLOG_HEADER.pack(RUNLOG_MAGIC, RUNLOG_VERSION, RUNLOG_RECORD.size))
+        #
+        atexit.register(self.close)
+    #
+
+    def write(self, unixtime, inc_pos, abs_pos, raw_msb, raw_lsb, direction=None, unit=0):
+        if self.fmt == 'binary':
+            RUNLOG_RECORD.pack_into(self._buffer, self._nrec * RUNLOG_RECORD.size,
+                                    unixtime, inc_pos, abs_pos, raw_msb, raw_lsb,
+                                    NO_DIRECTION if (direction is None) else direction, unit)
+            self._nrec += 1
+            full = (self._nrec == self._nrec_max)
+        else:
+            if direction is None:
+                self._lines.append(f'{unixtime}~{inc_pos}~{abs_pos}~{int(raw_msb)}~{int(raw_lsb)}\n')
+            else:
+                self._lines.append(f'{unixtime}~{inc_pos}~{abs_pos}~{int(raw_msb)}~{int(raw_lsb)}~{direction}\n')
+            full = (len(self._lines) == self._nrec_max)
+        #
+        if full or (time.monotonic() - self._last_flush > self.flush_interval):
+            self.flush()
+    #
+
+    def write_sample(self, sample, direction=None):
+        """
+        Write a TrackSample yielded by "track".
+        """
+        self.write(sample.time, sample.inc_pos, sample.abs_pos, sample.raw_msb, sample.raw_lsb, direction, sample.unit)
+    #
+
+    def flush(self):
+        if self._file is None:
+            return
+        #
+        if self._nrec:
+            self._file.write(memoryview(self._buffer)[:self._nrec * RUNLOG_RECORD.size])
+            self._nrec = 0
+        if self._lines:
+            self._file.write(''.join(self._lines).encode())
+            self._lines.clear()
+        #
+        self._file.flush()
+        if self.fsync == 'flush':
+            os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+    #
+
+    def close(self):
+        if self._file is None:
+            return
+        #
+        self.flush()
+        if self.fsync == 'close':
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        atexit.unregister(self.close)
+    #
+
+    def __enter__(self):
+        return self
+    #
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    #
+#
+
+
+def read_runlog_records(fname):
+    """
+    Iterate over the records of a binary run log, as tuples
+    (unixtime, inc_pos, abs_pos, raw_msb, raw_lsb, direction, unit).
+    """
+    with open(fname, 'rb') as infile:
+        magic, version, rec_size = RUNLOG_HEADER.unpack(infile.read(RUNLOG_HEADER.size))
+        if (magic != RUNLOG_MAGIC) or (rec_size != RUNLOG_RECORD.size):
+            raise ValueError(f'read_runlog_records: "{fname}" is not a binary SIS run log (version {RUNLOG_VERSION}).')
+        #
+        data = infile.read()
+    #
+    nbytes = len(data) - (len(data) % RUNLOG_RECORD.size)
+    if nbytes != len(data):
+        print(f'WARNING --> read_runlog_records: truncated last record in "{fname}" ignored.', file=sys.stderr)
+    return RUNLOG_RECORD.iter_unpack(memoryview(data)[:nbytes])
+
+
+def runlog_to_text(binfname, txtfname):
+    """
+    Convert a binary run log into the historical '~' separated text format. The direction
+    column is written only for the records that have one.
+    Returns the number of records converted.
+    """
+    nrec = 0
+    with RunLogWriter(txtfname, fmt='text') as writer:
+        for unixtime, inc_pos, abs_pos, raw_msb, raw_lsb, direction, unit in read_runlog_records(binfname):
+            writer.write(unixtime, inc_pos, abs_pos, raw_msb, raw_lsb, None if (direction == NO_DIRECTION) else direction, unit)
+            nrec += 1
+    #
+    return nrec
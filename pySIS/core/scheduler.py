@@ -0,0 +1,258 @@
+import sys
+import time
+import heapq
+import threading
+import collections
+from concurrent.futures import Future, CancelledError
+
+from .libSIS import *
+from .benchmark import latency_summary
+
+
+#Priority classes of the commands (the lower, the sooner)
+PRIORITY_STOP = 0
+PRIORITY_MOTION = 1
+PRIORITY_CONFIG = 2
+PRIORITY_TELEMETRY = 3
+
+COMMAND_PRIORITY = {'stop': PRIORITY_STOP,
+                    'init': PRIORITY_MOTION,
+                    'goto_position': PRIORITY_MOTION,
+                    'set_config_data': PRIORITY_CONFIG,
+                    'set_config_data_bulk': PRIORITY_CONFIG,
+                    'get_config_memory': PRIORITY_CONFIG,
+                    'get_status': PRIORITY_TELEMETRY,
+                    'get_position': PRIORITY_TELEMETRY,
+                    'read_position': PRIORITY_TELEMETRY,
+                    'read_status': PRIORITY_TELEMETRY}
+
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'method', 'args', 'future', 'queued')
+
+    def __init__(self, priority, seq, method, args):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.args = args
+        self.future = Future()
+        self.queued = time.monotonic()
+    #
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+    #
+#
+
+
+class CommandScheduler:
+    """
+    Priority scheduler of the commands sent to a box through a session (a SISConnection, a
+    daemon client...).
+
+    A worker thread owns the session and sends the queued commands by priority class: "stop"
+    first, then the motion commands ("init", "goto_position"), then the config transfers,
+    then the telemetry polls, in the order of submission within a class. A "stop" also:
+      - cancels the queued motion commands of the same unit, that would restart it;
+      - makes the command on the wire give up its retries (see RetryPolicy), and a bulk
+        config write give up its chunks not sent yet, so that the stop waits at most for one
+        attempt of the command in progress (one window of chunks for a bulk write).
+    The time from the submission of each stop to the moment it goes on the wire is kept in
+    `stop_latencies` (seconds, the last `history` stops).
+
+    The scheduler has the commands of SISConnection (they block until the command is done),
+    so a tracking loop can run through it while another thread, or a signal handler, stops
+    the units.
+    """
+
+    def __init__(self, ser, history=1000):
+        self.ser = ser
+        self.stop_latencies = collections.deque(maxlen=history)
+
+        self._queue = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._current = None #job on the wire
+
+        #Cut the retries of the command on the wire when a stop is waiting
+        if hasattr(ser, 'preempt'):
+            ser.preempt = self._stop_waiting
+        #
+        self._thread = threading.Thread(target=self._worker, name=f'SIS-scheduler-{ser.port}', daemon=True)
+        self._thread.start()
+    #
+
+    @property
+    def port(self):
+        return self.ser.port
+    #
+
+    @property
+    def is_open(self):
+        return self.ser.is_open
+    #
+
+    def open(self):
+        self.ser.open()
+    #
+
+    def _stop_waiting(self):
+        current = self._current
+        return (current is not None) and (current.priority > PRIORITY_STOP) and bool(self._queue) and (self._queue[0].priority == PRIORITY_STOP)
+    #
+
+    def submit(self, method, *args, priority=None):
+        """
+        Queue the command `method` of the session with its `args` and return a Future with
+        its result. The priority class is the one of COMMAND_PRIORITY, unless given.
+        """
+        if priority is None:
+            priority = COMMAND_PRIORITY[method]
+        #
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f'the command scheduler of port {self.port} is closed')
+            #
+            self._seq += 1
+            job = _Job(priority, self._seq, method, args)
+            if method == 'stop':
+                #Preempt the queued motion commands of the unit
+                for el in self._queue:
+                    if (el.method in ('goto_position', 'init')) and (el.args[0] == args[0]):
+                        el.future.cancel()
+                #
+            #
+            heapq.heappush(self._queue, job)
+            self._cond.notify()
+        #
+        return job.future
+    #
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                #
+                job = heapq.heappop(self._queue)
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                self._current = job
+            #
+            if job.method == 'stop':
+                self.stop_latencies.append(time.monotonic() - job.queued)
+            #
+            try:
+                job.future.set_result(getattr(self.ser, job.method)(*job.args))
+            except Exception as err:
+                job.future.set_exception(err)
+            finally:
+                self._current = None
+        #
+    #
+
+    def _call(self, method, *args):
+        try:
+            return self.submit(method, *args).result()
+        except CancelledError:
+            print(f'WARNING --> {method}: command cancelled by a stop of the unit on port {self.port}.', file=sys.stderr)
+            return None
+    #
+
+    def _command(self, method, tx_array, *args):
+        result = self._call(method, *args)
+        return (tx_array, None) if (result is None) else result
+    #
+
+    def init(self, unit):
+        return self._command('init', tx_init(unit), unit)
+    #
+
+    def get_status(self):
+        return self._command('get_status', tx_get_status())
+    #
+
+    def get_position(self):
+        return self._command('get_position', tx_get_position())
+    #
+
+    def read_position(self):
+        return self._call('read_position')
+    #
+
+    def read_status(self):
+        return self._call('read_status')
+    #
+
+    def stop(self, unit):
+        return self._command('stop', tx_stop(unit), unit)
+    #
+
+    def goto_position(self, unit, pos):
+        return self._command('goto_position', tx_goto_position(unit, pos), unit, pos)
+    #
+
+    def stop_units(self, units):
+        """
+        Stop several units: all the stops are queued at once, ahead of any other command.
+        Returns the dict {unit: (tx_array, rx_array)} of the replies.
+        """
+        futures = {unit: self.submit('stop', unit) for unit in units}
+        result = {}
+        for unit, future in futures.items():
+            try:
+                result[unit] = future.result()
+            except Exception as err:
+                print(f'ERROR --> stop_units: the stop of unit {unit} on port {self.port} failed. Exception message: {err}', file=sys.stderr)
+                result[unit] = (tx_stop(unit), None)
+        #
+        return result
+    #
+
+    def set_config_data(self, start_address, config_data):
+        return self._command('set_config_data', tx_set_config_data(start_address, config_data), start_address, config_data)
+    #
+
+    def set_config_data_bulk(self, chunks, window=4, retries=2):
+        return self._call('set_config_data_bulk', chunks, window, retries)
+    #
+
+    def get_config_memory(self, max_age=None):
+        return self._command('get_config_memory', tx_get_config_memory(), max_age)
+    #
+
+    def stop_latency_summary(self):
+        """
+        Summary (in milliseconds, see "benchmark.latency_summary") of the queue-to-wire
+        latencies of the stops. Through a daemon client the local queue is only part of the
+        wait, so the summary measured by the daemon, up to the serial port, is returned.
+        """
+        if hasattr(self.ser, 'stop_latency_summary'):
+            return self.ser.stop_latency_summary()
+        return latency_summary(list(self.stop_latencies))
+    #
+
+    def close(self):
+        """
+        Send the commands still queued, stop the worker and close the session.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        #
+        self._thread.join()
+        self.ser.close()
+    #
+
+    def __enter__(self):
+        return self
+    #
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    #
+#
@@ -0,0 +1,356 @@
+import os
+import math
+import time
+import random
+import struct
+import threading
+
+from .libSIS import *
+from .BoxConfig import BoxConfig
+
+
+class SimulatedUnit:
+    """
+    Model of one unit of the box: a source on a tape driven by a motor at constant speed.
+
+    The incremental encoder reads the true position, the absolute encoder reads it with a
+    periodic deviation (amplitude `abs_error_mm`, one period per wheel turn) and its raw
+    reading is the angle of the wheel as a 16 bits integer.
+    """
+
+    def __init__(self, speed=20., abs_error_mm=2.):
+        self.speed = speed #mm/s
+        self.abs_error_mm = abs_error_mm
+
+        self.pos = 0. #mm
+        self.target = 0.
+        self.init_done = False
+        self.init_running = False
+    #
+
+    def advance(self, dt):
+        delta = self.target - self.pos
+        step = self.speed * dt
+        if abs(delta) <= step:
+            self.pos = self.target
+            if self.init_running:
+                self.init_running = False
+                self.init_done = True
+            #
+        else:
+            self.pos += math.copysign(step, delta)
+    #
+
+    @property
+    def moving(self):
+        return self.pos != self.target
+    #
+
+    def status_byte(self):
+        return (1 if self.moving else 0) | (int(self.init_done) << 2) | (int(self.init_running) << 3)
+    #
+
+    def readings(self, wheel_diam):
+        """
+        Incremental position, absolute position and raw absolute encoder reading.
+        """
+        circumference = math.pi * wheel_diam
+        turn_frac = (self.pos % circumference) / circumference
+        inc_pos = int(round(self.pos)) & 0xFFFF
+        abs_pos = int(round(self.pos + self.abs_error_mm * math.sin(2 * math.pi * turn_frac))) & 0xFFFF
+        raw = int(turn_frac * 65536) & 0xFFFF
+        return (inc_pos, abs_pos, raw)
+    #
+#
+
+
+class SimulatedBox:
+    """
+    Software model of a SIS control box speaking the serial protocol of libSIS.
+
+    `handle(tx_frame)` takes a 7 bytes command packet and returns the reply bytes (empty if
+    the box does not answer). The three units move in real time (see SimulatedUnit), the
+    config memory is the 248 bytes image of a default BoxConfig.
+
+    Faults can be injected with the probabilities `drop_prob` (no reply), `corrupt_prob` (one
+    byte of the reply altered), `short_prob` (reply truncated) and `garbage_prob` (a stray
+    byte before the reply). `config_write_enabled=False` makes the box refuse config writes.
+    """
+
+    def __init__(self, speed=20., abs_error_mm=2., config_write_enabled=True,
+                 drop_prob=0., corrupt_prob=0., short_prob=0., garbage_prob=0., seed=None):
+        self.units = [SimulatedUnit(speed, abs_error_mm) for _ in range(3)]
+        self.memory = bytearray(BoxConfig().get_memory_image())
+        self.config_write_enabled = config_write_enabled
+
+        self.drop_prob = drop_prob
+        self.corrupt_prob = corrupt_prob
+        self.short_prob = short_prob
+        self.garbage_prob = garbage_prob
+        self._rng = random.Random(seed)
+
+        self._last_time = time.monotonic()
+        self._lock = threading.Lock()
+    #
+
+    def advance(self):
+        now = time.monotonic()
+        dt = now - self._last_time
+        self._last_time = now
+        for unit in self.units:
+            unit.advance(dt)
+    #
+
+    def wheel_diam(self, unit):
+        return struct.unpack_from('<f', self.memory, 192 + 4 * unit)[0]
+    #
+
+    def _reply(self, tx_frame):
+        cmd_byte = tx_frame[0]
+        unit = tx_frame[1]
+
+        if cmd_byte == CMD_GET_STATUS:
+            rx_array = [CMD_GET_STATUS] + [0] * 7 + [el.status_byte() for el in self.units] + [0] * 3
+        elif cmd_byte == CMD_GET_POSITION:
+            rx_array = [CMD_GET_POSITION]
+            raws = []
+            for iUnit, el in enumerate(self.units):
+                inc_pos, abs_pos, raw = el.readings(self.wheel_diam(iUnit))
+                rx_array += [abs_pos & 255, abs_pos >> 8, inc_pos & 255, inc_pos >> 8]
+                raws += [raw & 255, raw >> 8]
+            rx_array += raws
+        elif cmd_byte in (CMD_INIT, CMD_STOP, CMD_GOTO_POSITION):
+            ack = ACK_OK
+            if unit > 2:
+                ack = BoxConfig.ACK_INVALID_ID
+            elif cmd_byte == CMD_INIT:
+                self.units[unit].init_running = True
+                self.units[unit].init_done = False
+                self.units[unit].target = 0.
+            elif cmd_byte == CMD_STOP:
+                self.units[unit].target = self.units[unit].pos
+                self.units[unit].init_running = False
+            else:
+                self.units[unit].target = float(tx_frame[2] + 256 * tx_frame[3])
+            #
+            if cmd_byte == CMD_GOTO_POSITION:
+                rx_array = [cmd_byte, unit, ack, tx_frame[2], tx_frame[3]]
+            else:
+                rx_array = [cmd_byte, unit, ack]
+        elif cmd_byte == CMD_SET_CONFIG_DATA:
+            start_address = tx_frame[1]
+            if not self.config_write_enabled:
+                ack = ACK_CFG_WRITE_DISABLED
+            elif start_address + 4 > len(self.memory):
+                ack = BoxConfig.ACK_INVALID_VALUE
+            else:
+                self.memory[start_address:start_address+4] = tx_frame[2:6]
+                ack = ACK_OK
+            rx_array = [cmd_byte, start_address, ack]
+        elif cmd_byte == CMD_GET_CONFIG_MEM:
+            rx_array = [cmd_byte] + list(self.memory)
+        else:
+            return b''
+        #
+        #Only the checksum of the replies in RX_HAS_CHECKSUM is validated by libSIS: the last
+        #byte of the other replies is left at 0, so that nothing relies on it
+        rx_array.append(check_sum(rx_array) if (cmd_byte in RX_HAS_CHECKSUM) else 0)
+        return bytes(rx_array)
+    #
+
+    def handle(self, tx_frame):
+        """
+        Process a command packet and return the reply bytes.
+        """
+        tx_frame = bytes(tx_frame)
+        if (len(tx_frame) != 7) or (check_sum(tx_frame[:-1]) != tx_frame[-1]):
+            return b''
+        #
+        with self._lock:
+            self.advance()
+            rx_bytes = self._reply(tx_frame)
+        #
+
+        #Fault injection
+        rng = self._rng
+        if rx_bytes and (rng.random() < self.drop_prob):
+            return b''
+        if rx_bytes and (rng.random() < self.corrupt_prob):
+            rx_bytes = bytearray(rx_bytes)
+            rx_bytes[rng.randrange(len(rx_bytes))] ^= 1 << rng.randrange(8)
+            rx_bytes = bytes(rx_bytes)
+        if rx_bytes and (rng.random() < self.short_prob):
+            rx_bytes = rx_bytes[:rng.randrange(len(rx_bytes))]
+        if rng.random() < self.garbage_prob:
+            rx_bytes = bytes([rng.randrange(256)]) + rx_bytes
+        #
+        return rx_bytes
+    #
+#
+
+
+class FakeSerial:
+    """
+    In-process stand-in for `serial.Serial` connected to a SimulatedBox.
+
+    The replies become readable `latency` seconds after the command is written, plus the
+    transfer time of the bytes at `baudrate` (10 bits per byte) unless `baudrate=None`.
+    `read` honours `timeout` like pyserial (None blocks, 0 does not wait).
+    """
+
+    def __init__(self, box=None, port='sim://box', baudrate=9600, timeout=0.5, latency=0.005):
+        self.box = SimulatedBox() if (box is None) else box
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.latency = latency
+        self.is_open = True
+
+        self._tx_buffer = bytearray()
+        self._rx_queue = [] #(time at which the byte is readable, byte)
+        self._line_free = 0. #time at which the reply line is free again
+    #
+
+    def open(self):
+        self.is_open = True
+    #
+
+    def close(self):
+        self.is_open = False
+    #
+
+    def _byte_time(self):
+        return 0. if (self.baudrate is None) else 10. / self.baudrate
+    #
+
+    def write(self, data):
+        if not self.is_open:
+            raise IOError(f'FakeSerial: port {self.port} is not open')
+        #
+        self._tx_buffer += bytes(data)
+        now = time.monotonic()
+        #The command is received after its own transfer time
+        ready = now + len(data) * self._byte_time()
+        while len(self._tx_buffer) >= 7:
+            tx_frame = bytes(self._tx_buffer[:7])
+            del self._tx_buffer[:7]
+            rx_bytes = self.box.handle(tx_frame)
+            t = max(ready + self.latency, self._line_free)
+            for rx_byte in rx_bytes:
+                t += self._byte_time()
+                self._rx_queue.append((t, rx_byte))
+            self._line_free = t
+        #
+        return len(data)
+    #
+
+    def _available(self, now):
+        n = 0
+        for t, _ in self._rx_queue:
+            if t > now:
+                break
+            n += 1
+        return n
+    #
+
+    @property
+    def in_waiting(self):
+        return self._available(time.monotonic())
+    #
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise IOError(f'FakeSerial: port {self.port} is not open')
+        #
+        deadline = None if (self.timeout is None) else (time.monotonic() + self.timeout)
+        while True:
+            now = time.monotonic()
+            n = min(self._available(now), size)
+            if (n == size) or ((deadline is not None) and (now >= deadline)):
+                break
+            #
+            if len(self._rx_queue) > n:
+                wake = self._rx_queue[min(size, len(self._rx_queue)) - 1][0]
+            else:
+                wake = now + 0.001 if (deadline is None) else deadline
+            if deadline is not None:
+                wake = min(wake, deadline)
+            time.sleep(max(0., wake - now))
+        #
+        rx_bytes = bytes(el[1] for el in self._rx_queue[:n])
+        del self._rx_queue[:n]
+        return rx_bytes
+    #
+
+    def reset_input_buffer(self):
+        now = time.monotonic()
+        self._rx_queue = [el for el in self._rx_queue if el[0] > now]
+    #
+
+    def reset_output_buffer(self):
+        self._tx_buffer.clear()
+    #
+#
+
+
+class PtySimulator:
+    """
+    Serve a SimulatedBox on a pseudo-terminal pair (POSIX only), so that it can be opened as a
+    serial port by any program (e.g. the scripts). `port` is the name of the device to open.
+    """
+
+    def __init__(self, box=None, latency=0.005):
+        import pty
+        import tty
+
+        self.box = SimulatedBox() if (box is None) else box
+        self.latency = latency
+
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = False
+        self._thread = None
+    #
+
+    def _serve(self):
+        tx_buffer = b''
+        while self._running:
+            try:
+                data = os.read(self._master, 256)
+            except OSError:
+                break
+            #
+            tx_buffer += data
+            while len(tx_buffer) >= 7:
+                tx_frame, tx_buffer = tx_buffer[:7], tx_buffer[7:]
+                rx_bytes = self.box.handle(tx_frame)
+                time.sleep(self.latency)
+                if rx_bytes:
+                    os.write(self._master, rx_bytes)
+            #
+        #
+    #
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name=f'SIS-sim-{self.port}', daemon=True)
+        self._thread.start()
+        return self
+    #
+
+    def stop(self):
+        self._running = False
+        os.close(self._master)
+        os.close(self._slave)
+    #
+
+    def __enter__(self):
+        return self.start()
+    #
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+    #
+#
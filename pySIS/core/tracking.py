@@ -0,0 +1,307 @@
+import sys
+import time
+
+from .libSIS import read_position, read_status, goto_position
+
+
+class TrackSample:
+    """
+    Position of one unit at a given time, as yielded by "track".
+
+    `time` is the unix time of the position request, `motor` is the motor state from the
+    status request of the same poll (None if the status could not be read).
+    """
+    __slots__ = ('time', 'unit', 'inc_pos', 'abs_pos', 'raw_msb', 'raw_lsb', 'motor')
+
+    def __init__(self, time, unit, inc_pos, abs_pos, raw_msb, raw_lsb, motor):
+        self.time = time
+        self.unit = unit
+        self.inc_pos = inc_pos
+        self.abs_pos = abs_pos
+        self.raw_msb = raw_msb
+        self.raw_lsb = raw_lsb
+        self.motor = motor
+    #
+
+    def __repr__(self):
+        return (f'TrackSample(time={self.time}, unit={self.unit}, inc_pos={self.inc_pos}, abs_pos={self.abs_pos}, '
+                f'raw_msb={self.raw_msb}, raw_lsb={self.raw_lsb}, motor={self.motor})')
+    #
+#
+
+
+class AdaptivePollRate:
+    """
+    Poll rate of the tracking loops adapted to the motion of the units.
+
+    The speed of each unit is estimated from consecutive incremental positions, and the
+    interval to the next poll is chosen as:
+      - the shortest one (`max_hz`) while a unit starts or stops (speed below `still_speed`
+        mm/s, or changing by more than `accel_frac` of its value between two polls), and
+        when a unit is closer than `near_mm` to its target;
+      - otherwise the time needed to travel `step_mm`, shortened so that at least
+        `samples_to_target` polls are left before the target is reached;
+    always within the `min_hz`-`max_hz` range. With several units the shortest interval of
+    the units still in motion wins: the units whose motor is idle, or that are at their
+    target, do not count (when no unit is in motion the interval is the shortest one).
+
+    `targets` is the dict {unit: position} of the targets of the movement, if known.
+    Pass an instance as `rate_hz` of "track" or "move_units".
+    """
+
+    def __init__(self, min_hz=1., max_hz=50., targets=None, step_mm=10., near_mm=20., samples_to_target=10, still_speed=1., accel_frac=0.2):
+        self.min_interval = 1./max_hz
+        self.max_interval = 1./min_hz
+        self.targets = {} if (targets is None) else dict(targets)
+        self.step_mm = step_mm
+        self.near_mm = near_mm
+        self.samples_to_target = samples_to_target
+        self.still_speed = still_speed
+        self.accel_frac = accel_frac
+
+        self._last = {} #unit -> (time, position, speed)
+    #
+
+    def reset(self):
+        self._last.clear()
+    #
+
+    def _unit_interval(self, unit, unixtime, pos):
+        last = self._last.get(unit)
+        speed = None
+        if (last is not None) and (unixtime > last[0]):
+            speed = (pos - last[1]) / (unixtime - last[0])
+        prev_speed = None if (last is None) else last[2]
+        self._last[unit] = (unixtime, pos, speed)
+
+        if (speed is None) or (prev_speed is None):
+            return self.min_interval
+        #
+        abs_speed = abs(speed)
+        if (abs_speed < self.still_speed) or (abs(prev_speed) < self.still_speed):
+            return self.min_interval
+        if abs(speed - prev_speed) > self.accel_frac * abs(prev_speed):
+            return self.min_interval
+        #
+
+        interval = self.step_mm / abs_speed
+        target = self.targets.get(unit)
+        if target is not None:
+            distance = abs(target - pos)
+            if distance < self.near_mm:
+                return self.min_interval
+            interval = min(interval, distance / abs_speed / self.samples_to_target)
+        #
+        return interval
+    #
+
+    def _in_motion(self, unit, frame, status):
+        if (status is not None) and (status.motor[unit] == 0):
+            return False
+        return frame.inc_pos[unit] != self.targets.get(unit)
+    #
+
+    def interval(self, unixtime, frame, units, status=None):
+        """
+        Interval (in seconds) to the next poll, given the PositionFrame read at `unixtime` and
+        the StatusFrame of the same poll (None if it could not be read).
+        """
+        intervals = []
+        for unit in units:
+            if self._in_motion(unit, frame, status):
+                intervals.append(self._unit_interval(unit, unixtime, frame.inc_pos[unit]))
+            else:
+                #The speed is estimated again from scratch if the unit starts again
+                self._last.pop(unit, None)
+        #
+        interval = min(intervals, default=self.min_interval)
+        return min(max(interval, self.min_interval), self.max_interval)
+    #
+#
+
+
+def track(ser, units=None, rate_hz=10, timeout=None, targets=None, start_grace=1.):
+    """
+    Generator tracking the units of a SIS box while they move.
+
+    Every poll reads the positions and the status of the box (one "get_position" and one
+    "get_status" request) and yields a TrackSample for each unit in `units` (default: all
+    the three units). The polls are paced at `rate_hz`, or as fast as the line allows.
+    `rate_hz` can also be an AdaptivePollRate, to adapt the polling to the motion.
+
+    The generator stops when the motors of all the tracked units are idle and, for the
+    units in the `targets` dict ({unit: position}), the incremental position has reached
+    the target. It also stops after `timeout` seconds, if given.
+    For the first `start_grace` seconds an idle motor does not end the tracking, unless the
+    motor has already been seen running or the unit is at its target: it leaves the motors
+    the time to start.
+    """
+    if units is None:
+        units = (0, 1, 2)
+    if targets is None:
+        targets = {}
+    #
+
+    adaptive = isinstance(rate_hz, AdaptivePollRate)
+    if adaptive:
+        rate_hz.reset()
+        period = rate_hz.min_interval
+    else:
+        period = 1./rate_hz
+    #
+    start = time.monotonic()
+    deadline = None if (timeout is None) else (start + timeout)
+    next_poll = start
+    started = set() #units whose motor has been seen running
+
+    while True:
+        if (deadline is not None) and (time.monotonic() > deadline):
+            print(f'WARNING --> track: maximum tracking time of {timeout} s expired before the end of the movement.', file=sys.stderr)
+            return
+        #
+
+        unixtime = time.time()
+        frame = read_position(ser)
+        status = read_status(ser)
+
+        if frame is not None:
+            for unit in units:
+                yield TrackSample(unixtime,
+                                  unit,
+                                  frame.inc_pos[unit],
+                                  frame.abs_pos[unit],
+                                  frame.raw_msb[unit],
+                                  frame.raw_lsb[unit],
+                                  None if (status is None) else status.motor[unit])
+            #
+            if status is not None:
+                started.update(unit for unit in units if status.motor[unit] != 0)
+                in_grace = ((time.monotonic() - start < start_grace)
+                            and not all((unit in started) or (frame.inc_pos[unit] == targets.get(unit)) for unit in units))
+                if (not in_grace) and all((status.motor[unit] == 0) and (frame.inc_pos[unit] == targets.get(unit, frame.inc_pos[unit])) for unit in units):
+                    return
+            #
+            if adaptive:
+                period = rate_hz.interval(unixtime, frame, units, status)
+        #
+
+        next_poll += period
+        sleep_time = next_poll - time.monotonic()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        else:
+            #Late: do not try to catch up with a burst of polls
+            next_poll = time.monotonic()
+    #
+
+
+def move_units(ser, targets, rate_hz=10, timeout=None, start_delay=0.05, check_targets=False, start_grace=1.):
+    """
+    Move several units of the same box at once and track them together.
+
+    `targets` is a dict {unit: position}. The "goto_position" requests are sent back to back,
+    then all the units that accepted the request are tracked from the same position/status
+    polls (see "track"), until every one of them reports the motor idle (and, with
+    `check_targets=True`, is at its target position). `start_delay` leaves the motors the
+    time to start before the first status poll, and `start_grace` is passed to "track". If
+    `rate_hz` is an AdaptivePollRate without targets, it gets the ones of the movement.
+
+    This is a generator yielding the TrackSamples of the moving units. The units whose
+    request failed are reported on stderr and not tracked.
+    """
+    moving = []
+    for unit, pos in targets.items():
+        tx_array, rx_array = goto_position(ser, unit, pos)
+        if rx_array is None:
+            print(f'ERROR --> move_units: the request to move unit {unit} to position {pos} failed.', file=sys.stderr)
+            continue
+        #
+        moving.append(unit)
+    #
+    if not moving:
+        return
+    #
+    time.sleep(start_delay)
+
+    if isinstance(rate_hz, AdaptivePollRate) and not rate_hz.targets:
+        rate_hz.targets = dict(targets)
+    #
+    yield from track(ser,
+                     units=moving,
+                     rate_hz=rate_hz,
+                     timeout=timeout,
+                     targets={unit: targets[unit] for unit in moving} if check_targets else None,
+                     start_grace=start_grace)
+
+
+def wait_settled(ser, units=None, tolerance=1, dwell=2., min_dwell=0., rate_hz=10, timeout=None):
+    """
+    Generator polling the units until their position has settled.
+
+    A unit is settled when its motor is idle and both its incremental and absolute positions
+    have stayed within a band of `tolerance` mm for the last `dwell` seconds. The generator
+    stops when all the `units` (default: all the three units) are settled, but not before
+    `min_dwell` seconds from the start (for when the mechanics needs a fixed rest anyway).
+    It also stops after `timeout` seconds, if given, with a warning.
+
+    It yields the TrackSamples of the polls, like "track".
+    """
+    if units is None:
+        units = (0, 1, 2)
+    #
+    period = 1./rate_hz
+    start = time.monotonic()
+    deadline = None if (timeout is None) else (start + timeout)
+    streaks = {} #unit -> (start of the stable streak, [inc min, inc max], [abs min, abs max])
+    next_poll = start
+
+    while True:
+        now = time.monotonic()
+        if (deadline is not None) and (now > deadline):
+            print(f'WARNING --> wait_settled: the units did not settle within {timeout} s.', file=sys.stderr)
+            return
+        #
+
+        unixtime = time.time()
+        frame = read_position(ser)
+        status = read_status(ser)
+
+        if frame is not None:
+            settled = (status is not None)
+            for unit in units:
+                sample = TrackSample(unixtime,
+                                     unit,
+                                     frame.inc_pos[unit],
+                                     frame.abs_pos[unit],
+                                     frame.raw_msb[unit],
+                                     frame.raw_lsb[unit],
+                                     None if (status is None) else status.motor[unit])
+                yield sample
+
+                streak = streaks.get(unit)
+                if streak is not None:
+                    inc_band = [min(streak[1][0], sample.inc_pos), max(streak[1][1], sample.inc_pos)]
+                    abs_band = [min(streak[2][0], sample.abs_pos), max(streak[2][1], sample.abs_pos)]
+                    if (sample.motor != 0) or (inc_band[1] - inc_band[0] > tolerance) or (abs_band[1] - abs_band[0] > tolerance):
+                        streak = None
+                    else:
+                        streak = (streak[0], inc_band, abs_band)
+                #
+                if streak is None:
+                    streak = (now, [sample.inc_pos]*2, [sample.abs_pos]*2)
+                streaks[unit] = streak
+
+                settled = settled and (sample.motor == 0) and (now - streak[0] >= dwell)
+            #
+            if settled and (now - start >= min_dwell):
+                return
+            #
+        #
+
+        next_poll += period
+        sleep_time = next_poll - time.monotonic()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        else:
+            next_poll = time.monotonic()
+    #
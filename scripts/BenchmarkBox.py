@@ -0,0 +1,58 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pySIS.core import SISConnection
+from pySIS.core.benchmark import run_benchmarks, write_results
+
+
+#These below are default values that can be overwritten by the user at the command line
+NREP = 200 #Repetitions of each command for the latency measurement
+POLL_DURATION = 5. #Duration of the poll rate measurement (in seconds)
+
+#The config write benchmark rewrites the memory of the box with its own content
+CONFIG_WRITE = False
+
+#Use this port name to run the benchmarks against the in-process simulator of the box
+SIM_PORT = 'sim'
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 3:
+        print(f'Too few arguments for the {sys.argv[0]} script!', file=sys.stderr)
+        print(f'Synopsys: python {sys.argv[0]} <serport|{SIM_PORT}> <outfile.json> [nrep] [write]\n', file=sys.stderr)
+        sys.exit(1)
+    #
+
+    PORT = sys.argv[1]
+    OUTFILE = sys.argv[2]
+    if len(sys.argv) > 3:
+        NREP = int(sys.argv[3])
+    if len(sys.argv) > 4:
+        CONFIG_WRITE = (sys.argv[4] == 'write')
+    #
+
+    if PORT == SIM_PORT:
+        from pySIS.core.simulator import FakeSerial
+        PORT = FakeSerial()
+    #
+
+    with SISConnection(PORT, baudrate=9600) as ser:
+        results = run_benchmarks(ser, n=NREP, poll_duration=POLL_DURATION, config_write=CONFIG_WRITE)
+    #
+    write_results(results, OUTFILE)
+
+    print(f'\n\nBenchmark of the SIS box on port <{results["port"]}>:')
+    for name, summary in (results['latency'] or {}).items():
+        if summary['count']:
+            print(f'    {name}: p50 {summary["p50_ms"]:.1f} ms; p90 {summary["p90_ms"]:.1f} ms; p99 {summary["p99_ms"]:.1f} ms; failures {summary["failures"]}')
+        else:
+            print(f'    {name}: all the {summary["failures"]} commands failed')
+    #
+    print(f'    poll rate: {results["poll"]["rate_hz"]:.1f} Hz ({results["poll"]["failures"]} failed polls)')
+    for key, val in results.get('config', {}).items():
+        print(f'    config {key}: {val}')
+    #
+    print(f'Results written in {OUTFILE}\n')
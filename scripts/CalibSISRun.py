@@ -3,9 +3,7 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from pySIS.core import goto_position, get_position, get_status
-from serial import Serial
-import time
+from pySIS.core import read_position, RunLogWriter, open_session, CalibPlan, ScanSegment, run_plan, CommandScheduler
 from datetime import datetime
 from os import path
 
@@ -15,18 +13,51 @@ PORT = None
 UNIT = 0
 POS = 0 #In mm
 FNAME = None #The file where the data is dumped
+LOGFILE = None #The run log writer
 
 DEBUG = False #Hardcoded switch to be changed manually
 
 MAXPOS = 8890 #Maximum possible extension (in mm) due to "non SIS" limitations (e.g. the calibration tubes)
 
-#position/status check every delta_t seconds
+#position/status check every delta_t seconds near the target and when the motion starts or stops,
+#and up to every max_delta_t seconds during the long travels
 DELTA_T = 0.02
+MAX_DELTA_T = 0.5
 
 
-#These are only used to come upwards
+#Size of the steps of the downward and of the upward runs
 STEP_SIZE = 50 #In mm
-STEP_SLEEP = 10 #In seconds
+
+#Before every step the unit must rest within SETTLE_TOL mm for SETTLE_DWELL seconds,
+#and in any case for at least MIN_DWELL seconds (it gives up after SETTLE_TIMEOUT seconds)
+SETTLE_TOL = 1 #In mm
+SETTLE_DWELL = 2 #In seconds
+MIN_DWELL = 0 #In seconds
+SETTLE_TIMEOUT = 30 #In seconds
+
+
+def log_sample(sample, direction):
+    """
+    Print and log a sample of the run, unless its positions are out of range.
+    `direction` is 0 for the downward run and 1 for the upward run.
+    """
+    abs_pos_err = False
+    inc_pos_err = False
+    if not (-25 <= sample.abs_pos <= 10500):
+        abs_pos_err = True
+        print(f'WARNING --> Absolute position out of range ({sample.abs_pos})!')
+    if not (-25 <= sample.inc_pos <= 10500):
+        inc_pos_err = True
+        print(f'WARNING --> Incremental position out of range ({sample.inc_pos})!')
+    #
+
+    if not (abs_pos_err or inc_pos_err): 
+        print(f'Pos inc: {sample.inc_pos}; Pos abs: {sample.abs_pos}; Abs raw pos: {int(sample.raw_msb)} {int(sample.raw_lsb)}; {"Upward" if direction else "Downward"}')
+        if LOGFILE is not None:
+            LOGFILE.write_sample(sample, direction)
+            #
+        #
+    #
 
 
 if __name__ == '__main__':
@@ -53,285 +84,61 @@ if __name__ == '__main__':
     name = '_'.join([name,timestamp.strftime("%Y%m%d-%H%M%S")])
     FNAME = name + ext
     
-    #Create the empty file or delete its content
-    with open(FNAME, 'w') as _f:
-        pass
+    #Create the empty file or delete its content (binary run log if the extension is ".bin")
+    LOGFILE = RunLogWriter(FNAME)
     
-    ser = Serial(PORT, baudrate=9600, timeout=0.5)
-
+    ser = CommandScheduler(open_session(PORT, baudrate=9600, timeout=0.5))
 
-    ################
-    # Downward run #
-    ################
-
-    print('\n\n')
-    print(f'Moving unit {UNIT} to position {POS} mm.')
-    
-    #Get the position at the start
-    try:
-        unixitme = time.time()
-        tx_arr, rx_arr = get_position(ser)
-        abs_pos_lsb = rx_arr[1 + 4 * UNIT]
-        abs_pos_msb = rx_arr[2 + 4 * UNIT]
-        inc_pos_lsb = rx_arr[3 + 4 * UNIT]
-        inc_pos_msb = rx_arr[4 + 4 * UNIT]
-        abs_raw_lsb = rx_arr[13 + 2 * UNIT]
-        abs_raw_msb = rx_arr[14 + 2 * UNIT]
-        rx_pos_abs = 256 * abs_pos_msb + abs_pos_lsb
-        rx_pos_inc = 256 * inc_pos_msb + inc_pos_lsb
-        rx_position = rx_pos_inc
-        
-    except (IndexError):
-        pass
-    except Exception as err:
-        print(f'ERROR --> After the "get_position" request. Exception message: {err}', file=sys.stderr)
-    #
-
-    abs_pos_err = False
-    inc_pos_err = False
-    if not (-25 <= rx_pos_abs <= 10500):
-        abs_pos_err = True
-        print(f'WARNING --> Absolute position out of range ({rx_pos_abs})! The position at the start of the run will not be recorded.')
-    if not -25 <= rx_pos_inc <= 10500:
-        inc_pos_err = True
-        print(f'WARNING --> Incremental position out of range ({rx_pos_inc})! The position at the start of the run will not be recorded.')
-    #
-    if not (abs_pos_err or inc_pos_err): 
-        print(f'Pos inc: {rx_pos_inc}; Pos abs: {rx_pos_abs}; Abs raw pos: {int(abs_raw_msb)} {int(abs_raw_lsb)}; Downward')
-        if FNAME is not None:
-            with open(FNAME, 'a') as logfile:
-                logfile.write(f'{unixitme}~{rx_pos_inc}~{rx_pos_abs}~{int(abs_raw_msb)}~{int(abs_raw_lsb)}~0\n')
-            #
-        #
+    frame = read_position(ser)
+    if frame is None:
+        print('ERROR --> Cannot read the position at the start of the run! Aborting the script.', file=sys.stderr)
+        sys.exit(1)
     #
-
-    if rx_pos_inc >= POS:
-        print(f'ERROR --> for this script the target position must be larger than current position ({rx_pos_inc})! Aborting the script.', file=sys.stderr)
+    if frame.inc_pos[UNIT] >= POS:
+        print(f'ERROR --> for this script the target position must be larger than current position ({frame.inc_pos[UNIT]})! Aborting the script.', file=sys.stderr)
         sys.exit(1)
     #
 
-    #Start the downward movements in steps
-    while rx_pos_inc<POS:
-        time.sleep(STEP_SLEEP)
-
-        new_pos = rx_pos_inc+STEP_SIZE
-        if new_pos > POS:
-            new_pos = POS
-        #
-    
-        tx_arr, rx_arr = goto_position(ser, UNIT, new_pos)
-
-        print() #Leave an empty line
-        print(f"Position request {new_pos} transmitted.")
-        #file.write(current_time + ': Requested positions have been transmitted.\n')
-        time.sleep(0.05)
-
-        #Loop to track the position of the source while moving
-        while True:
-
-            try:
-                unixitme = time.time()
-                tx_arr, rx_arr = get_position(ser)
-                abs_pos_lsb = rx_arr[1 + 4 * UNIT]
-                abs_pos_msb = rx_arr[2 + 4 * UNIT]
-                inc_pos_lsb = rx_arr[3 + 4 * UNIT]
-                inc_pos_msb = rx_arr[4 + 4 * UNIT]
-                abs_raw_lsb = rx_arr[13 + 2 * UNIT]
-                abs_raw_msb = rx_arr[14 + 2 * UNIT]
-                rx_pos_abs = 256 * abs_pos_msb + abs_pos_lsb
-                rx_pos_inc = 256 * inc_pos_msb + inc_pos_lsb
-                rx_position = rx_pos_inc
-
-            except (IndexError):
-                continue
-            except Exception as err:
-                print(f'ERROR --> After the "get_position" request. Exception message: {err}', file=sys.stderr)
-
-            abs_pos_err = False
-            inc_pos_err = False
-            if not (-25 <= rx_pos_abs <= 10500):
-                abs_pos_err = True
-                print(f'WARNING --> Absolute position out of range ({rx_pos_abs})!')
-            if not (-25 <= rx_pos_inc <= 10500):
-                inc_pos_err = True
-                print(f'WARNING --> Incremental position out of range ({rx_pos_inc})!')
-            #
-
-            if not (abs_pos_err or inc_pos_err): 
-                print(f'Pos inc: {rx_pos_inc}; Pos abs: {rx_pos_abs}; Abs raw pos: {int(abs_raw_msb)} {int(abs_raw_lsb)}; Downward')
-                if FNAME is not None:
-                    with open(FNAME, 'a') as logfile:
-                        logfile.write(f'{unixitme}~{rx_pos_inc}~{rx_pos_abs}~{int(abs_raw_msb)}~{int(abs_raw_lsb)}~0\n')
-                    #
-                #
-            #
-
-            time.sleep(DELTA_T)
-
-            try:
-                tx_arr, rx_arr = get_status(ser)
-                rx_motor = rx_arr[8+UNIT] & 3
-            except (IndexError):
-                continue
-            except Exception as err:
-                print(f'ERROR --> After the "get_status" request. Exception message: {err}', file=sys.stderr)
-            #
-
-            if (rx_motor==0) and (int(rx_pos_inc)==new_pos):
-                print(f"Downward step of unit {UNIT} completed.")
-                break
-            #
-        # Close of the while loop
-    #Close the position of the steps
-    
-    print('Downward calibration run completed.')
+    #Downward run to POS and upward run back to 0, in steps
+    segment_pars = dict(step=STEP_SIZE,
+                        dwell=SETTLE_DWELL,
+                        min_dwell=MIN_DWELL,
+                        tolerance=SETTLE_TOL,
+                        rate_hz=1./DELTA_T,
+                        min_rate_hz=1./MAX_DELTA_T)
+    plan = CalibPlan([UNIT],
+                     [ScanSegment(POS, **segment_pars), ScanSegment(0, **segment_pars)],
+                     max_pos=MAXPOS,
+                     settle_timeout=SETTLE_TIMEOUT)
 
+    print('\n\n')
+    print(f'Moving unit {UNIT} to position {POS} mm and back, in steps of {STEP_SIZE} mm (estimated duration {plan.estimate(frame.inc_pos[UNIT])/60.:.0f} min).')
 
-    ##############
-    # Upward run #
-    ##############
-    print('\n\nChecking position at the start of the upward run:')
-    
+    #Ctrl+C stops the unit: the stop is sent as soon as the command on the wire is done,
+    #ahead of the queued polls
+    interrupted = False
     try:
-        tx_arr, rx_arr = get_position(ser)
-        abs_pos_lsb = rx_arr[1 + 4 * UNIT]
-        abs_pos_msb = rx_arr[2 + 4 * UNIT]
-        inc_pos_lsb = rx_arr[3 + 4 * UNIT]
-        inc_pos_msb = rx_arr[4 + 4 * UNIT]
-        abs_raw_lsb = rx_arr[13 + 2 * UNIT]
-        abs_raw_msb = rx_arr[14 + 2 * UNIT]
-        rx_pos_abs = 256 * abs_pos_msb + abs_pos_lsb
-        rx_pos_inc = 256 * inc_pos_msb + inc_pos_lsb
-        rx_position = rx_pos_inc
-    
-    except (IndexError):
-        pass
-    except Exception as err:
-        print(f'ERROR --> After the "get_position" request. Exception message: {err}', file=sys.stderr)
-    #
-    
-    abs_pos_err = False
-    inc_pos_err = False
-    if not (-25 <= rx_pos_abs <= 10500):
-        abs_pos_err = True
-        print(f'WARNING --> Absolute position out of range ({rx_pos_abs})! The position at the start of the run will not be recorded.')
-    if not -25 <= rx_pos_inc <= 10500:
-        inc_pos_err = True
-        print(f'WARNING --> Incremental position out of range ({rx_pos_inc})! The position at the start of the run will not be recorded.')
-    #
-    if not (abs_pos_err or inc_pos_err): 
-        print(f'Pos inc: {rx_pos_inc}; Pos abs: {rx_pos_abs}; Abs raw pos: {int(abs_raw_msb)} {int(abs_raw_lsb)}; Upward')
-        if FNAME is not None:
-            with open(FNAME, 'a') as logfile:
-                logfile.write(f'{unixitme}~{rx_pos_inc}~{rx_pos_abs}~{int(abs_raw_msb)}~{int(abs_raw_lsb)}~1\n')
+        segment = 0
+        for iSeg, direction, sample in run_plan(ser, plan):
+            if iSeg != segment:
+                print('Downward calibration run completed.')
+                print('\n\nStarting the upward run:')
+                segment = iSeg
             #
+            log_sample(sample, direction)
         #
-    #
-
-    
-    while rx_pos_inc>0:
-        time.sleep(STEP_SLEEP)
-
-        new_pos = rx_pos_inc-STEP_SIZE
-        if new_pos < 0:
-            new_pos = 0
-        #
-
-        tx_arr, rx_arr = goto_position(ser, UNIT, new_pos)
-
-        print() #Leave an empty line
-        print(f"Position request {new_pos} transmitted.")
-
-        while True:
-            try:
-                unixitme = time.time()
-                tx_arr, rx_arr = get_position(ser)
-                abs_pos_lsb = rx_arr[1 + 4 * UNIT]
-                abs_pos_msb = rx_arr[2 + 4 * UNIT]
-                inc_pos_lsb = rx_arr[3 + 4 * UNIT]
-                inc_pos_msb = rx_arr[4 + 4 * UNIT]
-                abs_raw_lsb = rx_arr[13 + 2 * UNIT]
-                abs_raw_msb = rx_arr[14 + 2 * UNIT]
-                rx_pos_abs = 256 * abs_pos_msb + abs_pos_lsb
-                rx_pos_inc = 256 * inc_pos_msb + inc_pos_lsb
-                rx_position = rx_pos_inc
-        
-            except (IndexError):
-                continue
-            except Exception as err:
-                print(f'ERROR --> After the "get_position" request. Exception message: {err}', file=sys.stderr)
-
-            abs_pos_err = False
-            inc_pos_err = False
-            if not (-25 <= rx_pos_abs <= 10500):
-                abs_pos_err = True
-                print(f'WARNING --> Absolute position out of range ({rx_pos_abs})!')
-            if not -25 <= rx_pos_inc <= 10500:
-                inc_pos_err = True
-                print(f'WARNING --> Incremental position out of range ({rx_pos_inc})!')
-            #
-
-            if not (abs_pos_err or inc_pos_err): 
-                print(f'Pos inc: {rx_pos_inc}; Pos abs: {rx_pos_abs}; Abs raw pos: {int(abs_raw_msb)} {int(abs_raw_lsb)}; Upward')
-                if FNAME is not None:
-                    with open(FNAME, 'a') as logfile:
-                        logfile.write(f'{unixitme}~{rx_pos_inc}~{rx_pos_abs}~{int(abs_raw_msb)}~{int(abs_raw_lsb)}~1\n')
-
-            time.sleep(DELTA_T)
-
-            try:
-                tx_arr, rx_arr = get_status(ser)
-                rx_motor = rx_arr[8+UNIT] & 3
-            except (IndexError):
-                continue
-            except Exception as err:
-                print(f'ERROR --> After the "get_status" request. Exception message: {err}', file=sys.stderr)
-            #
-
-            if (rx_motor==0) and (int(rx_pos_inc)==new_pos):
-                print(f"Upward step of unit {UNIT} completed.")
-                break
-            #
-        # Close inner while loop
-    #Close the outer while loop (the steps)
-
-    print('Upward calibration run completed.')
-
-    print('\n\nChecking position after upward run:')
-    
-    try:
-        tx_arr, rx_arr = get_position(ser)
-        abs_pos_lsb = rx_arr[1 + 4 * UNIT]
-        abs_pos_msb = rx_arr[2 + 4 * UNIT]
-        inc_pos_lsb = rx_arr[3 + 4 * UNIT]
-        inc_pos_msb = rx_arr[4 + 4 * UNIT]
-        abs_raw_lsb = rx_arr[13 + 2 * UNIT]
-        abs_raw_msb = rx_arr[14 + 2 * UNIT]
-        rx_pos_abs = 256 * abs_pos_msb + abs_pos_lsb
-        rx_pos_inc = 256 * inc_pos_msb + inc_pos_lsb
-        rx_position = rx_pos_inc
-    
-    except (IndexError):
-        pass
-    except Exception as err:
-        print(f'ERROR --> After the "get_position" request. Exception message: {err}', file=sys.stderr)
-    #
-
-    abs_pos_err = False
-    inc_pos_err = False
-    if not (-25 <= rx_pos_abs <= 10500):
-        abs_pos_err = True
-        print(f'WARNING --> Absolute position out of range ({rx_pos_abs})! The position at the start of the run will not be recorded.')
-    if not -25 <= rx_pos_inc <= 10500:
-        inc_pos_err = True
-        print(f'WARNING --> Incremental position out of range ({rx_pos_inc})! The position at the start of the run will not be recorded.')
-    #
-    if not (abs_pos_err or inc_pos_err): 
-        print(f'Pos inc: {rx_pos_inc}; Pos abs: {rx_pos_abs}; Abs raw pos: {int(abs_raw_msb)} {int(abs_raw_lsb)}; Upward')
-        if FNAME is not None:
-            with open(FNAME, 'a') as logfile:
-                logfile.write(f'{unixitme}~{rx_pos_inc}~{rx_pos_abs}~{int(abs_raw_msb)}~{int(abs_raw_lsb)}~1\n')
-            #
+    except KeyboardInterrupt:
+        interrupted = True
+        print(f'\nInterrupted by the user: stopping unit {UNIT}.')
+        for unit, (tx_arr, rx_arr) in ser.stop_units([UNIT]).items():
+            if rx_arr is None:
+                print(f'ERROR --> The stop request for unit {unit} failed!', file=sys.stderr)
         #
     #
+    if interrupted:
+        print('Calibration run interrupted.')
+    else:
+        print('Upward calibration run completed.')
 
+    LOGFILE.close()
+    ser.close()
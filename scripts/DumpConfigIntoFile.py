@@ -3,8 +3,7 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from pySIS.core import BoxConfig
-from serial import Serial
+from pySIS.core import BoxConfig, open_session
 import time
 import traceback
 
@@ -13,14 +12,14 @@ if __name__ == '__main__':
     
     if len(sys.argv) != 3:
         print(f"Error: wrong number of few arguments for {sys.argv[0]} script.", file=sys.stderr)
-        print(f"Synopsys: python {sys.argv[0]} <serport> <filename>", file=sys.stderr)
+        print(f"Synopsys: python {sys.argv[0]} <serport> <filename[.bin]>", file=sys.stderr)
         sys.exit(1)
     #
     PORT = sys.argv[1]
     FNAME = sys.argv[2]
 
     print(f'Connecting to serial port device <{PORT}>')
-    ser = Serial(PORT, baudrate=9600, timeout = 0.1)
+    ser = open_session(PORT, baudrate=9600, timeout = 0.1)
     if not ser.is_open:
         ser.open()
     #
@@ -30,7 +29,8 @@ if __name__ == '__main__':
         boxConfig = BoxConfig()
         boxConfig.read_data_from_memory(ser=ser)
 
-        boxConfig.write_data_to_file(FNAME)
+        #A '.bin' file is written in the binary format, labelled with the port
+        boxConfig.write_data_to_file(FNAME, label=PORT)
     except Exception as err:
         print(f'Error while trying to dump the SIS box memory. Exception message: {err}')
         traceback.print_exc()
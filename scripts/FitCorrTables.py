@@ -0,0 +1,55 @@
+import sys
+import os
+import glob
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pySIS.core import BoxConfig
+from pySIS.core.corrfit import fit_box_config, SLOTS_RAW
+
+
+#These below are default values that can be changed here
+SLOTS = SLOTS_RAW #Mapping of the samples onto the 64 slots of the correction tables (see corrfit.slot_index)
+LSB_MM = 1. #Size (in mm) of one unit of the corrections
+STAT = 'mean' #'mean' or 'median' of the residuals in each slot
+
+BASE_FNAME = None #Config file with the other members of the config (defaults if None)
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 3:
+        print(f'Too few arguments for the {sys.argv[0]} script!', file=sys.stderr)
+        print(f'Synopsys: python {sys.argv[0]} <outconfigfile> <unit>:<runlog|glob> [<unit>:<runlog|glob> ...]\n', file=sys.stderr)
+        sys.exit(1)
+    #
+
+    OUTFILE = sys.argv[1]
+
+    LOGS = {}
+    for arg in sys.argv[2:]:
+        try:
+            unit, fnames = arg.split(':', 1)
+            LOGS.setdefault(int(unit), []).append(fnames)
+        except ValueError:
+            print(f'ERROR --> Wrong format of the argument "{arg}". Expected <unit>:<runlog|glob>', file=sys.stderr)
+            sys.exit(1)
+        #
+    #
+
+    baseConfig = None
+    if BASE_FNAME is not None:
+        baseConfig = BoxConfig()
+        baseConfig.read_data_from_file(BASE_FNAME)
+    #
+
+    #Expand the glob patterns of each unit into a single list of files
+    LOGS = {unit: sorted(fname for el in fnames for fname in (glob.glob(el) or [el])) for unit, fnames in LOGS.items()}
+
+    boxConfig = fit_box_config(LOGS, base_config=baseConfig, slots=SLOTS, lsb_mm=LSB_MM, stat=STAT)
+    for unit in sorted(LOGS):
+        print(f'Unit {unit} correction table: {boxConfig.AbsEncCorrData[unit]}')
+    #
+
+    boxConfig.write_data_to_file(OUTFILE)
+    print(f'\nConfiguration written in {OUTFILE}. Upload it with LoadConfigFromFile.py\n')
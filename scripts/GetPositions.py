@@ -3,8 +3,7 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from pySIS.core import get_position
-from serial import Serial
+from pySIS.core import read_position, open_session
 import time
 import datetime
 
@@ -20,24 +19,19 @@ if __name__ == '__main__':
     
     UNIT = int(sys.argv[2])
 
-    ser = Serial(PORT, baudrate=9600, timeout = 0.5)
+    ser = open_session(PORT, baudrate=9600, timeout = 0.5)
     
     #start_time = time.perf_counter()
-    tx_arr, rx_arr = get_position(ser)
+    frame = read_position(ser)
     #end_time = time.perf_counter()
 
     try:
-        abs_pos_lsb = rx_arr[1 + 4 * UNIT]
-        abs_pos_msb = rx_arr[2 + 4 * UNIT]
-        inc_pos_lsb = rx_arr[3 + 4 * UNIT]
-        inc_pos_msb = rx_arr[4 + 4 * UNIT]
-        abs_raw_lsb = rx_arr[13 + 2 * UNIT]
-        abs_raw_msb = rx_arr[14 + 2 * UNIT]
-        rx_pos_abs = 256 * abs_pos_msb + abs_pos_lsb
-        rx_pos_inc = 256 * inc_pos_msb + inc_pos_lsb
-        rx_position = rx_pos_inc
+        rx_pos_abs = frame.abs_pos[UNIT]
+        rx_pos_inc = frame.inc_pos[UNIT]
+        abs_raw_msb = frame.raw_msb[UNIT]
+        abs_raw_lsb = frame.raw_lsb[UNIT]
     
-    except (IndexError):
+    except (AttributeError):
         pass
     except Exception as err:
         pass
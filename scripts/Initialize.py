@@ -3,8 +3,7 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from pySIS.core import init, get_status
-from serial import Serial
+from pySIS.core import init, read_status, open_session
 import time
 from datetime import datetime
 
@@ -22,7 +21,7 @@ if __name__ == '__main__':
     UNIT = int(sys.argv[2])
     #
     
-    ser = Serial(PORT, baudrate=9600, timeout = 0.1)
+    ser = open_session(PORT, baudrate=9600, timeout = 0.1)
     
     tx_arr, rx_arr = init(ser, UNIT)
     if rx_arr is None:
@@ -40,18 +39,14 @@ if __name__ == '__main__':
             print("Maximum waiting time has expired. Make sure that communication works properly, and check the positions.")
             break
 
-        tx_arr, rx_arr = get_status(ser=ser)
-
-        if rx_arr is None:
-            continue
-        #
-        try:
-            rx_init_bit = rx_arr[8 + (UNIT+1)] >> 2 & 1 
-            rx_init_bit_progress = rx_arr[8 + (UNIT+1)] >> 3 & 1 
-            current_time = datetime.now().strftime("%H-%M-%S")
-        except IndexError:
+        status = read_status(ser)
+        if status is None:
             continue
         #
+        rx_init_bit = status.init_done[UNIT]
+        rx_init_bit_progress = status.init_running[UNIT]
+        current_time = datetime.now().strftime("%H-%M-%S")
+        
         if (rx_init_bit_progress == 0 and rx_init_bit == 1):
             print(f'{current_time}: Unit {UNIT} at port <{PORT}> has been initialised successfully.\n') 
             break
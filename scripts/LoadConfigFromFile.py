@@ -3,8 +3,8 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from pySIS.core import BoxConfig
-from serial import Serial
+from pySIS.core import BoxConfig, open_session
+from pySIS.core.BoxConfig import memory_hash
 import time
 import traceback
 
@@ -24,20 +24,40 @@ if __name__ == '__main__':
         FNAME = sys.argv[2]
 
     print(f'Connecting to serial port device <{PORT}>')
-    ser = Serial(port=PORT, baudrate=9600, timeout = 0.1)
+    ser = open_session(PORT, baudrate=9600, timeout = 0.1)
     if not ser.is_open:
         ser.open()
     #
     print(f'Connection to <{ser.port}> established.')
     
+    EXIT_CODE = 0
     try:
         boxConfig = BoxConfig()
         if not (FNAME is None):
-            boxConfig.read_data_from_file(FNAME)
-        boxConfig.write_data_into_memory(ser)
+            if not boxConfig.read_data_from_file(FNAME):
+                print(f'ERROR --> Cannot read the config file {FNAME}. Nothing written.', file=sys.stderr)
+                sys.exit(1)
+            #
+        #
+        
+        #Read the current content of the box memory, so that only the changed chunks are written
+        boxMemory = BoxConfig()
+        boxMemory.read_data_from_memory(ser=ser)
+
+        if (boxMemory.memory_image is not None) and (memory_hash(boxMemory.memory_image) == boxConfig.content_hash()):
+            print(f'The memory of the box already matches the configuration (hash {boxConfig.content_hash()[:16]}). Nothing to write.')
+        else:
+            written, skipped, failed = boxConfig.write_data_into_memory(ser, delta=True, baseline=boxMemory.memory_image)
+            if failed:
+                print(f'ERROR --> {len(failed)} chunks of the configuration were not written into the box memory (start addresses {failed}).', file=sys.stderr)
+                EXIT_CODE = 1
+            #
 
     except Exception as err:
+        EXIT_CODE = 1
         print(f'Error trying to write the SIS memory. Exception message: {err}')
         traceback.print_exc()
     finally:
-        ser.close()
\ No newline at end of file
+        ser.close()
+    #
+    sys.exit(EXIT_CODE)
\ No newline at end of file
@@ -0,0 +1,126 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pySIS.core import read_position, move_units, AdaptivePollRate, RunLogWriter, open_session, CommandScheduler
+from pySIS.core.runlog import runlog_format
+from datetime import datetime
+from os import path
+
+
+#These below are default values that can be overwritten by the user at the command line
+PORT = None
+TARGETS = {} #Target position (in mm) of each unit to move
+FNAME = None #The file where the data is dumped
+
+MAXPOS = 8890 #Maximum possible extension (in mm) due to "non SIS" limitations (e.g. the calibration tubes)
+
+#position/status check every delta_t seconds near the targets and when the motion starts or stops,
+#and up to every max_delta_t seconds during the long travels
+DELTA_T = 0.1
+MAX_DELTA_T = 1.0
+
+#maximal waiting time 25 mins (in seconds)
+MAX_TIME = 60*25
+
+
+if __name__ == '__main__':
+
+    timestamp = datetime.now()
+
+    if len(sys.argv) < 3:
+        print(f'Too few arguments for the {sys.argv[0]} script!', file=sys.stderr)
+        print(f'Synopsys: python {sys.argv[0]} <serport> <unit>:<pos>[,<unit>:<pos>...] [logfilename]\n', file=sys.stderr)
+        sys.exit(1)
+    #
+
+    PORT = sys.argv[1]
+
+    try:
+        for target in sys.argv[2].split(','):
+            unit, pos = target.split(':')
+            TARGETS[int(unit)] = int(pos)
+    except ValueError:
+        print(f'ERROR --> Wrong format of the targets "{sys.argv[2]}". Expected <unit>:<pos>[,<unit>:<pos>...]', file=sys.stderr)
+        sys.exit(1)
+    #
+    for unit, pos in TARGETS.items():
+        if pos>MAXPOS:
+            print(f'WARNING --> Requested position {pos} for unit {unit} not allowed. Resetting to position {MAXPOS}.')
+            TARGETS[unit] = MAXPOS
+    #
+
+    #A binary run log holds all the units, the text run logs are one per unit
+    LOGFILES = {}
+    if len(sys.argv) > 3:
+        FNAME = sys.argv[3]
+        #Compose the name in order to put inside also the timestamp
+        name, ext = path.splitext(FNAME)
+        name = '_'.join([name,timestamp.strftime("%Y%m%d-%H%M%S")])
+        if runlog_format(FNAME) == 'binary':
+            logfile = RunLogWriter(name + ext)
+            LOGFILES = {unit: logfile for unit in TARGETS}
+        else:
+            LOGFILES = {unit: RunLogWriter(f'{name}_unit{unit}{ext}') for unit in TARGETS}
+    #
+
+    print('\n\n')
+    for unit, pos in TARGETS.items():
+        print(f'Moving unit {unit} to position {pos} mm.')
+    #
+
+    ser = CommandScheduler(open_session(PORT, baudrate=9600, timeout=0.5))
+
+    #Loop to track the position of the sources while moving
+    rx_motor = {}
+    #Ctrl+C stops the units: the stops are sent as soon as the command on the wire is done,
+    #ahead of the queued polls
+    interrupted = False
+    try:
+        for sample in move_units(ser, TARGETS, rate_hz=AdaptivePollRate(min_hz=1./MAX_DELTA_T, max_hz=1./DELTA_T), timeout=MAX_TIME):
+            rx_motor[sample.unit] = sample.motor
+
+            abs_pos_err = False
+            inc_pos_err = False
+            if not (-25 <= sample.abs_pos <= 10500):
+                abs_pos_err = True
+                print(f'WARNING --> Unit {sample.unit}: absolute position out of range ({sample.abs_pos})!')
+            if not -25 <= sample.inc_pos <= 10500:
+                inc_pos_err = True
+                print(f'WARNING --> Unit {sample.unit}: incremental position out of range ({sample.inc_pos})!')
+            #
+
+            if not (abs_pos_err or inc_pos_err):
+                print(f'Unit {sample.unit}: Pos inc: {sample.inc_pos}; Pos abs: {sample.abs_pos}; Abs raw pos: {int(sample.raw_msb)} {int(sample.raw_lsb)}')
+                if sample.unit in LOGFILES:
+                    LOGFILES[sample.unit].write_sample(sample)
+    except KeyboardInterrupt:
+        interrupted = True
+        print(f'\nInterrupted by the user: stopping the units {sorted(TARGETS)}.')
+        for unit, (tx_arr, rx_arr) in ser.stop_units(TARGETS).items():
+            if rx_arr is None:
+                print(f'ERROR --> The stop request for unit {unit} failed!', file=sys.stderr)
+        #
+    # Close of the tracking loop
+    for logfile in set(LOGFILES.values()):
+        logfile.close()
+    #
+
+    if interrupted:
+        print(f"Movement of units {sorted(TARGETS)} interrupted.")
+    elif rx_motor and all(motor == 0 for motor in rx_motor.values()):
+        print(f"Movement of units {sorted(rx_motor)} finished.")
+    else:
+        print("Movement not completed. Make sure that communication works properly, and check positions.")
+    #
+
+    print('\n\nChecking positions after stop:')
+    frame = read_position(ser)
+    if frame is not None:
+        for unit in TARGETS:
+            print(f"Unit {unit}: incremental encoder position {frame.inc_pos[unit]}; absolute encoder position {frame.abs_pos[unit]}; absolute encoder bytes: {frame.raw_msb[unit]} {frame.raw_lsb[unit]}")
+    #
+    print()
+
+    ser.close()
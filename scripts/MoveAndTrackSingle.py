@@ -3,8 +3,7 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from pySIS.core import goto_position, get_position, get_status
-from serial import Serial
+from pySIS.core import goto_position, read_position, track, AdaptivePollRate, RunLogWriter, open_session, stop, CommandScheduler
 import time
 from datetime import datetime
 from os import path
@@ -15,16 +14,19 @@ PORT = None
 UNIT = 0
 POS = 0 #In mm
 FNAME = None #The file where the data is dumped
+LOGFILE = None #The run log writer
 
 DEBUG = False #Hardcoded switch to be changed manually
 
 MAXPOS = 8890 #Maximum possible extension (in mm) due to "non SIS" limitations (e.g. the calibration tubes)
 
-#position/status check every delta_t seconds
+#position/status check every delta_t seconds near the target and when the motion starts or stops,
+#and up to every max_delta_t seconds during the long travels
 DELTA_T = 0.1
+MAX_DELTA_T = 1.0
 
-#maximal waiting time 25 mins
-MAX_TIME = time.time() + 60*25 
+#maximal waiting time 25 mins (in seconds)
+MAX_TIME = 60*25
 
 if __name__ == '__main__':
 
@@ -52,16 +54,15 @@ if __name__ == '__main__':
         name = '_'.join([name,timestamp.strftime("%Y%m%d-%H%M%S")])
         FNAME = name + ext
         
-        #Create the empty file
-        with open(FNAME, 'w') as _f:
-            pass
+        #Create the empty file (binary run log if the extension is ".bin")
+        LOGFILE = RunLogWriter(FNAME)
     
     
 
     print('\n\n')
     print(f'Moving unit {UNIT} to position {POS} mm.')
 
-    ser = Serial(PORT, baudrate=9600, timeout=0.5)
+    ser = CommandScheduler(open_session(PORT, baudrate=9600, timeout=0.5))
     tx_arr, rx_arr = goto_position(ser, UNIT, POS)
     if rx_arr is None:
         sys.exit(1)
@@ -79,81 +80,64 @@ if __name__ == '__main__':
     time.sleep(0.05)
     
     #Loop to track the position of the source while moving
-    while True:
-        
-        #current_time = datetime.now().strftime("%H-%M-%S")
-        if time.time() > MAX_TIME:
-            print("Maximum waiting time has expired. Make sure that communication works properly, and check positions.")
-            #file.write(current_time + ': Maximum waiting time has expired. Make sure that communication works properly, and check positions.\n')
-            break
-        #
-
-        try:
-            unixitme = time.time()
-            tx_arr, rx_arr = get_position(ser)
-            abs_pos_lsb = rx_arr[1 + 4 * UNIT]
-            abs_pos_msb = rx_arr[2 + 4 * UNIT]
-            inc_pos_lsb = rx_arr[3 + 4 * UNIT]
-            inc_pos_msb = rx_arr[4 + 4 * UNIT]
-            abs_raw_lsb = rx_arr[13 + 2 * UNIT]
-            abs_raw_msb = rx_arr[14 + 2 * UNIT]
-            rx_pos_abs = 256 * abs_pos_msb + abs_pos_lsb
-            rx_pos_inc = 256 * inc_pos_msb + inc_pos_lsb
-            rx_position = rx_pos_inc
-        
-        except (IndexError):
-            continue
-        except Exception as err:
-            print(f'ERROR --> After the "get_position" request. Exception message: {err}', file=sys.stderr)
-
-        abs_pos_err = False
-        inc_pos_err = False
-        if not (-25 <= rx_pos_abs <= 10500):
-            abs_pos_err = True
-            print(f'WARNING --> Absolute position out of range ({rx_pos_abs})!')
-        if not -25 <= rx_pos_inc <= 10500:
-            inc_pos_err = True
-            print(f'WARNING --> Incremental position out of range ({rx_pos_inc})!')
-        #
-
-        if not (abs_pos_err or inc_pos_err): 
-            print(f'Pos inc: {rx_pos_inc}; Pos abs: {rx_pos_abs}; Abs raw pos: {int(abs_raw_msb)} {int(abs_raw_lsb)}')
-            if FNAME is not None:
-                with open(FNAME, 'a') as logfile:
-                    logfile.write(f'{unixitme}~{rx_pos_inc}~{rx_pos_abs}~{int(abs_raw_msb)}~{int(abs_raw_lsb)}\n')
-        
-        time.sleep(DELTA_T)
-
-        try:
-            tx_arr, rx_arr = get_status(ser)
-            rx_motor = rx_arr[8+UNIT] & 3
-        except (IndexError):
-            continue
-        except Exception as err:
-            print(f'ERROR --> After the "get_status" request. Exception message: {err}', file=sys.stderr)
-        #
-
-        if (rx_motor == 0):
-            print(f"Movement of unit {UNIT} finished.")
-            break
-        #
-    # Close of the while loop
+    rx_motor = None
+    interrupted = False
+    #Ctrl+C stops the unit: the stop is sent as soon as the command on the wire is done,
+    #ahead of the queued polls
+    try:
+        for sample in track(ser, units=[UNIT], rate_hz=AdaptivePollRate(min_hz=1./MAX_DELTA_T, max_hz=1./DELTA_T, targets={UNIT: POS}), timeout=MAX_TIME):
+            unixitme = sample.time
+            rx_pos_abs = sample.abs_pos
+            rx_pos_inc = sample.inc_pos
+            abs_raw_msb = sample.raw_msb
+            abs_raw_lsb = sample.raw_lsb
+            rx_motor = sample.motor
+
+            abs_pos_err = False
+            inc_pos_err = False
+            if not (-25 <= rx_pos_abs <= 10500):
+                abs_pos_err = True
+                print(f'WARNING --> Absolute position out of range ({rx_pos_abs})!')
+            if not -25 <= rx_pos_inc <= 10500:
+                inc_pos_err = True
+                print(f'WARNING --> Incremental position out of range ({rx_pos_inc})!')
+            #
+
+            if not (abs_pos_err or inc_pos_err): 
+                print(f'Pos inc: {rx_pos_inc}; Pos abs: {rx_pos_abs}; Abs raw pos: {int(abs_raw_msb)} {int(abs_raw_lsb)}')
+                if LOGFILE is not None:
+                    LOGFILE.write_sample(sample)
+    except KeyboardInterrupt:
+        interrupted = True
+        print(f'\nInterrupted by the user: stopping unit {UNIT}.')
+        tx_arr, rx_arr = stop(ser, UNIT)
+        if rx_arr is None:
+            print(f'ERROR --> The stop request for unit {UNIT} failed!', file=sys.stderr)
+        else:
+            print(f'Stop request transmitted after {1000.*ser.stop_latencies[-1]:.1f} ms in the queue.')
+    #
+    # Close of the tracking loop
+    if LOGFILE is not None:
+        LOGFILE.close()
+
+    if interrupted:
+        print(f"Movement of unit {UNIT} interrupted.")
+    elif (rx_motor == 0):
+        print(f"Movement of unit {UNIT} finished.")
+    else:
+        print("Maximum waiting time has expired. Make sure that communication works properly, and check positions.")
+    #
     
     print('\n\nChecking position after stop:')
     
     try:
-        tx_arr, rx_arr = get_position(ser)
-        abs_pos_lsb = rx_arr[1 + 4 * UNIT]
-        abs_pos_msb = rx_arr[2 + 4 * UNIT]
-        inc_pos_lsb = rx_arr[3 + 4 * UNIT]
-        inc_pos_msb = rx_arr[4 + 4 * UNIT]
-        abs_raw_lsb = rx_arr[13 + 2 * UNIT]
-        abs_raw_msb = rx_arr[14 + 2 * UNIT]
-        rx_pos_abs = 256 * abs_pos_msb + abs_pos_lsb
-        rx_pos_inc = 256 * inc_pos_msb + inc_pos_lsb
-        rx_position = rx_pos_inc
+        frame = read_position(ser)
+        rx_pos_abs = frame.abs_pos[UNIT]
+        rx_pos_inc = frame.inc_pos[UNIT]
+        abs_raw_msb = frame.raw_msb[UNIT]
+        abs_raw_lsb = frame.raw_lsb[UNIT]
     
-    except (IndexError):
+    except (AttributeError):
         pass
     except Exception as err:
         print(f'ERROR --> After the "get_position" request. Exception message: {err}', file=sys.stderr)
@@ -162,3 +146,5 @@ if __name__ == '__main__':
     print("Current incremental encoder position:",rx_pos_inc)
     print("Current absolute encoder position:",rx_pos_abs)
     print(f"Current absolute encoder bytes: {abs_raw_msb} {abs_raw_lsb}\n")
+
+    ser.close()
@@ -0,0 +1,81 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pySIS.core import MoveJob, MultiBoxMover
+
+
+MAXPOS = 8890 #Maximum possible extension (in mm) due to "non SIS" limitations (e.g. the calibration tubes)
+
+#position/status check every delta_t seconds near the targets and when the motion starts or stops,
+#and up to every max_delta_t seconds during the long travels
+DELTA_T = 0.1
+MAX_DELTA_T = 1.0
+
+#maximal waiting time 25 mins (in seconds)
+MAX_TIME = 60*25
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        print(f'Too few arguments for the {sys.argv[0]} script!', file=sys.stderr)
+        print(f'Synopsys: python {sys.argv[0]} <serport>:<unit>:<pos> [<serport>:<unit>:<pos> ...]\n', file=sys.stderr)
+        sys.exit(1)
+    #
+
+    JOBS = []
+    for arg in sys.argv[1:]:
+        try:
+            #The port name may contain ':' itself (e.g. on Windows or for URLs)
+            port, unit, pos = arg.rsplit(':', 2)
+            job = MoveJob(port, int(unit), int(pos))
+        except ValueError:
+            print(f'ERROR --> Wrong format of the job "{arg}". Expected <serport>:<unit>:<pos>', file=sys.stderr)
+            sys.exit(1)
+        #
+        if job.target>MAXPOS:
+            print(f'WARNING --> Requested position {job.target} for unit {job.unit} at port <{job.port}> not allowed. Resetting to position {MAXPOS}.')
+            job = job._replace(target=MAXPOS)
+        #
+        JOBS.append(job)
+    #
+
+    print('\n\n')
+    for job in JOBS:
+        print(f'Moving unit {job.unit} at port <{job.port}> to position {job.target} mm.')
+    #
+
+    mover = MultiBoxMover(JOBS, rate_hz=1./DELTA_T, min_rate_hz=1./MAX_DELTA_T, timeout=MAX_TIME)
+    try:
+        for port, sample in mover.progress():
+            print(f'<{port}> unit {sample.unit}: Pos inc: {sample.inc_pos}; Pos abs: {sample.abs_pos}; Abs raw pos: {int(sample.raw_msb)} {int(sample.raw_lsb)}')
+        #
+    except KeyboardInterrupt:
+        print('\nInterrupted by the user: stopping all the units.')
+        for port, replies in mover.stop().items():
+            for unit, (tx_arr, rx_arr) in replies.items():
+                if rx_arr is None:
+                    print(f'ERROR --> The stop request for unit {unit} at port <{port}> failed!', file=sys.stderr)
+            #
+        #
+    #
+
+    print('\n\nSummary:')
+    all_ok = True
+    for port, result in mover.results.items():
+        status = 'completed' if result.completed else 'NOT completed'
+        if result.error is not None:
+            status += f' (error: {result.error})'
+        #
+        print(f'<{port}>: {status} in {result.elapsed:.1f} s')
+        for unit, target in result.targets.items():
+            print(f'    unit {unit}: target {target}, final position {result.final_pos[unit]}')
+        #
+        all_ok = all_ok and result.completed
+    #
+    print()
+
+    if not all_ok:
+        sys.exit(1)
@@ -3,8 +3,7 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from pySIS.core import BoxConfig
-from serial import Serial
+from pySIS.core import BoxConfig, open_session
 import time
 import traceback
 
@@ -21,20 +20,29 @@ if __name__ == '__main__':
     UNIT = int(sys.argv[2])
 
     print(f'Connecting to serial port device <{PORT}>')
-    ser = Serial(port=PORT, baudrate=9600, timeout = 0.1)
+    ser = open_session(PORT, baudrate=9600, timeout = 0.1)
     if not ser.is_open:
         ser.open()
     #
     print(f'Connection to <{ser.port}> established.')
     
+    EXIT_CODE = 0
     try:
         boxConfig = BoxConfig()
         boxConfig.read_data_from_memory(ser=ser)
         boxConfig.reset_corr_table_single(unit=UNIT)
-        boxConfig.write_data_into_memory(ser)
+        #Only the chunks of the correction table that actually changed are written
+        written, skipped, failed = boxConfig.write_data_into_memory(ser, delta=True)
+        if failed:
+            print(f'ERROR --> {len(failed)} chunks of the configuration were not written into the box memory (start addresses {failed}).', file=sys.stderr)
+            EXIT_CODE = 1
+        #
 
     except Exception as err:
+        EXIT_CODE = 1
         print(f'Error trying to read and re-write the SIS memory. Exception message: {err}')
         traceback.print_exc()
     finally:
-        ser.close()
\ No newline at end of file
+        ser.close()
+    #
+    sys.exit(EXIT_CODE)
\ No newline at end of file
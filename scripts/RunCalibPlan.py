@@ -0,0 +1,76 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pySIS.core import read_position, RunLogWriter, open_session, CalibPlan, run_plan, CommandScheduler
+from datetime import datetime
+from os import path
+
+
+#Motor speed (in mm/s) assumed for the estimate of the duration of the run
+SPEED = 10.
+
+
+if __name__ == '__main__':
+
+    timestamp = datetime.now()
+
+    if len(sys.argv) not in (2, 4):
+        print('ERROR --> Wrong number of arguments!', file=sys.stderr)
+        print(f'Synopsys: python {sys.argv[0]} <planfile.json> [<serport> <logfilename>]', file=sys.stderr)
+        print('          with the plan file only, the steps and the duration of the run are estimated starting from position 0.\n', file=sys.stderr)
+        sys.exit(1)
+    #
+
+    PLAN = CalibPlan.load(sys.argv[1])
+
+    if len(sys.argv) == 2:
+        steps = PLAN.steps(0)
+        print(f'Plan for the units {PLAN.units}: {len(PLAN.segments)} segments, {len(steps)} steps.')
+        for iSeg, segment in enumerate(PLAN.segments):
+            nsteps = sum(1 for el in steps if el[0] == iSeg)
+            print(f'    segment {iSeg}: to {segment.target} mm in {nsteps} steps of {segment.step} mm, dwell {segment.dwell} s')
+        #
+        print(f'Estimated duration: {PLAN.estimate(0, speed=SPEED)/60.:.1f} min (at {SPEED} mm/s).\n')
+        sys.exit(0)
+    #
+
+    PORT = sys.argv[2]
+    FNAME = sys.argv[3]
+    #Compose the name in order to put inside also the timestamp
+    name, ext = path.splitext(FNAME)
+    FNAME = '_'.join([name,timestamp.strftime("%Y%m%d-%H%M%S")]) + ext
+
+    LOGFILE = RunLogWriter(FNAME)
+
+    interrupted = False
+    with CommandScheduler(open_session(PORT, baudrate=9600, timeout=0.5)) as ser:
+        frame = read_position(ser)
+        if frame is None:
+            print('ERROR --> Cannot read the positions at the start of the run! Aborting the script.', file=sys.stderr)
+            sys.exit(1)
+        #
+        start_pos = {unit: frame.inc_pos[unit] for unit in PLAN.units}
+        print(f'\n\nRunning the calibration plan {sys.argv[1]} (estimated duration {PLAN.estimate(start_pos, speed=SPEED)/60.:.1f} min).')
+
+        #Ctrl+C stops the units: the stops are sent as soon as the command on the wire is done,
+        #ahead of the queued polls
+        try:
+            for iSeg, direction, sample in run_plan(ser, PLAN):
+                print(f'Segment {iSeg}, unit {sample.unit}: Pos inc: {sample.inc_pos}; Pos abs: {sample.abs_pos}; Abs raw pos: {int(sample.raw_msb)} {int(sample.raw_lsb)}; {"Upward" if direction else "Downward"}')
+                LOGFILE.write_sample(sample, direction)
+            #
+        except KeyboardInterrupt:
+            interrupted = True
+            print(f'\nInterrupted by the user: stopping the units {PLAN.units}.')
+            for unit, (tx_arr, rx_arr) in ser.stop_units(PLAN.units).items():
+                if rx_arr is None:
+                    print(f'ERROR --> The stop request for unit {unit} failed!', file=sys.stderr)
+            #
+    #
+    LOGFILE.close()
+    if interrupted:
+        print(f'Calibration run interrupted. Data written in {FNAME}\n')
+    else:
+        print(f'Calibration run completed. Data written in {FNAME}\n')
@@ -0,0 +1,25 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pySIS.core import runlog_to_text
+
+
+if __name__ == '__main__':
+    
+    if len(sys.argv) != 3:
+        print(f"Error: wrong number of arguments for {sys.argv[0]} script.", file=sys.stderr)
+        print(f"Synopsys: python {sys.argv[0]} <binary_runlog> <text_runlog>", file=sys.stderr)
+        sys.exit(1)
+    #
+    BINFNAME = sys.argv[1]
+    TXTFNAME = sys.argv[2]
+
+    try:
+        nrec = runlog_to_text(BINFNAME, TXTFNAME)
+    except Exception as err:
+        print(f'Error while converting the run log <{BINFNAME}>. Exception message: {err}', file=sys.stderr)
+        sys.exit(1)
+    #
+    print(f'{nrec} records of <{BINFNAME}> written into <{TXTFNAME}>.')
@@ -0,0 +1,35 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pySIS.core import SISDaemon
+from pySIS.core.daemon import DAEMON_ENV
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        print(f'Too few arguments for the {sys.argv[0]} script!', file=sys.stderr)
+        print(f'Synopsys: python {sys.argv[0]} <socketpath|host:port> [serport ...]\n', file=sys.stderr)
+        sys.exit(1)
+    #
+
+    ADDRESS = sys.argv[1]
+    PORTS = sys.argv[2:]
+
+    try:
+        daemon = SISDaemon(ADDRESS, PORTS, baudrate=9600)
+    except (RuntimeError, OSError) as err:
+        print(f'ERROR --> Cannot start the SIS daemon on <{ADDRESS}>. Exception message: {err}', file=sys.stderr)
+        sys.exit(1)
+    #
+    print(f'SIS daemon listening on <{ADDRESS}> for the ports {PORTS} (the other ports are opened on request).')
+    print(f'Run the scripts with the environment variable {DAEMON_ENV}={ADDRESS} to go through the daemon.')
+    print('Press Ctrl+C to stop.')
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.shutdown()
@@ -0,0 +1,37 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pySIS.core.simulator import SimulatedBox, PtySimulator
+import time
+
+
+#These below are default values that can be overwritten by the user at the command line
+LATENCY = 0.005 #Reply latency of the box (in seconds)
+SPEED = 20. #Motor speed (in mm/s)
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 3:
+        print(f'Too many arguments for the {sys.argv[0]} script!', file=sys.stderr)
+        print(f'Synopsys: python {sys.argv[0]} [latency_s] [speed_mm_s]\n', file=sys.stderr)
+        sys.exit(1)
+    #
+    if len(sys.argv) > 1:
+        LATENCY = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        SPEED = float(sys.argv[2])
+    #
+
+    sim = PtySimulator(SimulatedBox(speed=SPEED), latency=LATENCY).start()
+    print(f'Simulated SIS box listening on serial port <{sim.port}> (latency {LATENCY} s, speed {SPEED} mm/s).')
+    print('Press Ctrl+C to stop.')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
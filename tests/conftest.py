@@ -0,0 +1,32 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from pySIS.core import SISConnection, ConfigCache, Metrics
+from pySIS.core.simulator import SimulatedBox, FakeSerial
+
+
+@pytest.fixture
+def metrics():
+    return Metrics()
+
+
+@pytest.fixture
+def connect(metrics):
+    """
+    Factory of sessions with a simulated box (a SimulatedBox by default), with their own
+    metrics and config cache, so that the tests do not see each other's commands.
+    """
+    sessions = []
+
+    def _connect(box=None, **kwargs):
+        ser = SISConnection(FakeSerial(SimulatedBox() if (box is None) else box), metrics=metrics, config_cache=ConfigCache(), **kwargs)
+        sessions.append(ser)
+        return ser
+    #
+    yield _connect
+    for ser in sessions:
+        ser.close()
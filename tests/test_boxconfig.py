@@ -0,0 +1,53 @@
+from pySIS.core import BoxConfig
+from pySIS.core.libSIS import CMD_SET_CONFIG_DATA, check_sum
+from pySIS.core.simulator import SimulatedBox
+
+
+class RefusingBox(SimulatedBox):
+    """
+    Box refusing the config writes at the addresses in `refused`.
+    """
+
+    def __init__(self, refused=(), **kwargs):
+        super().__init__(**kwargs)
+        self.refused = set(refused)
+    #
+
+    def _reply(self, tx_frame):
+        if (tx_frame[0] == CMD_SET_CONFIG_DATA) and (tx_frame[1] in self.refused):
+            rx_array = [CMD_SET_CONFIG_DATA, tx_frame[1], BoxConfig.ACK_INVALID_VALUE]
+            return bytes(rx_array + [check_sum(rx_array)])
+        return super()._reply(tx_frame)
+    #
+#
+
+
+def changed_chunks(old_image, new_image):
+    old_chunks = dict(BoxConfig.chunks(old_image))
+    return [start_address for start_address, chunk in BoxConfig.chunks(new_image) if old_chunks[start_address] != chunk]
+
+
+def test_delta_write_reports_failed_chunks(connect):
+    box = RefusingBox()
+    ser = connect(box)
+
+    cfg = BoxConfig()
+    cfg.read_data_from_memory(ser)
+    baseline = cfg.memory_image
+    assert baseline is not None
+
+    cfg.AbsEncCorrData[0][0] = 3
+    cfg.AbsEncCorrData[2][63] = -5
+    new_image = cfg.get_memory_image()
+    changed = changed_chunks(baseline, new_image)
+    assert len(changed) == 2
+    box.refused = {changed[0]}
+
+    written, skipped, failed = cfg.write_data_into_memory(ser, delta=True)
+    assert failed == [changed[0]]
+    assert written == [changed[1]]
+    assert len(skipped) == BoxConfig.MEMORY_SIZE // BoxConfig.CHUNK_SIZE - 2
+
+    #The tracked image holds the written chunk, and the old content of the failed one
+    assert changed_chunks(baseline, cfg.memory_image) == [changed[1]]
+    assert bytes(box.memory) == cfg.memory_image
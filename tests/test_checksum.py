@@ -0,0 +1,44 @@
+import time
+
+from pySIS.core.libSIS import CMD_SET_CONFIG_DATA, CMD_GET_CONFIG_MEM, RX_HAS_CHECKSUM
+from pySIS.core.simulator import SimulatedBox
+
+
+class BadChecksumBox(SimulatedBox):
+    """
+    Box whose config replies all have a wrong checksum.
+    """
+
+    def _reply(self, tx_frame):
+        rx_bytes = super()._reply(tx_frame)
+        if tx_frame[0] in RX_HAS_CHECKSUM:
+            rx_bytes = rx_bytes[:-1] + bytes([rx_bytes[-1] ^ 0x55])
+        return rx_bytes
+    #
+#
+
+
+def outcomes(metrics, port, cmd_byte):
+    return metrics.snapshot()[port][metrics.command_name(cmd_byte)]['outcomes']
+
+
+def test_corrupted_config_replies_are_checksum_errors(connect, metrics):
+    ser = connect(BadChecksumBox())
+
+    start = time.monotonic()
+    tx_array, rx_array = ser.get_config_memory()
+    assert rx_array is None
+    tx_array, rx_array = ser.set_config_data(0, [0, 0, 0, 0])
+    assert rx_array is None
+    elapsed = time.monotonic() - start
+
+    for cmd_byte in (CMD_GET_CONFIG_MEM, CMD_SET_CONFIG_DATA):
+        counts = outcomes(metrics, ser.port, cmd_byte)
+        assert counts['checksum'] == ser.retry.attempts
+        assert counts['timeout'] == counts['wrong_cmd'] == 0
+    #
+    #The retries start at once, instead of waiting for the deadline of the reply (2 s)
+    assert elapsed < ser.timeouts[CMD_GET_CONFIG_MEM]
+
+    #The rejected replies do not shift the following ones
+    assert ser.read_position() is not None
@@ -0,0 +1,65 @@
+import time
+import threading
+
+import pytest
+
+from pySIS.core import CommandScheduler, BoxConfig, SISDaemon, SISClient
+from pySIS.core.simulator import SimulatedBox, PtySimulator
+
+#A stop waits at most for one window of acknowledges of a bulk write (1 s each when dropped)
+MAX_STOP_WAIT = 1.5
+
+
+def test_stop_preempts_bulk_write(connect):
+    box = SimulatedBox(drop_prob=0.3, seed=1)
+    chunks = BoxConfig.chunks(bytes(box.memory))
+    with CommandScheduler(connect(box)) as sch:
+        bulk = sch.submit('set_config_data_bulk', chunks, 4, 2)
+        time.sleep(0.5)
+
+        start = time.monotonic()
+        tx_array, rx_array = sch.stop(0)
+        assert rx_array is not None
+        assert time.monotonic() - start < MAX_STOP_WAIT
+        assert sch.stop_latency_summary()['count'] == 1
+
+        written, failed = bulk.result()
+        assert failed
+        assert len(written) + len(failed) == len(chunks)
+    #
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    with PtySimulator(SimulatedBox(drop_prob=0.3, seed=1), latency=0.002) as sim:
+        sis_daemon = SISDaemon(str(tmp_path / 'sisd.sock'), [sim.port]).start()
+        yield (sis_daemon, sim.port)
+        sis_daemon.shutdown()
+    #
+
+
+def test_stop_preempts_other_client_bulk_write(daemon):
+    sis_daemon, port = daemon
+    writer = SISClient(sis_daemon.address, port)
+    stopper = SISClient(sis_daemon.address, port)
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(write=BoxConfig().write_data_into_memory(writer)))
+    thread.start()
+    time.sleep(0.5)
+
+    start = time.monotonic()
+    tx_array, rx_array = stopper.stop(0)
+    elapsed = time.monotonic() - start
+    thread.join()
+    assert rx_array is not None
+    assert elapsed < MAX_STOP_WAIT
+    assert result['write'][2]
+
+    #Measured by the daemon, up to the serial port
+    summary = stopper.stop_latency_summary()
+    assert summary['count'] == 1
+    assert summary['max_ms'] < 1000. * MAX_STOP_WAIT
+    with CommandScheduler(stopper) as sch:
+        assert sch.stop_latency_summary() == summary
+    #
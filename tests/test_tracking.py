@@ -0,0 +1,40 @@
+import time
+
+from pySIS.core import move_units
+from pySIS.core.libSIS import CMD_GET_STATUS, CMD_GOTO_POSITION
+from pySIS.core.simulator import SimulatedBox
+
+
+class LaggingStatusBox(SimulatedBox):
+    """
+    Box reporting the motors idle for `lag` seconds after a "goto_position".
+    """
+
+    def __init__(self, lag=0.3, **kwargs):
+        super().__init__(**kwargs)
+        self.lag = lag
+        self._goto_time = None
+    #
+
+    def _reply(self, tx_frame):
+        if tx_frame[0] == CMD_GOTO_POSITION:
+            self._goto_time = time.monotonic()
+        rx_bytes = super()._reply(tx_frame)
+        if (tx_frame[0] == CMD_GET_STATUS) and (self._goto_time is not None) and (time.monotonic() - self._goto_time < self.lag):
+            rx_bytes = rx_bytes[:8] + bytes(3) + rx_bytes[11:]
+        return rx_bytes
+    #
+#
+
+
+def test_track_waits_for_a_lagging_status(connect):
+    ser = connect(LaggingStatusBox(speed=100.))
+    samples = list(move_units(ser, {0: 100}, rate_hz=20, timeout=10))
+    assert samples[-1].inc_pos == 100
+    assert samples[-1].motor == 0
+
+
+def test_track_without_grace_stops_on_a_lagging_status(connect):
+    ser = connect(LaggingStatusBox(speed=100.))
+    samples = list(move_units(ser, {0: 100}, rate_hz=20, timeout=10, start_grace=0.))
+    assert samples[-1].inc_pos < 100